@@ -1,44 +1,46 @@
 import json
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
+from tools.resilience import LLMError
+from utils.feedback import feedback_section
+from utils.paper_context import build_paper_context
+from utils.streaming import with_markdown_heading
 from typing import Dict, Optional
 
 class ArchitectureAgent:
+    INPUTS = ("intermediate/structured_data.json",)
+    OUTPUTS = ("output/architecture.md",)
+    PROFILE = "architecture" # Generation profile (config/generation_profiles.json)
+    END_MARKER = "--- END ARCHITECTURE DOCUMENT ---" # Also the profile's stop sequence
+
     def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
         self.fs_tool = fs_tool
         self.llm = llm_client
         print("🏗️  Initialized ArchitectureAgent.")
 
-    def run(self, structured_data: Optional[Dict] = None):
-        """
-        Generates an architecture proposal document in Markdown format using an LLM,
-        based on the structured data from the paper.
-        """
-        print("   ➡️ Generating Architecture Document...")
-        arch_path_rel = "output/architecture.md"
+    def _load_structured_data(self, structured_data: Optional[Dict]) -> Optional[Dict]:
+        """Returns the structured data passed in, or reads it from the intermediate file."""
         structured_data_path_rel = "intermediate/structured_data.json"
-
+        if structured_data:
+            return structured_data
+        print("      ⚠️ Structured data not provided directly, attempting to read from file...")
+        data_str = self.fs_tool.read_text(structured_data_path_rel)
+        if not data_str:
+            print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
+            return None # Cannot proceed without structured data
         try:
-            # Ensure structured_data is available
-            if not structured_data:
-                 print("      ⚠️ Structured data not provided directly, attempting to read from file...")
-                 data_str = self.fs_tool.read_text(structured_data_path_rel)
-                 if not data_str:
-                     print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
-                     return # Cannot proceed without structured data
-                 try:
-                     structured_data = json.loads(data_str)
-                 except json.JSONDecodeError:
-                     print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
-                     return # Cannot proceed
+            return json.loads(data_str)
+        except json.JSONDecodeError:
+            print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
+            return None # Cannot proceed
 
-            # Prepare prompt for LLM
-            prompt = f"""You are a senior Software Architect. Based on the following structured information extracted from a technical paper, generate a concise System Architecture document in Markdown format.
+    def _heading(self, structured_data: Dict) -> str:
+        return f"# System Architecture: {structured_data.get('title', 'Untitled System')}"
 
-Extracted Paper Information:
-- **Title:** {structured_data.get('title', 'Untitled System')}
-- **Problem:** {structured_data.get('problem', 'Not specified')}
-- **Approach:** {structured_data.get('approach', 'Not specified')}
+    def _build_prompt(self, structured_data: Dict, feedback: Optional[str] = None) -> str:
+        # (The prompt guides the LLM to start the Markdown directly)
+        # The paper itself is sent as the shared system prompt (see utils.paper_context)
+        return f"""You are a senior Software Architect. Based on the extracted paper information you were given, generate a concise System Architecture document in Markdown format.
 
 Include the following sections in the architecture document:
 1.  **Overview:** A brief description of the system's purpose.
@@ -48,30 +50,42 @@ Include the following sections in the architecture document:
 5.  **Data Flow Diagram (Mermaid):** Create a simple flowchart or sequence diagram using Mermaid syntax to illustrate the main data flow between components.
 6.  **Key Considerations:** Mention 1-2 important architectural considerations (e.g., Scalability, Modularity, Security).
 
-Respond ONLY with the complete architecture document in well-formatted Markdown. Do not include any introductory text before the document content.
+{feedback_section(feedback)}Respond ONLY with the complete architecture document in well-formatted Markdown. Do not include any introductory text before the document content. End the document with a line containing only {self.END_MARKER}
 
 --- START ARCHITECTURE DOCUMENT ---
 # System Architecture: {structured_data.get('title', 'Untitled System')}
 
 """
-            # (The prompt guides the LLM to start the Markdown directly)
 
-            print("      🤖 Sending architecture generation request to LLM...")
-            arch_md_content = self.llm.generate(prompt)
+    def run(self, structured_data: Optional[Dict] = None, feedback: Optional[str] = None):
+        """
+        Generates an architecture proposal document in Markdown format using an LLM,
+        based on the structured data from the paper. `feedback` from the evaluator is
+        added to the prompt when the document is regenerated.
+        """
+        print("   ➡️ Generating Architecture Document...")
+        arch_path_rel = "output/architecture.md"
 
-            if not arch_md_content:
+        try:
+            structured_data = self._load_structured_data(structured_data)
+            if not structured_data:
+                return
+            prompt = self._build_prompt(structured_data, feedback)
+            system = build_paper_context(structured_data)
+
+            print("      🤖 Streaming architecture generation from LLM...")
+            # Ensure the response starts reasonably (prepends the title if it doesn't)
+            chunks = with_markdown_heading(self.llm.stream(prompt, system=system, profile=self.PROFILE),
+                                           self._heading(structured_data), self.END_MARKER)
+            written = self.fs_tool.write_stream(arch_path_rel, chunks)
+
+            if not written:
                  print("      ⚠️ LLM returned empty content for architecture document. Skipping file write.")
                  return
 
-            # Ensure the response starts reasonably
-            if not arch_md_content.strip().startswith("#"):
-                 print("      ⚠️ LLM response didn't start with Markdown title, prepending.")
-                 arch_md_content = f"# System Architecture: {structured_data.get('title', 'Untitled System')}\n\n" + arch_md_content
-
-            # Save the generated architecture document
-            self.fs_tool.write_text(arch_path_rel, arch_md_content)
             print(f"   ✅ Architecture document generated and saved to {arch_path_rel}.")
 
+        except LLMError:
+            raise # No completion: the stage fails instead of looking like an empty response
         except Exception as e:
             print(f"   ❌ An unexpected error occurred in ArchitectureAgent: {e}")
-
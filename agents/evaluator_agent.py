@@ -1,85 +1,333 @@
-import os
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
-from typing import Optional
+from tools.resilience import deadline_scope
+from tools.response_cache import ResponseCache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from utils.config import caches_disabled, env_int
+from utils.hashing import sha256_text
 
 class EvaluatorAgent:
-    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
+    INPUTS = ()
+    OUTPUTS = ("output/evaluation.txt", "intermediate/evaluation.json")
+    PROFILE = "evaluator" # Generation profile (config/generation_profiles.json)
+    OPTIONAL_INPUTS = ("output/prd.md", "output/architecture.md", "output/execution_plan.md", "intermediate/plan.json")
+    REWRITES = ("output/prd.md", "output/architecture.md", "output/execution_plan.md") # When regenerating them
+
+    # Bump when the review prompt or the checks change, so cached verdicts are not reused
+    REVIEW_VERSION = 1
+    MAX_REVIEW_CHARS = 8000
+    MIN_SCORE = 6 # LLM scores below this count as a failed review
+
+    # Statuses that make an artifact eligible for regeneration with feedback
+    REGENERATE_STATUSES = ("missing", "failed_checks", "low_score")
+
+    # Artifacts under review: name, path, plan flag that requests it, minimum words, required marker
+    # and the artifacts it is built from (rewriting one of those rewrites it too)
+    ARTIFACTS = [
+        {"name": "PRD", "path": "output/prd.md", "plan_flag": "generate_prd", "min_words": 100, "marker": "#",
+         "marker_label": "Markdown headings", "built_from": ()},
+        {"name": "Architecture", "path": "output/architecture.md", "plan_flag": "design_architecture",
+         "min_words": 100, "marker": "```mermaid", "marker_label": "a Mermaid diagram", "built_from": ()},
+        {"name": "Execution Plan", "path": "output/execution_plan.md", "plan_flag": "execution_plan",
+         "min_words": 30, "marker": "|", "marker_label": "a phase table", "built_from": ("PRD", "Architecture")},
+    ]
+
+    SCHEMA = {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer", "minimum": 1, "maximum": 10},
+            "justification": {"type": "string"},
+        },
+        "required": ["score", "justification"],
+    }
+
+    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient,
+                 verdict_cache: Optional[ResponseCache] = None):
         self.fs_tool = fs_tool
         self.llm = llm_client
+        # LLM verdicts keyed by the reviewed content's hash, shared by every session of the workspace
+        self.verdict_cache = verdict_cache or ResponseCache(cache_dir=fs_tool.cache_dir("verdicts"),
+                                                            enabled=not caches_disabled())
         print("📊 Initialized EvaluatorAgent.")
 
-    def _validate_mermaid_diagram(self, architecture_path: str) -> bool:
+    def _load_plan(self) -> Dict:
+        try:
+            return json.loads(self.fs_tool.read_text("intermediate/plan.json") or "{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _check_artifact(self, artifact: Dict, content: str) -> List[str]:
+        """Cheap checks that need no LLM. Returns the problems found (empty if the artifact passes)."""
+        problems = []
+        word_count = len(content.split())
+        if word_count < artifact["min_words"]:
+            problems.append(f"too short ({word_count} words, expected at least {artifact['min_words']})")
+        if artifact["marker"] not in content:
+            problems.append(f"missing {artifact['marker_label']}")
+        return problems
+
+    def _verdict_key(self, artifact: Dict, content: str) -> str:
+        return sha256_text(json.dumps({"model": self.llm.model, "artifact": artifact["name"],
+                                       "content": sha256_text(content), "version": self.REVIEW_VERSION}))
+
+    def _cached_verdict(self, key: str) -> Optional[Dict]:
+        cached = self.verdict_cache.get(key)
+        if cached is None:
+            return None
+        try:
+            return json.loads(cached)
+        except json.JSONDecodeError:
+            return None
+
+    def _build_review_prompt(self, artifact: Dict, content: str) -> str:
+        truncated = "\n[... truncated ...]" if len(content) > self.MAX_REVIEW_CHARS else ""
+        return f"""You are a software product reviewer.
+Evaluate the following {artifact['name']} document in terms of clarity, completeness, and feasibility.
+Respond with a JSON object with "score" (an integer from 1 to 10) and "justification" (a brief explanation).
+
+---
+{content[:self.MAX_REVIEW_CHARS]}{truncated}
+---
+"""
+
+    def _prepare(self, names: Optional[Iterable[str]] = None) -> List[Dict]:
         """
-        Validates that the architecture file contains a valid Mermaid diagram.
+        Reads the artifacts (all of them, or only `names`) and runs their deterministic checks.
+        Each entry says whether the LLM review is still needed (`prompt`) or already settled
+        (skipped, failed or cached).
         """
-        try:
-            content = self.fs_tool.read_text(architecture_path)
-            if "```mermaid" in content:
-                print(f"   ✅ Mermaid diagram found in {architecture_path}.")
-                return True
+        plan = self._load_plan()
+        entries = []
+        for artifact in self.ARTIFACTS:
+            if names is not None and artifact["name"] not in names:
+                continue
+            entry = {"artifact": artifact["name"], "path": artifact["path"], "problems": [], "verdict": None,
+                     "cached": False}
+            entries.append(entry)
+            if not self.fs_tool.file_exists(artifact["path"]):
+                if plan.get(artifact["plan_flag"], True):
+                    entry["problems"].append("missing")
+                else:
+                    entry["status"] = "not requested"
+                continue
+            content = self.fs_tool.read_text(artifact["path"]) or ""
+            entry["words"] = len(content.split())
+            entry["problems"] = self._check_artifact(artifact, content)
+            if entry["problems"]:
+                continue # The LLM review is not worth a call for an artifact that fails the basic checks
+            entry["key"] = self._verdict_key(artifact, content)
+            entry["verdict"] = self._cached_verdict(entry["key"])
+            if entry["verdict"] is not None:
+                entry["cached"] = True
+                print(f"   ⚡ Cached verdict for {artifact['name']} (content unchanged).")
             else:
-                print(f"   ⚠️ No Mermaid diagram found in {architecture_path}.")
-                return False
-        except Exception as e:
-            print(f"   ❌ Error reading architecture file for Mermaid validation: {e}")
-            return False
+                entry["prompt"] = self._build_review_prompt(artifact, content)
+        return entries
 
-    def run(self) -> str:
+    def _store_verdict(self, entry: Dict, verdict: Optional[Dict]):
+        entry.pop("prompt", None)
+        entry["verdict"] = verdict
+        if verdict is not None:
+            self.verdict_cache.put(entry["key"], json.dumps(verdict))
+
+    def _settle(self, entries: List[Dict]) -> List[Dict]:
+        """Sets the final status of each entry once its review (if any) has finished."""
+        for entry in entries:
+            entry.pop("key", None)
+            if entry.get("status") == "not requested":
+                continue
+            if "missing" in entry["problems"]:
+                entry["status"] = "missing"
+            elif entry["problems"]:
+                entry["status"] = "failed_checks"
+            elif entry["verdict"] is None:
+                entry["status"] = "review_failed"
+            elif entry["verdict"]["score"] < self.MIN_SCORE:
+                entry["status"] = "low_score"
+            else:
+                entry["status"] = "passed"
+        return entries
+
+    def _review(self, entries: List[Dict]) -> List[Dict]:
+        """Runs the pending LLM reviews concurrently."""
+        pending = [entry for entry in entries if "prompt" in entry]
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="evaluation") as pool:
+                # Each review runs in a copy of the stage's context so its LLM metrics stay attributed to it
+                futures = [pool.submit(contextvars.copy_context().run, self.llm.generate_json, entry["prompt"],
+                                       self.SCHEMA, use_cache=False, profile=self.PROFILE) for entry in pending]
+                for entry, future in zip(pending, futures):
+                    try:
+                        self._store_verdict(entry, future.result())
+                    except Exception as e:
+                        print(f"   ❌ LLM evaluation of {entry['artifact']} failed: {e}")
+                        self._store_verdict(entry, None)
+        return self._settle(entries)
+
+    def _feedback(self, entry: Dict) -> str:
+        """Turns an entry's failed checks and the reviewer's verdict into feedback for the writer."""
+        lines = ["- The document was not produced." if problem == "missing" else f"- {problem[0].upper()}{problem[1:]}."
+                 for problem in entry["problems"]]
+        if entry["verdict"] is not None:
+            verdict = entry["verdict"]
+            lines.append(f"- Reviewer score {verdict['score']}/10: {verdict['justification'].strip()}")
+        return "\n".join(lines)
+
+    def _regeneration_targets(self, entries: List[Dict], regenerators: Dict, started: float,
+                              time_budget_s: float) -> List[Dict]:
+        """Entries that failed and can be regenerated, or [] when the time budget is spent."""
+        failed = [entry for entry in entries
+                  if entry["status"] in self.REGENERATE_STATUSES and entry["artifact"] in regenerators]
+        if failed and time.perf_counter() - started >= time_budget_s:
+            print(f"⏱️ Regeneration budget of {time_budget_s:.0f}s spent; keeping the current documents.")
+            return []
+        return failed
+
+    def _next_wave(self, pending: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """The pending regenerations that do not wait for another pending one (their sources are final)."""
+        sources = {artifact["name"]: set(artifact["built_from"]) for artifact in self.ARTIFACTS}
+        return {name: feedback for name, feedback in pending.items() if not sources.get(name, set()) & set(pending)}
+
+    def _add_dependents(self, entries: List[Dict], pending: Dict[str, Optional[str]], rewritten: Set[str],
+                        regenerators: Dict, attempted: Set[str]):
         """
-        Evaluates generated outputs and returns a summary string.
+        Queues the documents built from a rewritten one, so none is left based on a superseded
+        version. A document already `attempted` in this round is not queued again.
         """
-        summary = []
+        by_name = {entry["artifact"]: entry for entry in entries}
+        for artifact in self.ARTIFACTS:
+            name = artifact["name"]
+            changed = sorted(set(artifact["built_from"]) & rewritten)
+            if (not changed or name in pending or name in attempted or name not in regenerators
+                    or by_name.get(name, {}).get("status") in (None, "not requested")):
+                continue
+            entry = by_name[name]
+            pending[name] = self._feedback(entry) if entry["status"] in self.REGENERATE_STATUSES else None
+            print(f"   🔗 {name} is built from the rewritten {', '.join(changed)}; regenerating it too")
 
-        # Check for key output files
-        required_files = [
-            "output/prd.md",
-            "output/architecture.md",
-            "output/implementation/backend/src/main/java/com/example/Application.java",
-            "output/implementation/frontend/src/index.tsx"
-        ]
-
-        for path in required_files:
-            if self.fs_tool.file_exists(path):
-                summary.append(f"✅ {path} exists")
-            else:
-                summary.append(f"❌ {path} is missing")
+    def _mark_stale(self, entries: List[Dict], pending: Iterable[str], rewritten: Set[str]):
+        """Flags the documents left unregenerated (out of budget or failed) while their sources changed."""
+        sources = {artifact["name"]: artifact["built_from"] for artifact in self.ARTIFACTS}
+        for entry in entries:
+            changed = [name for name in sources.get(entry["artifact"], ()) if name in rewritten]
+            if entry["artifact"] in pending and changed:
+                entry["problems"].append(f"built from a previous version of {', '.join(changed)}")
 
-        # Validate Mermaid diagram in architecture.md
-        architecture_path = "output/architecture.md"
-        if self.fs_tool.file_exists(architecture_path):
-            if not self._validate_mermaid_diagram(architecture_path):
-                summary.append(f"⚠️ Mermaid diagram validation failed for {architecture_path}.")
+    @staticmethod
+    def _call_regenerator(regenerate: Callable[[Optional[str]], Any], feedback: Optional[str], budget_end: float):
+        with deadline_scope(max(0.0, budget_end - time.perf_counter())):
+            return regenerate(feedback)
 
-        # Heuristic + LLM Evaluation
-        prd_text = self.fs_tool.read_text("output/prd.md") or ""
-        if len(prd_text.split()) > 100:
-            summary.append("📘 PRD has sufficient length")
-        else:
-            summary.append("⚠️  PRD might be too short")
+    def _regenerate(self, entries: List[Dict], targets: List[Dict], regenerators: Dict, budget_end: float) -> Set[str]:
+        """
+        Rewrites the failed documents with their feedback, and then the documents built from
+        them. Each wave of independent documents is rewritten concurrently, and every LLM call
+        must finish before `budget_end`. Returns the names of the documents rewritten.
+        """
+        pending = {entry["artifact"]: self._feedback(entry) for entry in targets}
+        rewritten: Set[str] = set()
+        attempted: Set[str] = set()
+        while pending:
+            if time.perf_counter() >= budget_end:
+                print("⏱️ Regeneration budget spent in the middle of a round; keeping the remaining documents.")
+                self._mark_stale(entries, pending, rewritten)
+                break
+            wave = self._next_wave(pending)
+            with ThreadPoolExecutor(max_workers=len(wave), thread_name_prefix="regeneration") as pool:
+                # Each regeneration runs in a copy of the stage's context, like the reviews
+                futures = {name: pool.submit(contextvars.copy_context().run, self._call_regenerator,
+                                             regenerators[name], feedback, budget_end)
+                           for name, feedback in wave.items()}
+                for name, future in futures.items():
+                    pending.pop(name)
+                    attempted.add(name)
+                    try:
+                        future.result()
+                        rewritten.add(name)
+                    except Exception as e:
+                        print(f"   ❌ Regenerating {name} failed: {e}")
+            self._add_dependents(entries, pending, rewritten, regenerators, attempted)
+        # A document whose regeneration failed may still be built from a source rewritten since
+        self._mark_stale(entries, attempted - rewritten, rewritten)
+        return rewritten
 
-        prompt = f"""You are a software product reviewer.
-Evaluate the following PRD in terms of clarity, completeness, and feasibility.
-Provide a score from 1 to 10 and a brief justification.
+    def _merge(self, entries: List[Dict], reevaluated: List[Dict]) -> List[Dict]:
+        by_name = {entry["artifact"]: entry for entry in reevaluated}
+        for entry in entries:
+            if entry["artifact"] in by_name:
+                by_name[entry["artifact"]]["regenerations"] = entry.get("regenerations", 0) + 1
+        return [by_name.get(entry["artifact"], entry) for entry in entries]
 
----
-{prd_text[:2048]}
----
-"""
-        try:
-            eval_response = self.llm.generate(prompt)
-            summary.append("🤖 LLM Evaluation of PRD:")
-            summary.append(eval_response.strip())
-        except Exception as e:
-            summary.append(f"⚠️  LLM evaluation failed: {e}")
+    def _regeneration_settings(self, max_iterations: Optional[int], time_budget_s: Optional[float]):
+        if max_iterations is None:
+            max_iterations = env_int("PAPER2PROD_MAX_REGENERATIONS", 1)
+        if time_budget_s is None:
+            time_budget_s = env_int("PAPER2PROD_REGENERATION_BUDGET", 300)
+        return max(0, max_iterations), time_budget_s
 
-        # Adaptive iteration based on evaluation
-        if "⚠️" in "\n".join(summary):
-            print("🔄 Issues detected. Triggering adaptive iteration...")
-            # Logic for adaptive iteration (e.g., re-run agents with adjusted prompts)
+    def _finish(self, entries: List[Dict]) -> str:
+        summary = []
+        for entry in entries:
+            summary.append(f"📄 {entry['artifact']} ({entry['path']})")
+            if entry["status"] == "not requested":
+                summary.append("   ⏭️ Not requested by the plan")
+                continue
+            if entry["status"] == "missing":
+                summary.append("   ❌ Missing")
+                continue
+            regenerated = f", regenerated {entry['regenerations']}x" if entry.get("regenerations") else ""
+            summary.append(f"   ✅ Exists ({entry['words']} words{regenerated})")
+            summary.extend(f"   ⚠️ {problem}" for problem in entry["problems"])
+            verdict = entry["verdict"]
+            if entry["status"] == "failed_checks":
+                summary.append("   ⏭️ LLM review skipped: basic checks failed")
+            elif entry["status"] == "review_failed":
+                summary.append("   ⚠️ LLM review failed: no valid verdict")
+            else:
+                cached = " (cached)" if entry["cached"] else ""
+                low = " ⚠️ below the minimum score" if entry["status"] == "low_score" else ""
+                summary.append(f"   🤖 LLM score: {verdict['score']}/10{cached}{low} - "
+                               f"{verdict['justification'].strip()}")
 
         report = "\n".join(summary)
+        self.fs_tool.write_text("intermediate/evaluation.json", json.dumps(entries, indent=2, ensure_ascii=False))
         self.fs_tool.write_text("output/evaluation.txt", report)
         print("📊 Evaluation complete with LLM support.")
         return report
 
+    def run(self, regenerators: Optional[Dict[str, Callable[[Optional[str]], Any]]] = None,
+            artifacts: Optional[Iterable[str]] = None, max_iterations: Optional[int] = None,
+            time_budget_s: Optional[float] = None) -> str:
+        """
+        Evaluates the generated artifacts (all, or only the names in `artifacts`) and returns a
+        summary string. Artifacts that pass the deterministic checks and have no cached verdict
+        are reviewed by the LLM concurrently.
+
+        `regenerators` maps artifact names to callables that rewrite the document given the
+        evaluator's feedback (None for a document only rewritten because its sources were).
+        Failed artifacts are regenerated, together with the artifacts built from them, and
+        re-evaluated, for at most `max_iterations` rounds (PAPER2PROD_MAX_REGENERATIONS,
+        default 1). The regenerations must fit in `time_budget_s` seconds from the start of
+        the evaluation (PAPER2PROD_REGENERATION_BUDGET, default 300): their LLM calls get the
+        remaining time as deadline.
+        """
+        started = time.perf_counter()
+        max_iterations, time_budget_s = self._regeneration_settings(max_iterations, time_budget_s)
+        entries = self._review(self._prepare(artifacts))
+        for iteration in range(1, max_iterations + 1):
+            targets = self._regeneration_targets(entries, regenerators or {}, started, time_budget_s)
+            if not targets:
+                break
+            names = [entry["artifact"] for entry in targets]
+            print(f"🔄 Regeneration round {iteration}/{max_iterations}: {', '.join(names)}")
+            budget_end = started + time_budget_s
+            rewritten = self._regenerate(entries, targets, regenerators, budget_end)
+            names += [artifact["name"] for artifact in self.ARTIFACTS
+                      if artifact["name"] in rewritten and artifact["name"] not in names]
+            with deadline_scope(max(0.0, budget_end - time.perf_counter())):
+                entries = self._merge(entries, self._review(self._prepare(names)))
+        return self._finish(entries)
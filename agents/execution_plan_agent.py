@@ -1,32 +1,88 @@
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
+from typing import Dict, Optional
+from utils.paper_context import build_paper_context
 import json
 
 class ExecutionPlanAgent:
+    INPUTS = ("intermediate/structured_data.json", "output/prd.md", "output/architecture.md")
+    OUTPUTS = ("output/execution_plan.md",)
+    PROFILE = "execution_plan" # Perfil de generación (config/generation_profiles.json)
+
+    # Salida estructurada pedida al LLM; el Markdown del plan se genera a partir de ella
+    SCHEMA = {
+        "type": "object",
+        "properties": {
+            "phases": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "activities": {"type": "string"},
+                        "roles": {"type": "string"},
+                        "duration": {"type": "string"},
+                        "deliverables": {"type": "array", "items": {"type": "string"}},
+                        "acceptance_criteria": {"type": "string"},
+                    },
+                    "required": ["name", "activities", "roles", "duration", "deliverables", "acceptance_criteria"],
+                },
+            },
+            "milestones": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"name": {"type": "string"}, "when": {"type": "string"}},
+                    "required": ["name", "when"],
+                },
+            },
+            "risks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"risk": {"type": "string"}, "mitigation": {"type": "string"}},
+                    "required": ["risk", "mitigation"],
+                },
+            },
+        },
+        "required": ["phases", "milestones", "risks"],
+    }
+
     def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
         self.fs_tool = fs_tool
         self.llm = llm_client
 
-    def run(self, structured_data: dict):
-        """
-        Genera un plan de ejecución detallado en forma de tabla con checklist, 
-        basado en la información estructurada extraída del paper.
-        """
-        print("🗓️ Generando plan de ejecución...")
-        
-        # Leer datos del PRD y arquitectura para tener contexto adicional
-        prd_content = self.fs_tool.read_text("output/prd.md") or ""
-        arch_content = self.fs_tool.read_text("output/architecture.md") or ""
-        
-        # Construir prompt para el LLM
-        prompt = f"""Eres un Project Manager experimentado.
-Basándote en la siguiente información extraída de un paper técnico y los documentos de PRD y arquitectura ya generados,
-crea un plan de ejecución detallado en formato Markdown.
+    def _build_prompt(self, structured_data: dict, prd_content: str, arch_content: str, as_json: bool = True,
+                      feedback: Optional[str] = None) -> str:
+        # Los datos del paper van en el prompt de sistema compartido (ver utils.paper_context)
+        if as_json:
+            response_format = """Responde SOLO con un objeto JSON con:
+- "phases": lista de fases/iteraciones en orden, cada una con "name", "activities" (actividades principales),
+  "roles" (roles involucrados), "duration" (duración estimada), "deliverables" (lista de entregables)
+  y "acceptance_criteria" (criterios de aceptación de la fase)
+- "milestones": hitos clave, cada uno con "name" y "when" (fecha relativa, ej: Semana 1, Mes 2)
+- "risks": riesgos y mitigaciones, cada uno con "risk" y "mitigation\""""
+        else:
+            response_format = """Tu plan de ejecución debe incluir:
+1. Una tabla con las columnas Fase/Iteración (con numeración), Actividades principales, Roles involucrados,
+   Duración estimada y Entregables
+2. Una sección de "Hitos clave" con fechas relativas (ej: Semana 1, Mes 2)
+3. Una sección de "Riesgos y mitigaciones"
+4. Una sección "Criterios de aceptación" para cada fase
+
+Usa formato Markdown con tablas bien estructuradas."""
 
-DATOS DEL PAPER:
-Título: {structured_data.get('title', 'Proyecto sin título')}
-Problema: {structured_data.get('problem', 'No especificado')}
-Enfoque: {structured_data.get('approach', 'No especificado')}
+        feedback_text = ""
+        if feedback:
+            feedback_text = f"""Una versión anterior de este plan fue revisada y no superó la evaluación.
+Ten en cuenta estos comentarios:
+{feedback.strip()}
+
+"""
+
+        return f"""Eres un Project Manager experimentado.
+Basándote en la información extraída del paper que se te ha proporcionado y en los documentos de PRD y
+arquitectura ya generados, crea un plan de ejecución detallado.
 
 EXTRACTO DEL PRD:
 {prd_content[:500]}...
@@ -34,60 +90,61 @@ EXTRACTO DEL PRD:
 EXTRACTO DE ARQUITECTURA:
 {arch_content[:500]}...
 
-Tu plan de ejecución debe incluir:
-1. Una tabla con las siguientes columnas:
-   - Fase/Iteración (con numeración)
-   - Actividades principales
-   - Roles involucrados
-   - Duración estimada
-   - Entregables
+{feedback_text}{response_format}
+"""
 
-2. Una sección de "Hitos clave" con fechas relativas (ej: Semana 1, Mes 2)
+    def _render_markdown(self, structured_data: dict, plan: Dict) -> str:
+        """Construye el plan de ejecución en Markdown a partir de la respuesta estructurada."""
+        cell = lambda text: str(text).replace("|", "\\|").replace("\n", " ").strip()
+        lines = [f"# Plan de Ejecución: {structured_data.get('title', 'Proyecto sin título')}", "",
+                 "| # | Fase/Iteración | Actividades principales | Roles involucrados | Duración estimada | Entregables |",
+                 "|---|---|---|---|---|---|"]
+        for number, phase in enumerate(plan["phases"], start=1):
+            deliverables = ", ".join(phase["deliverables"])
+            lines.append(f"| {number} | {cell(phase['name'])} | {cell(phase['activities'])} | {cell(phase['roles'])} "
+                         f"| {cell(phase['duration'])} | {cell(deliverables)} |")
 
-3. Una sección de "Riesgos y mitigaciones"
+        lines += ["", "## Hitos clave", ""]
+        lines += [f"- **{milestone['when']}:** {milestone['name']}" for milestone in plan["milestones"]] or ["- (sin hitos)"]
 
-4. Una sección "Criterios de aceptación" para cada fase
+        lines += ["", "## Riesgos y mitigaciones", "", "| Riesgo | Mitigación |", "|---|---|"]
+        lines += [f"| {cell(risk['risk'])} | {cell(risk['mitigation'])} |" for risk in plan["risks"]]
 
-Usa formato Markdown con tablas bien estructuradas.
-"""
-        
-        # Generar el plan de ejecución usando el LLM
-        execution_plan_md = self.llm.generate(prompt)
-        
-        # Guardar el plan en el filesystem
+        lines += ["", "## Criterios de aceptación", ""]
+        for number, phase in enumerate(plan["phases"], start=1):
+            lines.append(f"- **Fase {number} ({phase['name']}):** {phase['acceptance_criteria']}")
+        return "\n".join(lines) + "\n"
+
+    def _save_plan(self, structured_data: dict, plan: Optional[Dict], fallback_md: Optional[str] = None) -> str:
+        """Guarda el plan en Markdown y, si hay respuesta estructurada, también en intermediate/execution_phases.json."""
+        if plan is not None:
+            execution_plan_md = self._render_markdown(structured_data, plan)
+            self.fs_tool.write_text("intermediate/execution_phases.json", json.dumps(plan, indent=2, ensure_ascii=False))
+        else:
+            execution_plan_md = fallback_md or ""
         self.fs_tool.write_text("output/execution_plan.md", execution_plan_md)
         print("✅ Plan de ejecución generado y guardado exitosamente.")
-        
-        # Opcional: Tratar de extraer datos estructurados del plan para uso posterior
-        try:
-            # Extraer fechas y fases clave (análisis simple)
-            phases_prompt = f"""
-Extrae las fases principales y sus duraciones del siguiente plan de ejecución,
-en formato JSON simple con este esquema: 
-{{
-  "phases": [
-    {{"name": "nombre_fase", "duration": "duración_estimada", "deliverables": ["entregable1", "entregable2"]}},
-    ...
-  ]
-}}
-
-Plan:
-{execution_plan_md}
-"""
-            phases_json_str = self.llm.generate(phases_prompt)
-            
-            # Intentar parsear la respuesta como JSON
-            try:
-                # Buscar y extraer solo la parte JSON de la respuesta
-                import re
-                json_match = re.search(r'({.*})', phases_json_str.replace('\n', ' '), re.DOTALL)
-                if json_match:
-                    phases_data = json.loads(json_match.group(1))
-                    self.fs_tool.write_text("intermediate/execution_phases.json", json.dumps(phases_data, indent=2))
-            except json.JSONDecodeError:
-                print("⚠️ No se pudo extraer datos estructurados del plan de ejecución.")
-                
-        except Exception as e:
-            print(f"⚠️ Error al procesar datos estructurados del plan: {e}")
-        
         return execution_plan_md
+
+    def run(self, structured_data: dict, feedback: Optional[str] = None):
+        """
+        Genera un plan de ejecución detallado en forma de tabla con checklist,
+        basado en la información estructurada extraída del paper. Al regenerarlo,
+        `feedback` añade al prompt los comentarios del evaluador.
+        """
+        print("🗓️ Generando plan de ejecución...")
+
+        # Leer datos del PRD y arquitectura para tener contexto adicional
+        prd_content = self.fs_tool.read_text("output/prd.md") or ""
+        arch_content = self.fs_tool.read_text("output/architecture.md") or ""
+        system = build_paper_context(structured_data)
+
+        # Una sola llamada con salida JSON: el Markdown y las fases salen de la misma respuesta
+        prompt = self._build_prompt(structured_data, prd_content, arch_content, feedback=feedback)
+        plan = self.llm.generate_json(prompt, self.SCHEMA, system=system, profile=self.PROFILE)
+        fallback_md = None
+        if plan is None:
+            print("⚠️ No se obtuvo un plan estructurado válido; generando el plan en Markdown libre.")
+            prompt = self._build_prompt(structured_data, prd_content, arch_content, as_json=False, feedback=feedback)
+            fallback_md = self.llm.generate(prompt, system=system, profile=self.PROFILE)
+        return self._save_plan(structured_data, plan, fallback_md)
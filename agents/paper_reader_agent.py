@@ -1,175 +1,436 @@
-import fitz  # PyMuPDF
+import contextvars
 import json
+import multiprocessing
+import os
 import re # Import regular expressions for parsing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from tools.extraction_cache import ExtractionCache
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
-from typing import Dict, Optional
+from tools.resilience import LLMError
+from typing import Dict, List, Optional, Tuple
+from utils.config import env_int
+from utils.hashing import sha256_file
+
+# Headings such as "3 Methods", "2.1 Datasets" or "ABSTRACT" on a line of their own
+SECTION_HEADING = re.compile(
+    r"^[ \t]*(?:\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{0,80}|(?:abstract|introduction|related work|background|"
+    r"methods?|methodology|approach|experiments?|evaluation|results|discussion|conclusions?|references|"
+    r"bibliography|acknowledge?ments?|appendix)\b[^\n]{0,40})[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Sections that carry no information for the extracted fields
+SKIPPED_SECTIONS = re.compile(r"^\s*(?:\d+(?:\.\d+)*\.?\s+)?(?:references|bibliography|acknowledge?ments?)\b", re.IGNORECASE)
+# Values the LLM uses when a field is absent from a chunk
+MISSING_VALUES = {"", "none", "n/a", "not found", "not mentioned", "not specified", "not extracted", "unknown title"}
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[Tuple[int, str, float]]:
+    """
+    Extracts pages [start, stop) of a PDF. Runs in a worker process, so it opens its own
+    document. Returns (page_number, text, seconds) tuples in page order.
+    """
+    import fitz  # PyMuPDF, imported on first extraction to keep startup fast
+    doc = fitz.open(path)
+    try:
+        pages = []
+        for number in range(start, stop):
+            page_started = time.perf_counter()
+            text = doc[number].get_text()
+            pages.append((number, text, time.perf_counter() - page_started))
+        return pages
+    finally:
+        doc.close()
 
 class PaperReaderAgent:
-    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
+    INPUTS = ("input/paper.pdf",)
+    OUTPUTS = ("intermediate/raw_paper_text.txt", "intermediate/structured_data.json")
+    PROFILE = "paper_reader" # Generation profile (config/generation_profiles.json)
+
+    # Below this page count a process pool costs more than it saves
+    PARALLEL_PAGE_THRESHOLD = 48
+    # Bump when prompts or parsing change, so cached extractions are not reused
+    EXTRACTION_VERSION = 2
+
+    # Structured output requested from the LLM for the paper (or each chunk of it)
+    SCHEMA = {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "problem": {"type": "string"},
+            "approach": {"type": "string"},
+            "metrics": {"type": "array", "items": {"type": "string"}},
+            "datasets": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["title", "problem", "approach", "metrics", "datasets"],
+    }
+    # Structured output of the reduce call that reconciles problem/approach across chunks
+    REDUCE_SCHEMA = {
+        "type": "object",
+        "properties": {"problem": {"type": "string"}, "approach": {"type": "string"}},
+        "required": ["problem", "approach"],
+    }
+
+    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient,
+                 max_pages: Optional[int] = None, extraction_workers: Optional[int] = None,
+                 analysis_mode: str = "map_reduce", chunk_chars: Optional[int] = None,
+                 chunk_overlap: Optional[int] = None, analysis_parallelism: Optional[int] = None,
+                 extraction_cache: Optional[ExtractionCache] = None):
         self.fs_tool = fs_tool
         self.llm = llm_client
+        self.extraction_cache = extraction_cache or ExtractionCache(fs_tool.cache_dir("extractions"))
+        # "map_reduce" analyzes the whole paper in chunks; "truncate" only sends the first chunk_chars characters
+        self.analysis_mode = analysis_mode
+        self.chunk_chars = chunk_chars or env_int("PAPER2PROD_CHUNK_CHARS", 8000) # Size to the model context window
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else env_int("PAPER2PROD_CHUNK_OVERLAP", 500)
+        self.analysis_parallelism = analysis_parallelism or env_int("PAPER2PROD_ANALYSIS_PARALLELISM", 4)
+        # Page limit and worker count default to PAPER2PROD_MAX_PAGES / PAPER2PROD_EXTRACTION_WORKERS
+        self.max_pages = max_pages if max_pages is not None else env_int("PAPER2PROD_MAX_PAGES")
+        self.extraction_workers = extraction_workers or env_int("PAPER2PROD_EXTRACTION_WORKERS", os.cpu_count() or 1)
+        self.page_timings: List[Tuple[int, float]] = []
         print("🧐 Initialized PaperReaderAgent.")
 
     def run(self) -> Optional[Dict]:
         """
         Reads the paper, extracts text, analyzes with LLM for structured data,
         and saves intermediate results. Returns the structured data dictionary or None on failure.
+        A previous extraction of the same PDF with the same settings is reused from the cache.
         """
         print("   ➡️ Reading and analyzing paper...")
-        paper_path_rel = "input/paper.pdf"
-        raw_text_path_rel = "intermediate/raw_paper_text.txt"
-        structured_data_path_rel = "intermediate/structured_data.json"
-
         try:
-            # 1. Get full path and check existence
-            paper_path_abs = self.fs_tool.get_full_path(paper_path_rel)
-            if not self.fs_tool.file_exists(paper_path_rel):
-                 print(f"   ❌ Error: Paper file not found at {paper_path_rel}")
-                 return None
-
-            # 2. Extract text from PDF
-            pdf_text = self._extract_text_from_pdf(paper_path_abs)
+            cache_key = self._cache_key()
+            cached_data = self._restore_cached_extraction(*cache_key) if cache_key else None
+            if cached_data:
+                return cached_data
+
+            pdf_text = self._read_paper()
             if not pdf_text:
-                print("   ❌ Error: Could not extract text from PDF.")
                 return None
-            self.fs_tool.write_text(raw_text_path_rel, pdf_text) # Save raw text
 
             # 3. Analyze text with LLM
             structured_data = self._analyze_text_with_llm(pdf_text)
-            if not structured_data:
-                 print("   ❌ Error: Failed to get structured data from LLM analysis.")
-                 return None
-
-            # 4. Save structured data
-            self.fs_tool.write_text(structured_data_path_rel, json.dumps(structured_data, indent=2))
-
-            print("   ✅ Paper parsed and structured data extracted successfully.")
+            structured_data = self._save_structured_data(structured_data)
+            if structured_data and cache_key:
+                self.extraction_cache.store(*cache_key, pdf_text, structured_data, self._extraction_settings())
             return structured_data
 
         except Exception as e:
             print(f"   ❌ An unexpected error occurred in PaperReaderAgent: {e}")
             return None
 
+    def _extraction_settings(self) -> Dict:
+        """Everything that influences the extraction result."""
+        return {
+            "version": self.EXTRACTION_VERSION,
+            "model": getattr(self.llm, "model", None),
+            "max_pages": self.max_pages,
+            "analysis_mode": self.analysis_mode,
+            "chunk_chars": self.chunk_chars,
+            "chunk_overlap": self.chunk_overlap,
+        }
+
+    def _cache_key(self) -> Optional[Tuple[str, str]]:
+        """Returns (pdf hash, settings key) for the extraction cache, or None if it is disabled."""
+        paper_path_rel = "input/paper.pdf"
+        if not self.extraction_cache.enabled or not self.fs_tool.file_exists(paper_path_rel):
+            return None
+        # The manifest already holds the hash of the paper copied into the session
+        pdf_hash = self.fs_tool.file_hash(paper_path_rel) or sha256_file(self.fs_tool.get_full_path(paper_path_rel))
+        return pdf_hash, ExtractionCache.settings_key(self._extraction_settings())
+
+    def _restore_cached_extraction(self, pdf_hash: str, settings_key: str) -> Optional[Dict]:
+        """Copies a cached extraction into the session's intermediate files and returns its structured data."""
+        cached = self.extraction_cache.load(pdf_hash, settings_key)
+        if not cached:
+            return None
+        raw_text, structured_data = cached
+        print(f"      ♻️ Reusing cached extraction for paper {pdf_hash[:12]}.")
+        self.fs_tool.write_text("intermediate/raw_paper_text.txt", raw_text)
+        self.fs_tool.write_text("intermediate/structured_data.json", json.dumps(structured_data, indent=2))
+        return structured_data
+
+    def _read_paper(self) -> Optional[str]:
+        """Extracts the text of the session's paper and saves it as an intermediate file."""
+        paper_path_rel = "input/paper.pdf"
+        raw_text_path_rel = "intermediate/raw_paper_text.txt"
+
+        # 1. Get full path and check existence
+        paper_path_abs = self.fs_tool.get_full_path(paper_path_rel)
+        if not self.fs_tool.file_exists(paper_path_rel):
+             print(f"   ❌ Error: Paper file not found at {paper_path_rel}")
+             return None
+
+        # 2. Extract text from PDF
+        pdf_text = self._extract_text_from_pdf(paper_path_abs)
+        if not pdf_text:
+            print("   ❌ Error: Could not extract text from PDF.")
+            return None
+        self.fs_tool.write_text(raw_text_path_rel, pdf_text) # Save raw text
+        timings = [{"page": number + 1, "ms": round(seconds * 1000, 2)} for number, seconds in self.page_timings]
+        self.fs_tool.write_text("intermediate/extraction_timings.json", json.dumps(timings, indent=2))
+        return pdf_text
+
+    def _save_structured_data(self, structured_data: Optional[Dict]) -> Optional[Dict]:
+        structured_data_path_rel = "intermediate/structured_data.json"
+        if not structured_data:
+             print("   ❌ Error: Failed to get structured data from LLM analysis.")
+             return None
+
+        # 4. Save structured data
+        self.fs_tool.write_text(structured_data_path_rel, json.dumps(structured_data, indent=2))
+
+        print("   ✅ Paper parsed and structured data extracted successfully.")
+        return structured_data
+
 
     def _extract_text_from_pdf(self, path: str) -> Optional[str]:
-        """Extracts text content from a PDF file."""
+        """
+        Extracts text content from a PDF file. Large documents are split into page ranges
+        extracted by a process pool and reassembled in page order.
+        """
         try:
+            import fitz  # PyMuPDF, imported on first extraction to keep startup fast
+            started = time.perf_counter()
             doc = fitz.open(path)
-            text = "\n".join([page.get_text() for page in doc])
+            page_count = doc.page_count
             doc.close()
-            print(f"      📄 Extracted ~{len(text)} characters from PDF.")
+            if self.max_pages:
+                page_count = min(page_count, self.max_pages)
+
+            workers = min(self.extraction_workers, page_count)
+            if page_count < self.PARALLEL_PAGE_THRESHOLD:
+                workers = 1
+            if workers <= 1:
+                pages = _extract_page_range(path, 0, page_count)
+            else:
+                # A few ranges per worker keeps the pool busy when some pages are much slower
+                range_size = max(1, -(-page_count // (workers * 4)))
+                ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+                try:
+                    # 'spawn' avoids forking a process that may be running other threads (batch mode)
+                    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                        futures = [pool.submit(_extract_page_range, path, start, stop) for start, stop in ranges]
+                        pages = [page for future in futures for page in future.result()]
+                except BrokenProcessPool as e:
+                    print(f"      ⚠️ Parallel extraction failed ({e}), falling back to a single process.")
+                    workers = 1
+                    pages = _extract_page_range(path, 0, page_count)
+
+            text = "\n".join(page_text for _, page_text, _ in pages)
+            self.page_timings = [(number, seconds) for number, _, seconds in pages]
+            elapsed = time.perf_counter() - started
+            print(f"      📄 Extracted ~{len(text)} characters from {page_count} pages in {elapsed:.2f}s ({workers} worker(s)).")
+            if self.page_timings:
+                slowest_page, slowest_seconds = max(self.page_timings, key=lambda timing: timing[1])
+                print(f"      ⏱️ Slowest page: {slowest_page + 1} ({slowest_seconds * 1000:.0f} ms)")
             return text
         except Exception as e:
             print(f"      ❌ Error extracting text from PDF {path}: {e}")
             return None
 
-    def _analyze_text_with_llm(self, text: str) -> Optional[Dict]:
-        """Uses LLM to extract structured information from the paper text."""
+    def _split_sections(self, text: str) -> List[str]:
+        """Splits text at section headings, dropping references/acknowledgements (up to the next kept heading)."""
+        starts = [match.start() for match in SECTION_HEADING.finditer(text)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        sections = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+        kept = []
+        skipping = False
+        for section in sections:
+            if SKIPPED_SECTIONS.match(section):
+                skipping = True
+            elif skipping and re.match(r"^\s*appendix\b", section, re.IGNORECASE):
+                skipping = False
+            if not skipping:
+                kept.append(section)
+        return kept
+
+    def _split_into_chunks(self, text: str) -> List[str]:
+        """
+        Packs whole sections into chunks of at most `chunk_chars` characters. Sections larger
+        than a chunk are cut at paragraph boundaries when possible. Each chunk after the first
+        starts with the last `chunk_overlap` characters of the previous one.
+        """
+        # Leave room for the overlap carried over from the previous chunk
+        body_limit = max(1, self.chunk_chars - self.chunk_overlap)
+        pieces = []
+        for section in self._split_sections(text):
+            while len(section) > body_limit:
+                cut = section.rfind("\n\n", 0, body_limit)
+                if cut < body_limit // 2:
+                    cut = body_limit
+                pieces.append(section[:cut])
+                section = section[cut:]
+            if section.strip():
+                pieces.append(section)
+
+        chunks = []
+        current = ""
+        for piece in pieces:
+            if current and len(current) + len(piece) > body_limit:
+                chunks.append(current)
+                overlap = current[-self.chunk_overlap:] if self.chunk_overlap else ""
+                current = overlap + piece
+            else:
+                current += piece
+        if current.strip():
+            chunks.append(current)
+        return chunks
+
+    def _build_analysis_prompt(self, text: str, part: int = 1, total_parts: int = 1) -> str:
         # Limit text length to avoid exceeding context window or costs
-        max_chars = 8000 # Adjust as needed based on model context window
+        max_chars = self.chunk_chars # Adjust as needed based on model context window
         text_snippet = text[:max_chars]
+        part_note = ""
+        if total_parts > 1:
+            part_note = (f"\nThis is part {part} of {total_parts} of the paper. If a field is not covered in this part, "
+                         f"answer \"Not found\" for it (or an empty list for metrics and datasets).\n")
 
-        prompt = f"""Please analyze the following research paper text and extract the key information in a structured format. Focus on these fields:
+        return f"""Please analyze the following research paper text and extract the key information in a structured format. Focus on these fields:
 
 1.  **Title:** The main title of the paper.
 2.  **Problem:** Briefly describe the core problem the paper addresses.
 3.  **Approach:** Summarize the main methodology or approach proposed.
 4.  **Metrics:** List the key metrics used for evaluation.
 5.  **Datasets:** Mention any specific datasets used or created.
-
-Respond ONLY with the extracted information, using clear labels for each field (e.g., "Title: ...", "Problem: ...").
+{part_note}
+Respond ONLY with a JSON object with the fields "title", "problem", "approach", "metrics" (list of strings) and "datasets" (list of strings).
 
 --- START PAPER TEXT ---
 {text_snippet}
 --- END PAPER TEXT ---
+"""
+
+    def _build_reduce_prompt(self, problems: List[str], approaches: List[str]) -> str:
+        numbered = lambda items: "\n".join(f"{index}. {item}" for index, item in enumerate(items, start=1))
+        return f"""The following notes were extracted from different parts of the same research paper.
+Merge them into a single, non-redundant description of the paper's core problem and of its approach.
 
-Extracted Information:
+Problem notes:
+{numbered(problems) or "None"}
+
+Approach notes:
+{numbered(approaches) or "None"}
+
+Respond ONLY with a JSON object with the fields "problem" and "approach".
 """
+
+    def _use_map_reduce(self, text: str) -> bool:
+        return self.analysis_mode == "map_reduce" and len(text) > self.chunk_chars
+
+    def _analyze_text_with_llm(self, text: str) -> Optional[Dict]:
+        """Uses LLM to extract structured information from the paper text."""
+        if self._use_map_reduce(text):
+            return self._map_reduce_analysis(text)
         print("      🤖 Sending text snippet to LLM for analysis...")
         try:
-            llm_response = self.llm.generate(prompt)
-            if not llm_response:
-                 print("      ⚠️ LLM returned an empty response.")
-                 return None
-            print("      🤖 Received LLM response. Parsing...")
-            # print(f"LLM Raw Response:\n{llm_response[:500]}...") # Optional: for debugging
-            parsed_data = self._parse_llm_response(llm_response)
-            return parsed_data
+            llm_response = self.llm.generate_json(self._build_analysis_prompt(text), self.SCHEMA,
+                                                  profile=self.PROFILE)
+            return self._handle_llm_response(llm_response)
+        except Exception as e:
+            print(f"      ❌ Error during LLM analysis: {e}")
+            return None
+
+    def _map_reduce_analysis(self, text: str) -> Optional[Dict]:
+        """Extracts fields from every chunk concurrently, then merges them into one dict."""
+        chunks = self._split_into_chunks(text)
+        print(f"      🤖 Analyzing {len(chunks)} chunks with up to {self.analysis_parallelism} parallel LLM calls...")
+        prompts = [self._build_analysis_prompt(chunk, index, len(chunks)) for index, chunk in enumerate(chunks, start=1)]
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.analysis_parallelism), thread_name_prefix="analysis") as pool:
+                # One context copy per call keeps the calls attributed to this stage in the metrics
+                futures = [pool.submit(contextvars.copy_context().run, self._analyze_chunk, prompt, index)
+                           for index, prompt in enumerate(prompts, start=1)]
+                responses = [future.result() for future in futures]
+            merged, reduce_prompt = self._merge_partials(responses)
+            if merged and reduce_prompt:
+                print("      🤖 Merging problem/approach notes from all chunks...")
+                try:
+                    merged = self._apply_reduce(merged, self.llm.generate_json(reduce_prompt, self.REDUCE_SCHEMA,
+                                                                               profile=self.PROFILE))
+                except LLMError as e:
+                    print(f"      ⚠️ Reduce call failed, keeping the notes of the first chunk: {e}")
+            return merged
         except Exception as e:
             print(f"      ❌ Error during LLM analysis: {e}")
             return None
 
-    def _parse_llm_response(self, response: str) -> Dict:
+    def _analyze_chunk(self, prompt: str, index: int) -> Optional[Dict]:
+        """One map call; a chunk the LLM could not answer is left out of the merge instead of failing the paper."""
+        try:
+            return self.llm.generate_json(prompt, self.SCHEMA, profile=self.PROFILE)
+        except LLMError as e:
+            print(f"      ⚠️ Chunk {index} could not be analyzed: {e}")
+            return None
+
+    def _merge_partials(self, responses: List[Optional[Dict]]) -> Tuple[Optional[Dict], Optional[str]]:
         """
-        Parses the LLM response to extract structured fields.
-        This is a basic parser and might need improvement based on LLM output format.
+        Merges per-chunk extractions: the first title found wins, metrics and datasets are
+        deduplicated across chunks. Returns the merged dict and, if several chunks disagree
+        on problem/approach, the prompt for the reduce call that reconciles them.
         """
-        data = {
-            "title": "Unknown Title",
+        partials = [self._normalize_extraction(response) for response in responses if response]
+        if not partials:
+            print("      ⚠️ LLM returned no usable responses for any chunk.")
+            return None, None
+
+        is_present = lambda value: isinstance(value, str) and value.strip().lower().rstrip(".") not in MISSING_VALUES
+        merged = {
+            "title": next((p["title"] for p in partials if is_present(p["title"])), "Unknown Title"),
             "problem": "Not extracted",
             "approach": "Not extracted",
             "metrics": [],
             "datasets": []
         }
+        for field in ("metrics", "datasets"):
+            seen = set()
+            for partial in partials:
+                for item in partial[field]:
+                    if is_present(item) and item.lower() not in seen:
+                        seen.add(item.lower())
+                        merged[field].append(item)
+
+        candidates = {}
+        for field in ("problem", "approach"):
+            values = []
+            for partial in partials:
+                if is_present(partial[field]) and partial[field] not in values:
+                    values.append(partial[field])
+            candidates[field] = values
+            if values:
+                merged[field] = values[0]
 
-        # Try to extract fields using simple regex or string splitting
-        # This assumes the LLM follows the requested format reasonably well.
-        fields = ["Title", "Problem", "Approach", "Metrics", "Datasets"]
-        current_field = None
-        content_buffer = ""
-
-        lines = response.splitlines()
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            matched_field = None
-            for field in fields:
-                # Check if line starts with "Field:" or "Field Name:" etc.
-                if re.match(rf"^\s*{re.escape(field)}\s*[:\-]", line, re.IGNORECASE):
-                    matched_field = field
-                    # Extract content after the colon/dash
-                    content_after_label = re.sub(rf"^\s*{re.escape(field)}\s*[:\-]\s*", "", line, flags=re.IGNORECASE)
-                    break # Found the field label for this line
-
-            if matched_field:
-                # If we were buffering content for a previous field, save it
-                if current_field and content_buffer:
-                    if current_field in ["Metrics", "Datasets"]:
-                         # Simple list splitting for metrics/datasets
-                         items = [item.strip() for item in content_buffer.split(',') if item.strip()]
-                         data[current_field.lower()] = items
-                    else:
-                         data[current_field.lower()] = content_buffer.strip()
-
-                # Start buffering for the new field
-                current_field = matched_field
-                content_buffer = content_after_label # Start with content on the same line
-            elif current_field:
-                # If it's not a new field label, append to the current buffer
-                content_buffer += " " + line
-
-        # Save the last buffered content
-        if current_field and content_buffer:
-             if current_field in ["Metrics", "Datasets"]:
-                 items = [item.strip() for item in content_buffer.split(',') if item.strip()]
-                 data[current_field.lower()] = items
-             else:
-                 data[current_field.lower()] = content_buffer.strip()
-
-
-        # Fallback/Refinement: If title wasn't found via label, maybe take the first line?
-        if data["title"] == "Unknown Title" and lines:
-             potential_title = lines[0].strip()
-             # Basic check if it looks like a title (not a label itself)
-             is_label = any(re.match(rf"^\s*{re.escape(f)}\s*[:\-]", potential_title, re.IGNORECASE) for f in fields)
-             if not is_label and len(potential_title) > 5 and len(potential_title) < 150:
-                 data["title"] = potential_title
-
-
-        print(f"      📊 Parsed structured data: Title='{data.get('title', '')[:50]}...', Problem='{data.get('problem', '')[:50]}...'")
-        return data
+        if len(candidates["problem"]) > 1 or len(candidates["approach"]) > 1:
+            return merged, self._build_reduce_prompt(candidates["problem"], candidates["approach"])
+        return merged, None
 
+    def _apply_reduce(self, merged: Dict, reduce_response: Optional[Dict]) -> Dict:
+        """Takes problem/approach from the reduce response, keeping the first-chunk values otherwise."""
+        if not reduce_response:
+            return merged
+        for field in ("problem", "approach"):
+            value = reduce_response[field].strip()
+            if value:
+                merged[field] = value
+        return merged
+
+    def _handle_llm_response(self, llm_response: Optional[Dict]) -> Optional[Dict]:
+        if not llm_response:
+             print("      ⚠️ LLM returned no valid structured response.")
+             return None
+        return self._normalize_extraction(llm_response)
+
+    def _normalize_extraction(self, data: Dict) -> Dict:
+        """Cleans a schema-validated extraction: trims values and fills empty fields with defaults."""
+        clean_list = lambda items: [item.strip() for item in items if item.strip()]
+        normalized = {
+            "title": data["title"].strip() or "Unknown Title",
+            "problem": data["problem"].strip() or "Not extracted",
+            "approach": data["approach"].strip() or "Not extracted",
+            "metrics": clean_list(data["metrics"]),
+            "datasets": clean_list(data["datasets"])
+        }
+        print(f"      📊 Parsed structured data: Title='{normalized['title'][:50]}...', Problem='{normalized['problem'][:50]}...'")
+        return normalized
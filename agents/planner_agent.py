@@ -1,90 +1,128 @@
 import json
+import re
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
+from utils.paper_context import build_paper_context
 from typing import Dict, Optional
 
 class PlannerAgent:
-    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
+    INPUTS = ("intermediate/structured_data.json",)
+    OUTPUTS = ("intermediate/plan.json",)
+    PROFILE = "planner" # Generation profile (config/generation_profiles.json)
+    OPTIONAL_INPUTS = ("input/prompt.txt",)
+    MODES = ("llm", "heuristic")
+
+    # Deliverables the user prompt can restrict the plan to in heuristic mode (English and Spanish)
+    PROMPT_KEYWORDS = {
+        "generate_prd": r"prd\b|(?:product )?requirements? document|documento de requisitos",
+        "design_architecture": r"architecture|arquitectura|system design|diseño del sistema",
+        "execution_plan": r"execution plan|plan de ejecuci[oó]n|roadmap|cronograma",
+        "evaluation": r"evaluation|evaluaci[oó]n|review|revisi[oó]n",
+    }
+    # Only a deliverable list right after one of these words narrows the plan ("only the PRD", "solo el PRD")
+    RESTRICTIVE = r"\b(?:only|just|solo|sólo|[uú]nicamente)\b"
+    LIST_FILLER = (r"(?:\s|,|&|\b(?:the|a|an|and|need|want|generate|write|el|la|los|las|un|una|y|e|quiero|"
+                   r"necesito|genera|generar)\b)*")
+
+    # Structured output requested from the LLM
+    SCHEMA = {
+        "type": "object",
+        "properties": {
+            "steps": {"type": "array", "items": {"type": "string"}},
+            "generate_prd": {"type": "boolean"},
+            "design_architecture": {"type": "boolean"},
+            "evaluation": {"type": "boolean"},
+        },
+        "required": ["steps", "generate_prd", "design_architecture", "evaluation"],
+    }
+
+    def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient, mode: str = "llm"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown planning mode '{mode}' (expected one of: {', '.join(self.MODES)})")
         self.fs_tool = fs_tool
         self.llm = llm_client
+        # "heuristic" derives the plan from the user prompt without calling the LLM
+        self.mode = mode
         print("🧭 Initialized PlannerAgent.")
 
+    def _load_structured_data(self, structured_data: Optional[Dict]) -> Optional[Dict]:
+        """Returns the structured data passed in, or reads it from the intermediate file."""
+        structured_data_path_rel = "intermediate/structured_data.json" # Path to read from
+        if structured_data:
+            return structured_data
+        print("      ⚠️ Structured data not provided directly, attempting to read from file...")
+        data_str = self.fs_tool.read_text(structured_data_path_rel)
+        if not data_str:
+            print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
+            return None
+        try:
+            return json.loads(data_str)
+        except json.JSONDecodeError:
+            print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
+            return None
+
+    def _build_prompt(self, structured_data: Dict) -> str:
+        # The paper itself is sent as the shared system prompt (see utils.paper_context)
+        return f"""Based on the extracted information from the research paper,
+generate a high-level task plan for developing a software product that implements this idea.
+List the main steps needed, e.g. "Generate PRD", "Design Architecture", "Propose Implementation", "Evaluate Results".
+
+Respond ONLY with a JSON object with:
+- "steps": the main steps, in order
+- "generate_prd": whether a PRD (Product Requirements Document) is needed
+- "design_architecture": whether a system architecture design is needed
+- "evaluation": whether the results should be evaluated (testing/review)
+"""
+
+    def _save_plan(self, llm_response: Optional[Dict]) -> Dict:
+        """Builds the plan from the structured LLM response (or falls back to the default plan) and saves it."""
+        plan_path_rel = "intermediate/plan.json"
+        if not llm_response:
+             print("      ⚠️ LLM returned no valid structured response for planning.")
+             plan = self._create_default_plan()
+        else:
+             print("      🤖 Received planning response from LLM.")
+             plan = self._plan_from_response(llm_response)
+
+        # Save the generated plan
+        self.fs_tool.write_text(plan_path_rel, json.dumps(plan, indent=2))
+        print("   ✅ Planning completed and saved.")
+        return plan
+
     def run(self, structured_data: dict) -> Optional[Dict]:
         """
         Plans the sequence of actions based on the structured data from the paper using LLM support.
         Returns the plan dictionary or None on failure.
         """
         print("   ➡️ Generating execution plan...")
-        plan_path_rel = "intermediate/plan.json"
-        structured_data_path_rel = "intermediate/structured_data.json" # Path to read from
-
+        if self.mode == "heuristic":
+            return self._save_heuristic_plan()
         try:
             # Ensure structured_data is available (either passed directly or read from file)
+            structured_data = self._load_structured_data(structured_data)
             if not structured_data:
-                 print("      ⚠️ Structured data not provided directly, attempting to read from file...")
-                 data_str = self.fs_tool.read_text(structured_data_path_rel)
-                 if not data_str:
-                     print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
-                     return None
-                 try:
-                     structured_data = json.loads(data_str)
-                 except json.JSONDecodeError:
-                     print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
-                     return None
-
-            # Prepare prompt for LLM
-            planning_prompt = f"""Given the following extracted information from a research paper:
-
-Title: {structured_data.get('title', 'Untitled')}
-Problem: {structured_data.get('problem', 'Not specified')}
-Approach: {structured_data.get('approach', 'Not specified')}
-
-Generate a high-level task plan for developing a software product that implements this idea.
-List the main steps needed. Focus on including keywords like:
-- PRD (for Product Requirements Document)
-- Architecture (for system design)
-- Implementation (for coding/scaffolding)
-- Evaluation (for testing/review)
-
-Respond ONLY with a bulleted or numbered list of the main steps.
-Example:
-- Generate PRD
-- Design Architecture
-- Propose Implementation
-- Evaluate Results
-"""
+                return None
+
             print("      🤖 Sending planning request to LLM...")
-            llm_response = self.llm.generate(planning_prompt)
-
-            if not llm_response:
-                 print("      ⚠️ LLM returned an empty response for planning.")
-                 # Create a default plan as fallback?
-                 plan = self._create_default_plan(llm_response or "")
-            else:
-                 print("      🤖 Received planning response from LLM. Parsing...")
-                 # Parse the LLM response to determine which steps are included
-                 plan = self._parse_llm_plan(llm_response)
-
-            # Save the generated plan
-            self.fs_tool.write_text(plan_path_rel, json.dumps(plan, indent=2))
-            print("   ✅ Planning completed and saved.")
-            return plan
+            llm_response = self.llm.generate_json(self._build_prompt(structured_data), self.SCHEMA,
+                                                  system=build_paper_context(structured_data), profile=self.PROFILE)
+            return self._save_plan(llm_response)
 
         except Exception as e:
             print(f"   ❌ An unexpected error occurred in PlannerAgent: {e}")
             return None
 
-    def _parse_llm_plan(self, llm_response: str) -> Dict:
-        """Parses the LLM response to create a structured plan dictionary."""
-        response_lower = llm_response.lower()
+    def _plan_from_response(self, llm_response: Dict) -> Dict:
+        """Turns the structured LLM response into the plan dictionary."""
+        steps = [step.strip() for step in llm_response["steps"] if step.strip()]
         plan = {
-            # Check for keywords in the LLM response
-            "generate_prd": "prd" in response_lower or "product requirement" in response_lower,
-            "design_architecture": "architecture" in response_lower or "design" in response_lower,
+            "generate_prd": llm_response["generate_prd"],
+            "design_architecture": llm_response["design_architecture"],
             # Exclude implementer for now based on user request
-            "propose_implementation": False, # "implementation" in response_lower or "coding" in response_lower or "scaffold" in response_lower,
-            "evaluation": "evaluation" in response_lower or "testing" in response_lower or "review" in response_lower,
-            "llm_plan_text": llm_response.strip() # Store the raw LLM plan text
+            "propose_implementation": False,
+            "evaluation": llm_response["evaluation"],
+            "execution_plan": True,
+            "llm_plan_text": "\n".join(f"- {step}" for step in steps) # Keep the LLM's steps as readable text
         }
         print(f"      📊 Parsed plan: PRD={plan['generate_prd']}, Arch={plan['design_architecture']}, Impl={plan['propose_implementation']}, Eval={plan['evaluation']}")
         if not plan["propose_implementation"]:
@@ -99,5 +137,50 @@ Example:
             "design_architecture": True,
             "propose_implementation": False, # Skipped
             "evaluation": True,
+            "execution_plan": True,
             "llm_plan_text": llm_response_text
         }
+
+    def _restricted_deliverables(self, prompt_lower: str) -> set:
+        """Flags of the deliverables listed right after a restrictive word ("only the PRD and the architecture")."""
+        selected = set()
+        for marker in re.finditer(self.RESTRICTIVE, prompt_lower):
+            position = marker.end()
+            while True:
+                position = re.compile(self.LIST_FILLER).match(prompt_lower, position).end()
+                match = next(((flag, found) for flag, pattern in self.PROMPT_KEYWORDS.items()
+                              if (found := re.compile(pattern).match(prompt_lower, position))), None)
+                if not match:
+                    break
+                selected.add(match[0])
+                position = match[1].end()
+        return selected
+
+    def _plan_from_prompt(self, user_prompt: str) -> Dict:
+        """
+        Derives the plan from the user prompt: only an explicit restriction ("only the PRD", "solo la
+        arquitectura") narrows it to the deliverables listed; any other prompt selects all of them, since
+        words like "review" or "requirements" in a product description do not name a deliverable.
+        The execution plan needs the PRD and the architecture.
+        """
+        restricted = self._restricted_deliverables(user_prompt.lower())
+        selected = {flag: not restricted or flag in restricted for flag in self.PROMPT_KEYWORDS}
+        if selected["execution_plan"]:
+            selected["generate_prd"] = selected["design_architecture"] = True
+        step_names = {"generate_prd": "Generate PRD", "design_architecture": "Design Architecture",
+                      "execution_plan": "Plan Execution", "evaluation": "Evaluate Results"}
+        steps = [step_names[flag] for flag in self.PROMPT_KEYWORDS if selected[flag]]
+        return {
+            **selected,
+            "propose_implementation": False, # Skipped
+            "llm_plan_text": "\n".join(f"- {step}" for step in steps)
+        }
+
+    def _save_heuristic_plan(self) -> Dict:
+        """Builds the plan from input/prompt.txt without an LLM call and saves it."""
+        plan = self._plan_from_prompt(self.fs_tool.read_text("input/prompt.txt") or "")
+        self.fs_tool.write_text("intermediate/plan.json", json.dumps(plan, indent=2))
+        print(f"      📊 Heuristic plan: PRD={plan['generate_prd']}, Arch={plan['design_architecture']}, "
+              f"Plan={plan['execution_plan']}, Eval={plan['evaluation']}")
+        print("   ✅ Planning completed and saved.")
+        return plan
@@ -1,46 +1,46 @@
 import json
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
+from tools.resilience import LLMError
+from utils.feedback import feedback_section
+from utils.paper_context import build_paper_context
+from utils.streaming import with_markdown_heading
 from typing import Dict, Optional
 
 class PRDWriterAgent:
+    INPUTS = ("intermediate/structured_data.json",)
+    OUTPUTS = ("output/prd.md",)
+    PROFILE = "prd_writer" # Generation profile (config/generation_profiles.json)
+    END_MARKER = "--- END PRD ---" # Also the profile's stop sequence
+
     def __init__(self, fs_tool: FileSystemTool, llm_client: OllamaClient):
         self.fs_tool = fs_tool
         self.llm = llm_client
         print("✍️ Initialized PRDWriterAgent.")
 
-    def run(self, structured_data: Optional[Dict] = None):
-        """
-        Creates a Product Requirements Document (PRD) in Markdown format
-        from structured data using an LLM.
-        """
-        print("   ➡️ Generating Product Requirements Document (PRD)...")
-        prd_path_rel = "output/prd.md"
+    def _load_structured_data(self, structured_data: Optional[Dict]) -> Optional[Dict]:
+        """Returns the structured data passed in, or reads it from the intermediate file."""
         structured_data_path_rel = "intermediate/structured_data.json"
-
+        if structured_data:
+            return structured_data
+        print("      ⚠️ Structured data not provided directly, attempting to read from file...")
+        data_str = self.fs_tool.read_text(structured_data_path_rel)
+        if not data_str:
+            print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
+            return None # Cannot proceed without structured data
         try:
-            # Ensure structured_data is available
-            if not structured_data:
-                 print("      ⚠️ Structured data not provided directly, attempting to read from file...")
-                 data_str = self.fs_tool.read_text(structured_data_path_rel)
-                 if not data_str:
-                     print(f"      ❌ Error: Could not read structured data from {structured_data_path_rel}")
-                     return # Cannot proceed without structured data
-                 try:
-                     structured_data = json.loads(data_str)
-                 except json.JSONDecodeError:
-                     print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
-                     return # Cannot proceed
+            return json.loads(data_str)
+        except json.JSONDecodeError:
+            print(f"      ❌ Error: Invalid JSON in {structured_data_path_rel}")
+            return None # Cannot proceed
 
-            # Prepare prompt for LLM
-            prompt = f"""You are a skilled Technical Product Manager. Your task is to generate a comprehensive Product Requirements Document (PRD) in Markdown format. Use the structured information extracted from a research paper provided below.
+    def _heading(self, structured_data: Dict) -> str:
+        return f"# Product Requirements Document: {structured_data.get('title', 'Untitled Project')}"
 
-Extracted Paper Information:
-- **Title:** {structured_data.get('title', 'Untitled Project')}
-- **Problem:** {structured_data.get('problem', 'No problem description provided.')}
-- **Approach:** {structured_data.get('approach', 'No approach description provided.')}
-- **Metrics:** {', '.join(structured_data.get('metrics', ['Not specified']))}
-- **Datasets:** {', '.join(structured_data.get('datasets', ['Not specified']))}
+    def _build_prompt(self, structured_data: Dict, feedback: Optional[str] = None) -> str:
+        # (The prompt structure guides the LLM to start the Markdown directly)
+        # The paper itself is sent as the shared system prompt (see utils.paper_context)
+        return f"""You are a skilled Technical Product Manager. Your task is to generate a comprehensive Product Requirements Document (PRD) in Markdown format. Use the extracted paper information you were given.
 
 Please generate the PRD including at least the following sections:
 1.  **Introduction/Overview:** Briefly introduce the product and its purpose based on the paper.
@@ -53,31 +53,43 @@ Please generate the PRD including at least the following sections:
 8.  **Constraints/Assumptions:** Any limitations or assumptions made.
 9.  **(Optional) Future Considerations:** Potential next steps or enhancements.
 
-Respond ONLY with the complete PRD in well-formatted Markdown. Do not include any introductory text before the PRD content.
+{feedback_section(feedback)}Respond ONLY with the complete PRD in well-formatted Markdown. Do not include any introductory text before the PRD content. End the PRD with a line containing only {self.END_MARKER}
 
 --- START PRD ---
 # Product Requirements Document: {structured_data.get('title', 'Untitled Project')}
 
 """
-            # (The prompt structure guides the LLM to start the Markdown directly)
 
-            print("      🤖 Sending PRD generation request to LLM...")
-            prd_md_content = self.llm.generate(prompt)
+    def run(self, structured_data: Optional[Dict] = None, feedback: Optional[str] = None):
+        """
+        Creates a Product Requirements Document (PRD) in Markdown format
+        from structured data using an LLM. `feedback` from the evaluator is added to
+        the prompt when the document is regenerated.
+        """
+        print("   ➡️ Generating Product Requirements Document (PRD)...")
+        prd_path_rel = "output/prd.md"
 
-            if not prd_md_content:
+        try:
+            structured_data = self._load_structured_data(structured_data)
+            if not structured_data:
+                return
+            prompt = self._build_prompt(structured_data, feedback)
+            system = build_paper_context(structured_data)
+
+            print("      🤖 Streaming PRD generation from LLM...")
+            # Ensure the response starts reasonably (sometimes LLMs add preamble):
+            # if the response doesn't start with '#', the title line is prepended.
+            chunks = with_markdown_heading(self.llm.stream(prompt, system=system, profile=self.PROFILE),
+                                           self._heading(structured_data), self.END_MARKER)
+            written = self.fs_tool.write_stream(prd_path_rel, chunks)
+
+            if not written:
                  print("      ⚠️ LLM returned empty content for PRD. Skipping file write.")
                  return
 
-            # Ensure the response starts reasonably (sometimes LLMs add preamble)
-            # A simple check: if the response doesn't start with '#', prepend the title line.
-            if not prd_md_content.strip().startswith("#"):
-                 print("      ⚠️ LLM response didn't start with Markdown title, prepending.")
-                 prd_md_content = f"# Product Requirements Document: {structured_data.get('title', 'Untitled Project')}\n\n" + prd_md_content
-
-            # Save the generated PRD
-            self.fs_tool.write_text(prd_path_rel, prd_md_content)
             print(f"   ✅ PRD document generated and saved to {prd_path_rel}.")
 
+        except LLMError:
+            raise # No completion: the stage fails instead of looking like an empty response
         except Exception as e:
             print(f"   ❌ An unexpected error occurred in PRDWriterAgent: {e}")
-
@@ -1,8 +1,10 @@
-import shutil
 from pathlib import Path
 from tools.filesystem_tool import FileSystemTool # Assuming FileSystemTool is in tools directory
 
 class UserPromptAgent:
+    INPUTS = ()
+    OUTPUTS = ("input/prompt.txt", "input/paper.pdf")
+
     def __init__(self, prompt: str, paper_path: str, fs_tool: FileSystemTool):
         self.prompt = prompt
         # Ensure paper_path is absolute and exists before proceeding
@@ -28,17 +30,13 @@ class UserPromptAgent:
             # Save prompt to a file using FileSystemTool
             self.fs_tool.write_text(prompt_file_rel, self.prompt)
 
-            # Get the destination path within the workspace using FileSystemTool
-            dest_path_abs = self.fs_tool.get_full_path(paper_file_rel)
-            dest_dir = Path(dest_path_abs).parent
-
-            # Ensure the destination directory exists (FileSystemTool's write_text handles this,
-            # but explicit creation might be needed if copying first)
-            # self.fs_tool.make_directory("input") # Redundant if write_text is called first
-
             # Copy the paper file to the workspace input directory
-            shutil.copy2(self.paper_path, dest_path_abs)
-            print(f"   📄 Copied paper to: {paper_file_rel}")
+            # (a resumed session already holds it, in which case source and destination match)
+            dest_path_abs = Path(self.fs_tool.get_full_path(paper_file_rel))
+            if dest_path_abs.exists() and dest_path_abs.samefile(self.paper_path):
+                print(f"   📄 Paper already in place: {paper_file_rel}")
+            else:
+                self.fs_tool.copy_into(str(self.paper_path), paper_file_rel)
 
             print("   ✅ Session workspace initialized successfully.")
 
@@ -0,0 +1,139 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+from main import close_logger, orchestrate_agents, setup_session
+from tools.ollama_client import OllamaClient
+from utils.checkpoint import CheckpointStore
+from utils.config import workspace_cache_dir
+
+def load_jobs(source: str, prompt: str = None) -> List[Dict]:
+    """
+    Builds the job list from a folder of PDFs (all sharing `prompt`) or from a JSONL
+    manifest with one {"prompt": ..., "paper": ...} object per line. Relative paper
+    paths in a manifest are resolved against the manifest's directory.
+    """
+    source_path = Path(source).expanduser().resolve()
+    jobs = []
+    if source_path.is_dir():
+        if not prompt:
+            raise ValueError("A --prompt is required when processing a folder of papers.")
+        for paper in sorted(source_path.glob("*.pdf")):
+            jobs.append({"prompt": prompt, "paper": str(paper)})
+        return jobs
+
+    with source_path.open(encoding="utf-8") as manifest:
+        for line_number, line in enumerate(manifest, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            paper = entry.get("paper") or entry.get("paper_path")
+            job_prompt = entry.get("prompt") or prompt
+            if not paper or not job_prompt:
+                raise ValueError(f"Manifest line {line_number} needs both 'prompt' and 'paper'.")
+            paper_path = Path(paper).expanduser()
+            if not paper_path.is_absolute():
+                paper_path = source_path.parent / paper_path
+            jobs.append({"prompt": job_prompt, "paper": str(paper_path.resolve())})
+    return jobs
+
+def run_job(job: Dict, llm_client: OllamaClient, max_parallel_stages: int, base_dir: str = "workspace") -> Dict:
+    """
+    Runs one paper in its own session and returns its summary row. The job may also carry
+    `only` (deliverable names) and `plan_mode`, passed on to `orchestrate_agents`. A run that
+    finishes with failed stages (or stages that wrote no output) is "partial", and they are
+    listed in `failed_stages`.
+    """
+    started = time.perf_counter()
+    result = {"paper": job["paper"], "session": None, "status": "failed", "duration_s": 0.0, "error": None,
+              "failed_stages": []}
+
+    paper_file = Path(job["paper"])
+    if not paper_file.is_file() or paper_file.suffix.lower() != ".pdf":
+        result["status"] = "invalid"
+        result["error"] = "Paper not found or not a PDF"
+        return result
+
+    logger = None
+    try:
+        session_path, fs_tool, logger = setup_session(base_dir)
+        result["session"] = session_path
+        orchestrate_agents(job["prompt"], job["paper"], session_path, fs_tool, llm_client, logger,
+                           max_parallel_stages=max_parallel_stages, only=job.get("only"),
+                           plan_mode=job.get("plan_mode"))
+        # The non-critical stages fail without aborting the run; their checkpoints tell
+        result["failed_stages"] = CheckpointStore(session_path).unfinished()
+        result["status"] = "partial" if result["failed_stages"] else "ok"
+        if result["failed_stages"]:
+            result["error"] = f"Stages failed: {', '.join(result['failed_stages'])}"
+    except Exception as e:
+        if logger is not None:
+            logger.error(f"❌ Session failed: {e}", exc_info=True)
+        else:
+            print(f"❌ Could not create a session for {paper_file.name}: {e}")
+        result["error"] = str(e)
+    finally:
+        result["duration_s"] = round(time.perf_counter() - started, 2)
+        if logger is not None:
+            close_logger(logger)
+    return result
+
+def format_summary(results: List[Dict]) -> str:
+    """Renders the per-paper results as a plain-text table."""
+    headers = ["Paper", "Status", "Duration (s)", "Session"]
+    status = lambda r: r["status"] + (f" ({', '.join(r['failed_stages'])})" if r.get("failed_stages") else "")
+    rows = [[Path(r["paper"]).name, status(r), f"{r['duration_s']:.1f}", Path(r["session"]).name if r["session"] else "-"]
+            for r in results]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    line = lambda cells: "  ".join(str(cell).ljust(width) for cell, width in zip(cells, widths))
+    return "\n".join([line(headers), line("-" * w for w in widths)] + [line(row) for row in rows])
+
+def run_batch(jobs: List[Dict], workers: int = 2, max_parallel_stages: int = 3, llm_client: OllamaClient = None,
+              base_dir: str = "workspace") -> List[Dict]:
+    """Processes all jobs over a bounded worker pool sharing one LLM client, with sessions under `base_dir`."""
+    llm_client = llm_client or OllamaClient(lazy_connect=True, cache_dir=workspace_cache_dir(base_dir, "llm"))
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = {pool.submit(run_job, job, llm_client, max_parallel_stages, base_dir): index
+                   for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"📦 {Path(result['paper']).name}: {result['status']} in {result['duration_s']:.1f}s")
+            results[futures[future]] = result
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process a folder of papers or a JSONL manifest in batch.")
+    parser.add_argument("source", help="Folder with PDF files or JSONL manifest ({\"prompt\": ..., \"paper\": ...} per line)")
+    parser.add_argument("--prompt", help="Prompt used for every paper of a folder (or as manifest default)")
+    parser.add_argument("--workers", type=int, default=2, help="Number of papers processed concurrently")
+    parser.add_argument("--stage-parallelism", type=int, default=3, help="Concurrent stages within each paper")
+    args = parser.parse_args()
+
+    try:
+        batch_jobs = load_jobs(args.source, args.prompt)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    if not batch_jobs:
+        print(f"❌ Error: No papers found in '{args.source}'")
+        sys.exit(1)
+
+    print(f"🚀 Processing {len(batch_jobs)} papers with {args.workers} workers...")
+    batch_started = time.perf_counter()
+    batch_results = run_batch(batch_jobs, workers=args.workers, max_parallel_stages=args.stage_parallelism)
+
+    print("\n📊 Batch Summary:\n")
+    print(format_summary(batch_results))
+    print(f"\nTotal wall time: {time.perf_counter() - batch_started:.1f}s")
+
+    summary_path = Path("workspace") / f"batch-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    summary_path.write_text(json.dumps(batch_results, indent=2), encoding="utf-8")
+    print(f"Summary saved to: {summary_path}")
+    sys.exit(0 if all(r["status"] == "ok" for r in batch_results) else 1)
@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# (marker found in the prompt, canned response); the first match wins
+DEFAULT_RESPONSES: List[Tuple[str, str]] = [
+    ("product reviewer", "Score: 8/10\nThe deliverables are clear and consistent."),
+    ("Software Architect", "# Architecture\n\n## Overview\nService layout.\n\n```mermaid\ngraph TD; API-->Worker\n```\n"
+                           + "Component details. " * 60),
+    ("Technical Product Manager", "# PRD\n\n## Goals\n" + "Requirement details. " * 80),
+    ("Project Manager", "# Plan de Ejecución\n\n| Fase | Duración |\n|---|---|\n| Fase 1 | 2 semanas |\n"),
+]
+DEFAULT_RESPONSE = "OK"
+
+def sample_from_schema(schema: dict, name: str = "value"):
+    """Builds a deterministic JSON value matching `schema`, used to answer structured-output requests."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type", "string")
+    kind = kind[0] if isinstance(kind, list) else kind
+    if kind == "object":
+        return {key: sample_from_schema(subschema, key) for key, subschema in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), name)]
+    if kind in ("integer", "number"):
+        return schema.get("maximum", schema.get("minimum", 8))
+    if kind == "boolean":
+        return True
+    return f"Synthetic {name.replace('_', ' ')}"
+
+class FakeOllamaServer:
+    """
+    Local stand-in for an Ollama server, for benchmarks without a real model.
+
+    Speaks enough of the Ollama HTTP API for the pipeline: `GET /api/tags`,
+    `POST /api/generate` (streamed or not) and `POST /api/chat`. Every generation
+    waits `latency` seconds (prompt processing) and then produces its canned response
+    at `tokens_per_second`, reporting the usual timing fields, so runs are
+    deterministic and comparable. The first request also pays `load_time`, as a real
+    server does when loading the model (an empty prompt only loads it). Free-text
+    responses are chosen by the first marker in `responses` found in the system
+    prompt + prompt; requests with a JSON schema `format` get a value built from it.
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 50.0, load_time: float = 0.0,
+                 responses: Optional[List[Tuple[str, str]]] = None, model: str = "gemma3:12b",
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.load_time = load_time
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        self.responses = responses if responses is not None else DEFAULT_RESPONSES
+        self.model = model
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def ensure_loaded(self) -> float:
+        """Simulates the model load on first use; concurrent requests wait for it. Returns seconds spent."""
+        with self._load_lock:
+            if self.loaded:
+                return 0.0
+            time.sleep(self.load_time)
+            self.loaded = True
+            return self.load_time
+
+    def respond(self, prompt: str) -> str:
+        for marker, response in self.responses:
+            if marker in prompt:
+                return response
+        return DEFAULT_RESPONSE
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload: dict):
+                line = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._send_json({"models": [{"name": server.model, "model": server.model}]})
+                else:
+                    self._send_json({"status": "Ollama is running"})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.startswith("/api/chat"):
+                    messages = request.get("messages") or []
+                    prompt = "\n".join(message.get("content", "") for message in messages)
+                else:
+                    prompt = (request.get("system") or "") + request.get("prompt", "")
+                with server._lock:
+                    server.requests += 1
+
+                load_duration = server.ensure_loaded()
+                # A request without prompt only loads the model
+                schema = request.get("format")
+                if not prompt:
+                    text = ""
+                elif isinstance(schema, dict):
+                    text = json.dumps(sample_from_schema(schema))
+                else:
+                    text = server.respond(prompt)
+                words = text.split(" ") if text else []
+                prompt_tokens = len(prompt.split())
+                eval_duration = len(words) / server.tokens_per_second if server.tokens_per_second else 0.0
+                timings = {
+                    "model": request.get("model", server.model),
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": len(words),
+                    "load_duration": int(load_duration * 1e9),
+                    "prompt_eval_duration": int(server.latency * 1e9),
+                    "eval_duration": int(eval_duration * 1e9),
+                    "total_duration": int((load_duration + server.latency + eval_duration) * 1e9),
+                }
+                if prompt:
+                    time.sleep(server.latency)
+
+                stream = request.get("stream", True)
+                if self.path.startswith("/api/chat"):
+                    if not stream:
+                        time.sleep(eval_duration)
+                        self._send_json({**timings, "message": {"role": "assistant", "content": text}})
+                        return
+                    pieces = [{"message": {"role": "assistant", "content": word + " "}} for word in words]
+                else:
+                    if not stream:
+                        time.sleep(eval_duration)
+                        self._send_json({**timings, "response": text})
+                        return
+                    pieces = [{"response": word if index == len(words) - 1 else word + " "}
+                              for index, word in enumerate(words)]
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                per_token = 1.0 / server.tokens_per_second if server.tokens_per_second else 0.0
+                for piece in pieces:
+                    time.sleep(per_token)
+                    self._send_chunk({"model": timings["model"], "done": False, **piece})
+                if self.path.startswith("/api/chat"):
+                    self._send_chunk({**timings, "message": {"role": "assistant", "content": ""}})
+                else:
+                    self._send_chunk({**timings, "response": ""})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
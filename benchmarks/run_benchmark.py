@@ -0,0 +1,153 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Benchmarks measure the pipeline itself: no response or extraction cache
+os.environ["PAPER2PROD_NO_CACHE"] = "1"
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.synthetic_pdf import generate_pdf
+from main import close_logger, orchestrate_agents, setup_session
+from tools.ollama_client import OllamaClient
+from utils.config import workspace_cache_dir
+
+STAGES = ["user_prompt", "paper_reader", "planner", "prd_writer", "architecture", "execution_plan", "evaluator"]
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and of its finished children, in MiB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024 # ru_maxrss is bytes on macOS, KiB on Linux
+    return max(own, children) / scale
+
+def run_once(paper_path: str, pages: int, llm_client: OllamaClient, workspace: str,
+             max_parallel_stages: int, verbose: bool = False) -> Dict:
+    """Runs the whole pipeline on one paper and returns its measurements."""
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        session_path, fs_tool, logger = setup_session(base_dir=workspace)
+        if not verbose:
+            # Console output is handled by the parent logger; the session log file keeps everything
+            for handler in logger.parent.handlers:
+                handler.setLevel(logging.WARNING)
+        tracemalloc.start()
+        started = time.perf_counter()
+        error = None
+        try:
+            orchestrate_agents("Build a product from this paper", paper_path, session_path, fs_tool, llm_client,
+                               logger, max_parallel_stages=max_parallel_stages)
+        except Exception as e:
+            error = str(e)
+        wall_time = time.perf_counter() - started
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        close_logger(logger)
+
+    checkpoints = json.loads((Path(session_path) / "checkpoints.json").read_text(encoding="utf-8")).get("stages", {})
+    metrics_path = Path(session_path) / "metrics.json"
+    llm_stages = json.loads(metrics_path.read_text(encoding="utf-8"))["stages"] if metrics_path.exists() else {}
+    return {
+        "pages": pages,
+        "wall_s": round(wall_time, 3),
+        "stages_s": {name: entry.get("duration_s") for name, entry in checkpoints.items()},
+        "llm_s": round(sum(stage["latency_s"] for stage in llm_stages.values()), 3),
+        "llm_calls": sum(stage["calls"] for stage in llm_stages.values()),
+        "peak_traced_mb": round(peak_traced / (1024 * 1024), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "failed_stages": sorted(name for name, entry in checkpoints.items() if entry.get("status") != "completed"),
+        "error": error,
+    }
+
+def run_benchmark(page_counts: List[int], latency: float, tokens_per_second: float, repeat: int = 1,
+                  max_parallel_stages: int = 3, verbose: bool = False, load_time: float = 0.0) -> List[Dict]:
+    """Benchmarks every page count and returns one row per run. Each run starts with the model unloaded."""
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="paper2prod-bench-") as tmp_dir, \
+            FakeOllamaServer(latency=latency, tokens_per_second=tokens_per_second, load_time=load_time) as server:
+        llm_client = OllamaClient(host=server.url,
+                                  cache_dir=workspace_cache_dir(str(Path(tmp_dir) / "workspace"), "llm"))
+        for pages in page_counts:
+            paper_path = generate_pdf(str(Path(tmp_dir) / f"paper-{pages}p.pdf"), pages)
+            for run in range(1, repeat + 1):
+                server.loaded = False
+                row = run_once(paper_path, pages, llm_client, str(Path(tmp_dir) / "workspace"),
+                               max_parallel_stages, verbose)
+                row["run"] = run
+                rows.append(row)
+                print(f"📏 {pages} pages, run {run}: {row['wall_s']:.2f}s wall, {row['llm_calls']} LLM calls, "
+                      f"peak {row['peak_traced_mb']} MiB traced")
+    return rows
+
+def format_report(rows: List[Dict]) -> str:
+    """Renders the runs as a plain-text table with one column per stage."""
+    headers = ["Pages", "Run", "Wall (s)", "LLM (s)", "Calls"] + STAGES + ["Peak MiB", "RSS MiB", "Status"]
+    table = []
+    for row in rows:
+        stage_cells = [f"{row['stages_s'][name]:.2f}" if row["stages_s"].get(name) is not None else "-" for name in STAGES]
+        status = "ok" if not row["error"] and not row["failed_stages"] else "failed: " + ", ".join(row["failed_stages"] or [row["error"]])
+        table.append([row["pages"], row["run"], f"{row['wall_s']:.2f}", f"{row['llm_s']:.2f}", row["llm_calls"]]
+                     + stage_cells + [row["peak_traced_mb"], row["peak_rss_mb"], status])
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *table)]
+    line = lambda cells: "  ".join(str(cell).ljust(width) for cell, width in zip(cells, widths))
+    return "\n".join([line(headers), line("-" * w for w in widths)] + [line(cells) for cells in table])
+
+def compare_with_baseline(rows: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """Returns a message for every page count whose best wall time regressed beyond `tolerance`."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    best = lambda runs: {r["pages"]: min(x["wall_s"] for x in runs if x["pages"] == r["pages"]) for r in runs}
+    current, previous = best(rows), best(baseline.get("runs", []))
+    regressions = []
+    for pages, wall in sorted(current.items()):
+        if pages in previous and wall > previous[pages] * (1 + tolerance):
+            regressions.append(f"{pages} pages: {wall:.2f}s vs baseline {previous[pages]:.2f}s")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against a local fake Ollama server.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[5, 50, 200], help="Page counts of the synthetic papers")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the fake server waits before answering")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Generation speed of the fake server")
+    parser.add_argument("--load-time", type=float, default=0.0, help="Seconds the fake server takes to load the model")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per page count")
+    parser.add_argument("--stage-parallelism", type=int, default=3, help="Concurrent stages within the pipeline")
+    parser.add_argument("--output", help="Where to save the JSON results (default: workspace/benchmark-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Previous results file; exit non-zero if wall time regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed wall-time regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    print(f"🚀 Benchmarking {args.pages} pages (latency {args.latency}s, {args.tokens_per_second} tokens/s)...")
+    rows = run_benchmark(args.pages, args.latency, args.tokens_per_second, args.repeat,
+                         args.stage_parallelism, args.verbose, args.load_time)
+    print("\n📊 Benchmark Results:\n")
+    print(format_report(rows))
+
+    output_path = Path(args.output or Path("workspace") / f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    settings = {"latency": args.latency, "tokens_per_second": args.tokens_per_second, "load_time": args.load_time,
+                "stage_parallelism": args.stage_parallelism}
+    output_path.write_text(json.dumps({"settings": settings, "runs": rows}, indent=2), encoding="utf-8")
+    print(f"\nResults saved to: {output_path}")
+
+    failed = [row for row in rows if row["error"] or row["failed_stages"]]
+    if args.baseline:
+        regressions = compare_with_baseline(rows, args.baseline, args.tolerance)
+        for message in regressions:
+            print(f"❌ Regression: {message}")
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
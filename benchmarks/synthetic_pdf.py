@@ -0,0 +1,35 @@
+import random
+import fitz  # PyMuPDF
+from pathlib import Path
+
+SECTIONS = ["Abstract", "Introduction", "Related Work", "Methods", "Experiments", "Results", "Discussion",
+            "Conclusion", "References"]
+VOCABULARY = ("model data training latency throughput benchmark dataset accuracy network layer attention "
+              "retrieval inference evaluation baseline ablation architecture gradient loss optimizer "
+              "transformer embedding pipeline scaling memory compute parameter").split()
+
+def generate_pdf(path: str, pages: int, words_per_page: int = 350, seed: int = 0) -> str:
+    """
+    Writes a paper-like PDF with `pages` pages of deterministic filler text.
+    Section headings ("3 Methods", ...) are spread over the pages so section-aware
+    chunking has something to work with. Returns the path.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    section_every = max(1, pages // len(SECTIONS))
+    for page_index in range(pages):
+        page = doc.new_page()
+        lines = []
+        if page_index == 0:
+            lines.append(f"Synthetic Paper {pages} Pages\n")
+        if page_index % section_every == 0:
+            section = page_index // section_every
+            if section < len(SECTIONS):
+                lines.append(f"{section + 1} {SECTIONS[section]}")
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+        lines.extend(" ".join(words[i:i + 12]) + "." for i in range(0, len(words), 12))
+        page.insert_textbox(fitz.Rect(50, 50, 560, 800), "\n".join(lines), fontsize=8)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return path
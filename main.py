@@ -1,5 +1,12 @@
+import time
+STARTUP_STARTED = time.perf_counter() # Measured before the remaining imports for the startup report
+import argparse
+import json
+import os
+import sqlite3
 import sys
 from pathlib import Path
+from typing import Iterable, Optional
 from agents.user_prompt_agent import UserPromptAgent
 from agents.paper_reader_agent import PaperReaderAgent
 from agents.planner_agent import PlannerAgent
@@ -11,133 +18,263 @@ from agents.execution_plan_agent import ExecutionPlanAgent
 from tools.filesystem_tool import FileSystemTool
 from tools.ollama_client import OllamaClient
 import logging
-from utils.session import create_session_directory
+from utils.checkpoint import CheckpointStore
+from utils.session import create_session_directory, resolve_session_directory
+from utils.config import env_int, workspace_cache_dir
+from utils.metrics import MetricsRecorder, current_recorder
+from utils.scheduler import Stage, StageError, StageScheduler
+from utils.workspace_index import WorkspaceIndex
+IMPORTS_FINISHED = time.perf_counter()
 
 def setup_logger(log_dir: str):
     """
-    Sets up a logger for the system, writing to a file in the session directory.
+    Sets up a logger for the session, writing to a file in the session directory.
+    Each session gets its own child of "MultiAgentLogger" with its own file handler,
+    so several sessions in one process never log into each other's files; console
+    output is shared through the parent logger.
     """
     log_file = Path(log_dir) / "system.log"
     log_file.parent.mkdir(parents=True, exist_ok=True)
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-    logger = logging.getLogger("MultiAgentLogger")
+    parent_logger = logging.getLogger("MultiAgentLogger")
+    if not parent_logger.handlers:
+        parent_logger.setLevel(logging.DEBUG)
+
+        # Console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(formatter)
+        parent_logger.addHandler(console_handler)
+
+    logger = logging.getLogger(f"MultiAgentLogger.{Path(log_dir).name}")
     if not logger.handlers:
         logger.setLevel(logging.DEBUG)
 
         # File handler
         file_handler = logging.FileHandler(log_file)
         file_handler.setLevel(logging.DEBUG)
-
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-
-        # Formatter
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
         file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-
-        # Add handlers to logger
         logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
 
     return logger
 
-def setup_environment(prompt: str, paper_path: str):
+def close_logger(logger: logging.Logger):
+    """Closes and detaches the session's file handlers."""
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+def setup_session(base_dir: str = "workspace", resume_session: Optional[str] = None):
+    """
+    Creates a session directory (or reopens `resume_session`) with its own logger and FileSystemTool.
+    """
+    if resume_session:
+        session_path = resolve_session_directory(resume_session, base_dir)
+        if session_path is None:
+            raise FileNotFoundError(f"Session not found: {resume_session}")
+        logger = setup_logger(session_path)
+        logger.info(f"Resuming session: {session_path}")
+    else:
+        session_path = create_session_directory(base_dir)
+        logger = setup_logger(session_path)
+        logger.info(f"Session directory created: {session_path}")
+    fs_tool = FileSystemTool(session_path)
+    return session_path, fs_tool, logger
+
+def setup_environment(prompt: str, paper_path: str, resume_session: Optional[str] = None):
     """
     Prepare the working directory, logger, and shared tools (FileSystemTool, OllamaClient).
     """
     print("🚀 Setting up environment...")
-    session_path = create_session_directory()
-    logger = setup_logger(session_path)
-    logger.info(f"Session directory created: {session_path}")
-    fs_tool = FileSystemTool(session_path)
-    ollama_client = OllamaClient()
+    session_path, fs_tool, logger = setup_session(resume_session=resume_session)
+    # The connection check runs in the background while the first stages start
+    ollama_client = OllamaClient(lazy_connect=True,
+                                 cache_dir=workspace_cache_dir(str(Path(session_path).parent), "llm"))
     logger.info("Environment setup complete.")
     return session_path, fs_tool, ollama_client, logger
 
-def orchestrate_agents(prompt: str, paper_path: str, session_path: str, fs_tool: FileSystemTool, llm_client: OllamaClient, logger: logging.Logger):
+# Deliverables selectable with --only, mapped to the stage producing them and the plan flag enabling it
+DELIVERABLES = {
+    "prd": ("prd_writer", "generate_prd"),
+    "architecture": ("architecture", "design_architecture"),
+    "execution_plan": ("execution_plan", "execution_plan"),
+    "evaluation": ("evaluator", "evaluation"),
+}
+
+def parse_only(value: Optional[str]) -> Optional[set]:
     """
-    Orchestrates the execution of agents in sequence.
+    Parses a comma-separated --only list into deliverable names, adding the PRD and the
+    architecture when the execution plan (which is built from them) is requested.
+    Raises ValueError on unknown names.
     """
-    logger.info("\n🤖 Starting agent orchestration...")
+    if not value:
+        return None
+    names = {name.strip().lower().replace("-", "_") for name in value.split(",") if name.strip()}
+    unknown = names - set(DELIVERABLES)
+    if unknown:
+        raise ValueError(f"Unknown deliverable(s): {', '.join(sorted(unknown))} "
+                         f"(expected: {', '.join(DELIVERABLES)})")
+    if "execution_plan" in names:
+        names |= {"prd", "architecture"}
+    return names
 
-    # Step 1: Initialize session with user prompt and paper
-    logger.info("\n--- Step 1: User Prompt Agent ---")
+def load_json_artifact(fs_tool: FileSystemTool, relative_path: str) -> Optional[dict]:
+    """Reads a JSON artifact of the session, returning None if it is missing or invalid."""
+    content = fs_tool.read_text(relative_path)
+    if not content:
+        return None
     try:
-        user_agent = UserPromptAgent(prompt, paper_path, fs_tool)
-        user_agent.init_session()
-    except Exception as e:
-        logger.error(f"❌ Critical Error during User Prompt Agent initialization: {e}", exc_info=True)
-        sys.exit(1)
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return None
 
-    # Step 2: Read and structure the paper content
-    logger.info("\n--- Step 2: Paper Reader Agent ---")
+def log_llm_metrics(recorder: MetricsRecorder, session_path: str, logger: logging.Logger):
+    """Saves the session's per-call LLM metrics to metrics.json and logs the per-stage summary."""
+    if not recorder.calls:
+        return
     try:
-        reader = PaperReaderAgent(fs_tool, llm_client)
-        structured_data = reader.run()
-        if not structured_data:
-            logger.error("❌ Critical Error: Paper Reader Agent failed to produce structured data. Exiting.")
-            sys.exit(1)
-        logger.info("   ✅ Paper Reader Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Critical Error during Paper Reader Agent execution: {e}", exc_info=True)
-        sys.exit(1)
+        recorder.save(str(Path(session_path) / "metrics.json"))
+    except OSError as e:
+        logger.warning(f"⚠️ Could not save LLM metrics: {e}")
+    logger.info("\n📈 LLM metrics per stage:\n" + recorder.format_summary())
 
-    # Step 3: Plan the workflow
-    logger.info("\n--- Step 3: Planner Agent ---")
+def index_session(session_path: str, logger: logging.Logger):
+    """Adds the session's manifest to the workspace-wide artifact index."""
     try:
-        planner = PlannerAgent(fs_tool, llm_client)
-        plan = planner.run(structured_data)
+        WorkspaceIndex(str(Path(session_path).parent)).index_session(session_path)
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Could not update the workspace index: {e}")
+
+def orchestrate_agents(prompt: str, paper_path: str, session_path: str, fs_tool: FileSystemTool, llm_client: OllamaClient, logger: logging.Logger, max_parallel_stages: Optional[int] = None, resume: bool = False,
+                       only: Optional[Iterable[str]] = None, plan_mode: Optional[str] = None):
+    """
+    Orchestrates the execution of agents as a dependency graph.
+    Stages whose inputs are already available run concurrently (up to `max_parallel_stages`).
+    Each stage is checkpointed in the session; with `resume=True`, stages whose inputs are
+    unchanged and whose outputs are present are skipped.
+    The deliverable stages follow the planner's flags, and stages that are disabled (or need
+    an artifact of a disabled stage) make no LLM calls. `only` (names of DELIVERABLES)
+    replaces the plan and skips the planner; `plan_mode` "heuristic" builds the plan from
+    the prompt without the LLM (default: PAPER2PROD_PLAN_MODE, else "llm").
+    """
+    logger.info("\n🤖 Starting agent orchestration...")
+    if max_parallel_stages is None:
+        max_parallel_stages = env_int("PAPER2PROD_PARALLEL_STAGES", 3)
+    if plan_mode is None:
+        plan_mode = os.environ.get("PAPER2PROD_PLAN_MODE", "llm")
+    only = set(only) if only is not None else None
+    if only is not None:
+        logger.info(f"🎯 Only generating: {', '.join(sorted(only))}")
+
+    def plan_enables(flag: str):
+        deliverable = next(name for name, (_, plan_flag) in DELIVERABLES.items() if plan_flag == flag)
+
+        def enabled(results) -> bool:
+            if only is not None:
+                return deliverable in only
+            # Without a usable plan (planner failed or skipped) every deliverable is produced
+            return bool((results.get("planner") or {}).get(flag, True))
+        return enabled
+
+    def run_user_prompt(results):
+        # Initialize session with user prompt and paper
+        UserPromptAgent(prompt, paper_path, fs_tool).init_session()
+
+    def run_paper_reader(results):
+        # Read and structure the paper content
+        structured_data = PaperReaderAgent(fs_tool, llm_client).run()
+        if not structured_data:
+            raise RuntimeError("Paper Reader Agent failed to produce structured data.")
+        return structured_data
+
+    def run_planner(results):
+        plan = PlannerAgent(fs_tool, llm_client, mode=plan_mode).run(results["paper_reader"])
         if not plan:
             logger.warning("⚠️ Planner Agent did not produce a detailed plan, continuing with default flow.")
-        else:
-            logger.info("   ✅ Planner Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Error during Planner Agent execution: {e}", exc_info=True)
+        return plan
 
-    # Step 4: Generate Product Requirements Document (PRD)
-    logger.info("\n--- Step 4: PRD Writer Agent ---")
-    try:
-        prd_writer = PRDWriterAgent(fs_tool, llm_client)
-        prd_writer.run(structured_data)
-        logger.info("   ✅ PRD Writer Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Error during PRD Writer Agent execution: {e}", exc_info=True)
+    def run_prd_writer(results):
+        PRDWriterAgent(fs_tool, llm_client).run(results["paper_reader"])
 
-    # Step 5: Generate Architecture Document
-    logger.info("\n--- Step 5: Architecture Agent ---")
-    try:
-        arch_agent = ArchitectureAgent(fs_tool, llm_client)
-        arch_agent.run(structured_data)
-        logger.info("   ✅ Architecture Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Error during Architecture Agent execution: {e}", exc_info=True)
+    def run_architecture(results):
+        ArchitectureAgent(fs_tool, llm_client).run(results["paper_reader"])
 
-    # Step 5.1: Generate Execution Plan
-    logger.info("\n--- Step 5.1: Execution Plan Agent ---")
-    try:
-        exec_plan_agent = ExecutionPlanAgent(fs_tool, llm_client)
-        exec_plan_agent.run(structured_data)
-        logger.info("   ✅ Execution Plan Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Error during Execution Plan Agent execution: {e}", exc_info=True)
+    def run_execution_plan(results):
+        return ExecutionPlanAgent(fs_tool, llm_client).run(results["paper_reader"])
 
-    # Step 6: Implementer Agent (Skipped as requested)
-    logger.info("\n--- Step 6: Implementer Agent (Skipped) ---")
+    def run_evaluator(results):
+        # The documents of the stages that ran are evaluated, and so are those a skipped stage left
+        # from an earlier run (e.g. `--only evaluation`); only the former are regenerated with the
+        # evaluator's feedback when they fail (the execution plan also after a rewritten PRD or
+        # architecture, which it is built from)
+        structured_data = results.get("paper_reader")
+        writers = {
+            "PRD": ("prd_writer", lambda feedback: PRDWriterAgent(fs_tool, llm_client).run(structured_data, feedback)),
+            "Architecture": ("architecture",
+                             lambda feedback: ArchitectureAgent(fs_tool, llm_client).run(structured_data, feedback)),
+            "Execution Plan": ("execution_plan",
+                               lambda feedback: ExecutionPlanAgent(fs_tool, llm_client).run(structured_data, feedback)),
+        }
+        regenerators = {name: regenerate for name, (stage, regenerate) in writers.items()
+                        if scheduler.status[stage] != "skipped"}
+        artifacts = [artifact["name"] for artifact in EvaluatorAgent.ARTIFACTS
+                     if artifact["name"] in regenerators or fs_tool.file_exists(artifact["path"])]
+        return EvaluatorAgent(fs_tool, llm_client).run(regenerators, artifacts=artifacts)
 
-    # Step 7: Evaluate the generated outputs
-    logger.info("\n--- Step 7: Evaluator Agent ---")
-    evaluation_report = "Evaluation skipped due to prior errors."
+    # Implementer Agent is skipped as requested, so it has no stage.
+    stages = [
+        Stage("user_prompt", run_user_prompt, UserPromptAgent.INPUTS, UserPromptAgent.OUTPUTS,
+              critical=True, label="User Prompt Agent"),
+        Stage("paper_reader", run_paper_reader, PaperReaderAgent.INPUTS, PaperReaderAgent.OUTPUTS,
+              critical=True, label="Paper Reader Agent",
+              restore=lambda: load_json_artifact(fs_tool, "intermediate/structured_data.json")),
+        Stage("planner", run_planner, PlannerAgent.INPUTS, PlannerAgent.OUTPUTS,
+              optional_inputs=PlannerAgent.OPTIONAL_INPUTS, label="Planner Agent",
+              restore=lambda: load_json_artifact(fs_tool, "intermediate/plan.json"),
+              enabled=lambda results: only is None),
+        # The deliverable stages wait for the planner, whose flags decide whether they run
+        Stage("prd_writer", run_prd_writer, PRDWriterAgent.INPUTS, PRDWriterAgent.OUTPUTS, label="PRD Writer Agent",
+              enabled=plan_enables("generate_prd"), after=("planner",)),
+        Stage("architecture", run_architecture, ArchitectureAgent.INPUTS, ArchitectureAgent.OUTPUTS,
+              label="Architecture Agent", enabled=plan_enables("design_architecture"), after=("planner",)),
+        Stage("execution_plan", run_execution_plan, ExecutionPlanAgent.INPUTS, ExecutionPlanAgent.OUTPUTS,
+              label="Execution Plan Agent", restore=lambda: fs_tool.read_text("output/execution_plan.md"),
+              enabled=plan_enables("execution_plan"), after=("planner",)),
+        Stage("evaluator", run_evaluator, EvaluatorAgent.INPUTS, EvaluatorAgent.OUTPUTS,
+              optional_inputs=EvaluatorAgent.OPTIONAL_INPUTS, label="Evaluator Agent",
+              restore=lambda: fs_tool.read_text("output/evaluation.txt"),
+              enabled=plan_enables("evaluation"), after=("planner",), rewrites=EvaluatorAgent.REWRITES),
+    ]
+
+    scheduler = StageScheduler(stages, max_workers=max_parallel_stages, logger=logger,
+                               checkpoints=CheckpointStore(session_path, flush=fs_tool.flush,
+                                                           manifest_entry=fs_tool.manifest_entry),
+                               resume=resume)
+    recorder = MetricsRecorder()
+    recorder_token = current_recorder.set(recorder)
     try:
-        evaluator = EvaluatorAgent(fs_tool, llm_client)
-        evaluation_report = evaluator.run()
-        logger.info("   ✅ Evaluator Agent completed.")
-    except Exception as e:
-        logger.error(f"❌ Error during Evaluator Agent execution: {e}", exc_info=True)
+        if env_int("PAPER2PROD_PRELOAD", 1):
+            # Load the model while the session is initialized and the PDF is extracted
+            llm_client.start_preload()
+        results = scheduler.run()
+    finally:
+        current_recorder.reset(recorder_token)
+        log_llm_metrics(recorder, session_path, logger)
+        # Artifacts are written in the background; the session is complete once they are on disk
+        fs_tool.flush()
+        if fs_tool.store.errors:
+            logger.warning(f"⚠️ Some artifacts could not be written: {'; '.join(fs_tool.store.errors)}")
+        index_session(session_path, logger)
+    if scheduler.reused:
+        logger.info(f"⏭️ Reused checkpoints: {', '.join(scheduler.reused)}")
+    if scheduler.skipped:
+        logger.info(f"⏭️ Skipped stages: {', '.join(scheduler.skipped)}")
 
+    timings = ", ".join(f"{name}={duration:.1f}s" for name, duration in scheduler.durations.items())
+    logger.info(f"⏱️ Stage durations: {timings}")
     logger.info("\n🏁 Agent orchestration finished.")
-    return evaluation_report
+    return results.get("evaluator") or "Evaluation skipped due to prior errors."
 
 def validate_input_files(paper_path: str):
     """
@@ -160,14 +297,29 @@ def validate_input_files(paper_path: str):
         sys.exit(1)
     print(f"✅ Archivo de entrada '{paper_file}' es válido.")
 
-def main(prompt: str, paper_path: str):
+def main(prompt: Optional[str], paper_path: Optional[str], resume_session: Optional[str] = None,
+         only: Optional[Iterable[str]] = None, plan_mode: Optional[str] = None):
     print("Starting MultiAgent Product Synthesizer...")
-    validate_input_files(paper_path)
-    session_path, fs_tool, llm_client, logger = setup_environment(prompt, paper_path)
+    if not resume_session:
+        validate_input_files(paper_path)
+    try:
+        session_path, fs_tool, llm_client, logger = setup_environment(prompt, paper_path, resume_session)
+    except FileNotFoundError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    ready = time.perf_counter()
+    logger.info(f"⏱️ Startup: imports {IMPORTS_FINISHED - STARTUP_STARTED:.2f}s, "
+                f"environment {ready - IMPORTS_FINISHED:.2f}s, ready after {ready - STARTUP_STARTED:.2f}s")
     logger.info("Main process started.")
 
+    if resume_session:
+        # The session keeps its own copy of the prompt and the paper
+        prompt = fs_tool.read_text("input/prompt.txt") or prompt
+        paper_path = fs_tool.get_full_path("input/paper.pdf")
+
     try:
-        evaluation_report = orchestrate_agents(prompt, paper_path, session_path, fs_tool, llm_client, logger)
+        evaluation_report = orchestrate_agents(prompt, paper_path, session_path, fs_tool, llm_client, logger,
+                                               resume=bool(resume_session), only=only, plan_mode=plan_mode)
 
         logger.info("\n\n=========================================")
         logger.info(f"✅ Workflow Complete! Check outputs in: {session_path}")
@@ -180,6 +332,13 @@ def main(prompt: str, paper_path: str):
         else:
             logger.warning("Evaluation report was not generated.")
 
+        cache_stats = llm_client.cache_stats()
+        logger.info(f"🗄️ LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['entries']} entries, {cache_stats['bytes'] / 1024:.0f} KiB)")
+
+    except StageError as e:
+        logger.critical(f"🆘 Pipeline aborted: {e}")
+        sys.exit(1)
     except Exception as e:
         if 'logger' in locals():
             logger.critical(f"🆘 Unhandled exception in main workflow: {e}", exc_info=True)
@@ -188,16 +347,32 @@ def main(prompt: str, paper_path: str):
         sys.exit(1)
     finally:
         logger.info("MultiAgent Product Synthesizer finished.")
+        close_logger(logger)
         print(f"\nOutputs generated in: {session_path}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    parser = argparse.ArgumentParser(description="MultiAgent Product Synthesizer")
+    parser.add_argument("prompt", nargs="?", help="What to build from the paper")
+    parser.add_argument("paper", nargs="?", help="Path to the paper PDF")
+    parser.add_argument("--resume", metavar="SESSION_ID",
+                        help="Resume a session in workspace/, re-running only stages that failed or whose inputs changed")
+    parser.add_argument("--only", metavar="DELIVERABLES",
+                        help=f"Comma-separated deliverables to generate, ignoring the plan ({', '.join(DELIVERABLES)})")
+    parser.add_argument("--plan-mode", choices=PlannerAgent.MODES,
+                        help="How the planner decides the deliverables: 'llm' or 'heuristic' (from the prompt, no LLM call)")
+    args = parser.parse_args()
+
+    if not args.resume and not (args.prompt and args.paper):
         print("\n❌ Usage: python main.py \"<prompt>\" <path_to_paper.pdf>")
+        print("       python main.py --resume <session_id>")
         print("Example: python main.py \"Generate a web app from this paper\" research/mypaper.pdf")
         sys.exit(1)
 
-    user_prompt = sys.argv[1]
-    paper_file_path = sys.argv[2]
+    try:
+        only = parse_only(args.only)
+    except ValueError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
 
-    main(user_prompt, paper_file_path)
+    main(args.prompt, args.paper, args.resume, only=only, plan_mode=args.plan_mode)
 
@@ -0,0 +1,284 @@
+import argparse
+import json
+import mimetypes
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+from agents.planner_agent import PlannerAgent
+from batch import run_job
+from main import parse_only
+from tools.ollama_client import OllamaClient
+from utils.config import workspace_cache_dir
+from utils.job_queue import JobQueue
+
+class PipelineService:
+    """
+    Keeps the pipeline warm between papers: a pool of worker threads takes jobs from the
+    persistent JobQueue and runs each one in its own session, all sharing one LLM client
+    (one connection check, one model load, one response cache). Jobs survive restarts:
+    the ones queued stay queued and the ones that were running are queued again, once
+    the process running them is gone (several services may share a workspace).
+    """
+
+    UPLOAD_DIR = ".uploads"
+    POLL_INTERVAL_S = 1.0 # Also picks up jobs queued by other processes on the same workspace
+
+    def __init__(self, base_dir: str = "workspace", workers: int = 2, max_parallel_stages: int = 3,
+                 llm_client: Optional[OllamaClient] = None):
+        self.base_dir = Path(base_dir).resolve()
+        self.queue = JobQueue(str(self.base_dir / "jobs.sqlite"))
+        self.upload_dir = self.base_dir / self.UPLOAD_DIR
+        self.workers = max(1, workers)
+        self.max_parallel_stages = max_parallel_stages
+        self.llm_client = llm_client or OllamaClient(lazy_connect=True,
+                                                     cache_dir=workspace_cache_dir(str(self.base_dir), "llm"))
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        requeued = self.queue.requeue_interrupted()
+        if requeued:
+            print(f"🔁 Re-queued {requeued} interrupted job(s)")
+        self.llm_client.start_preload()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"serve-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._keep_alive, name="serve-heartbeat", daemon=True).start()
+
+    def _keep_alive(self):
+        """Refreshes the heartbeat of the running jobs and takes back the jobs of services that died."""
+        while not self._stopping.wait(self.queue.HEARTBEAT_INTERVAL_S):
+            try:
+                self.queue.heartbeat()
+                requeued = self.queue.requeue_interrupted()
+                if requeued:
+                    print(f"🔁 Re-queued {requeued} job(s) of a service that stopped")
+                    self._wake.set()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stops taking jobs and waits for the running ones (interrupted jobs are re-queued on the next start)."""
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, prompt: str, paper: str, options: Optional[Dict] = None) -> str:
+        job_id = self.queue.submit(prompt, paper, options)
+        self._wake.set()
+        return job_id
+
+    def save_upload(self, data: bytes) -> str:
+        """Stores an uploaded PDF until its job has run. Returns its path."""
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        upload_path = self.upload_dir / f"{uuid.uuid4().hex}.pdf"
+        upload_path.write_bytes(data)
+        return str(upload_path)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                print(f"❌ Could not read the job queue: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.POLL_INTERVAL_S)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict):
+        """Runs a claimed job and records its outcome, whatever happens, so it never stays "running"."""
+        started = time.perf_counter()
+        result = {"status": "failed", "session": None, "error": None}
+        try:
+            print(f"▶️ Job {job['id']}: {Path(job['paper']).name}")
+            result = run_job({"prompt": job["prompt"], "paper": job["paper"], **job["options"]},
+                             self.llm_client, self.max_parallel_stages, str(self.base_dir))
+        except Exception as e:
+            print(f"❌ Job {job['id']} failed: {e}")
+            result["error"] = str(e)
+        duration_s = result.get("duration_s", round(time.perf_counter() - started, 2))
+        try:
+            recorded = self.queue.finish(job["id"], result["status"], result["session"], result["error"], duration_s)
+        except Exception as e:
+            print(f"❌ Could not record the outcome of job {job['id']}: {e}")
+            recorded = False
+        if not recorded:
+            # The job may be running again under another owner, which still needs the upload
+            print(f"⚠️ Job {job['id']}: outcome not recorded (re-queued by another service?); keeping its upload")
+            return
+        print(f"📦 Job {job['id']}: {result['status']} in {duration_s:.1f}s")
+        upload = Path(job["paper"])
+        if upload.parent == self.upload_dir:
+            try:
+                upload.unlink(missing_ok=True) # The session keeps its own copy of the paper
+            except OSError as e:
+                print(f"⚠️ Could not delete the upload of job {job['id']}: {e}")
+
+    def artifacts(self, job: Dict) -> Dict[str, Dict]:
+        """The session manifest of a job that has run (empty until then)."""
+        if not job.get("session"):
+            return {}
+        try:
+            manifest = json.loads((Path(job["session"]) / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return manifest.get("artifacts", {})
+
+    def health(self) -> Dict:
+        return {"status": "ok", "workers": self.workers, "model": self.llm_client.model, "jobs": self.queue.counts(),
+                "cache": self.llm_client.cache_stats(), "hosts": self.llm_client.host_stats()}
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def make_handler(service: PipelineService):
+    class Handler(BaseHTTPRequestHandler):
+        """
+        POST /jobs                        JSON {"prompt", "paper" (server path), "only", "plan_mode"},
+                                          or the PDF itself with ?prompt=...&only=...&plan_mode=...
+        GET  /jobs[?status=...]           Most recent jobs
+        GET  /jobs/<id>                   Job status, session and artifacts once it has run
+        GET  /jobs/<id>/artifacts/<path>  An artifact of the job's session (e.g. output/prd.md)
+        GET  /health                      Workers, queue counts, LLM cache and Ollama host statistics
+        """
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, payload, status: int = 200):
+            self._send(status, json.dumps(payload, indent=2).encode("utf-8"), "application/json")
+
+        def _job(self, job_id: str) -> Dict:
+            job = service.queue.get(job_id)
+            if job is None:
+                raise ApiError(404, f"Unknown job: {job_id}")
+            return job
+
+        def _handle(self, route):
+            try:
+                route()
+            except ApiError as e:
+                self._send_json({"error": str(e)}, e.status)
+            except Exception as e:
+                print(f"❌ Error handling {self.command} {self.path}: {e}")
+                self._send_json({"error": str(e)}, 500)
+
+        def do_GET(self):
+            self._handle(self._get)
+
+        def do_POST(self):
+            self._handle(self._post)
+
+        def _get(self):
+            url = urlparse(self.path)
+            parts = [unquote(part) for part in url.path.strip("/").split("/")]
+            if parts == ["health"]:
+                self._send_json(service.health())
+            elif parts == ["jobs"]:
+                status = parse_qs(url.query).get("status", [None])[0]
+                self._send_json(service.queue.list(status))
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = self._job(parts[1])
+                self._send_json({**job, "artifacts": service.artifacts(job)})
+            elif len(parts) > 3 and parts[0] == "jobs" and parts[2] == "artifacts":
+                self._send_artifact(self._job(parts[1]), "/".join(parts[3:]))
+            else:
+                raise ApiError(404, f"Not found: {url.path}")
+
+        def _send_artifact(self, job: Dict, relative_path: str):
+            # Only files listed in the session manifest are served, so paths cannot leave the session
+            if relative_path not in service.artifacts(job):
+                raise ApiError(404, f"Job {job['id']} has no artifact {relative_path}")
+            artifact_path = Path(job["session"]) / relative_path
+            content_type = mimetypes.guess_type(artifact_path.name)[0] or "text/plain"
+            if content_type.startswith("text/") or content_type == "application/json":
+                content_type += "; charset=utf-8"
+            self._send(200, artifact_path.read_bytes(), content_type)
+
+        def _post(self):
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/jobs":
+                raise ApiError(404, f"Not found: {url.path}")
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                try:
+                    request = json.loads(body or b"{}")
+                except json.JSONDecodeError as e:
+                    raise ApiError(400, f"Invalid JSON: {e}")
+                paper = request.get("paper")
+                if not paper or not Path(paper).is_file() or Path(paper).suffix.lower() != ".pdf":
+                    raise ApiError(400, "'paper' must be the path of a PDF readable by the server")
+                paper = str(Path(paper).resolve())
+            else:
+                request = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if not body.startswith(b"%PDF"):
+                    raise ApiError(400, "Send the paper as a PDF body, or JSON with its path")
+                paper = None
+
+            prompt = request.get("prompt")
+            if not prompt:
+                raise ApiError(400, "'prompt' is required")
+            options = {}
+            only = request.get("only")
+            try:
+                if only:
+                    options["only"] = sorted(parse_only(only if isinstance(only, str) else ",".join(only)))
+            except ValueError as e:
+                raise ApiError(400, str(e))
+            if request.get("plan_mode"):
+                if request["plan_mode"] not in PlannerAgent.MODES:
+                    raise ApiError(400, f"'plan_mode' must be one of: {', '.join(PlannerAgent.MODES)}")
+                options["plan_mode"] = request["plan_mode"]
+
+            job_id = service.submit(prompt, paper or service.save_upload(body), options)
+            self._send_json({"id": job_id, "status": "queued", "url": f"/jobs/{job_id}"}, 202)
+
+    return Handler
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = 2, max_parallel_stages: int = 3,
+          base_dir: str = "workspace"):
+    service = PipelineService(base_dir, workers=workers, max_parallel_stages=max_parallel_stages)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    service.start()
+    counts = service.queue.counts()
+    print(f"🚀 Serving on http://{host}:{server.server_address[1]} with {service.workers} workers "
+          f"({counts['queued']} job(s) queued)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping: waiting for running jobs...")
+    finally:
+        server.server_close()
+        service.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline as a local HTTP service with a persistent job queue.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--workers", type=int, default=2, help="Number of papers processed concurrently")
+    parser.add_argument("--stage-parallelism", type=int, default=3, help="Concurrent stages within each paper")
+    parser.add_argument("--workspace", default="workspace", help="Workspace directory (default: workspace)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.stage_parallelism, args.workspace)
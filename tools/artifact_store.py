@@ -0,0 +1,172 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from utils.hashing import sha256_text
+from utils.metrics import current_stage
+
+def write_atomic(path: Path, content: str):
+    """Writes `content` to a temporary file next to `path` and renames it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            tmp_file.write(content)
+        os.chmod(tmp_path, 0o644) # mkstemp creates the file readable by its owner only
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class ArtifactStore:
+    """
+    In-memory copy of a session's text artifacts with write-behind to disk.
+
+    `put` makes the new content visible to in-process readers immediately and queues it for
+    a background writer, which replaces the file atomically (temp file + rename), so a
+    crash never leaves a half-written artifact. Several updates of the same path before it
+    is written are coalesced into one write. The writer thread only lives while there are
+    pending writes and is not a daemon, so the interpreter waits for it on exit; `flush`
+    waits for every pending write, and must be called before reading the files from disk.
+
+    Every artifact written is also recorded in the session's `manifest.json` (size, SHA-256,
+    producing stage, timestamp and write duration), saved by the writer once its queue is
+    empty, so tooling can find a session's outputs without walking the directory.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, base_path: Path):
+        self.base_path = Path(base_path)
+        self._content: Dict[str, str] = {}
+        self._pending: Dict[str, Tuple[str, Optional[str], float]] = {} # path -> (content, stage, queued at)
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._in_flight: Optional[str] = None
+        self._manifest_dirty = False
+        self.manifest: Dict[str, Dict] = self._load_manifest()
+        self.errors: List[str] = []
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        manifest_path = self.base_path / self.MANIFEST_FILE
+        if not manifest_path.is_file():
+            return {}
+        try:
+            return json.loads(manifest_path.read_text(encoding="utf-8")).get("artifacts", {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   ⚠️ Ignoring unreadable manifest {manifest_path}: {e}")
+            return {}
+
+    def get(self, relative_path: str) -> Optional[str]:
+        """Returns the artifact's content if it is held in memory."""
+        with self._cond:
+            return self._content.get(relative_path)
+
+    def contains(self, relative_path: str) -> bool:
+        with self._cond:
+            return relative_path in self._content
+
+    def remember(self, relative_path: str, content: str):
+        """Keeps content that is already on disk (just read) for later readers."""
+        with self._cond:
+            self._content[relative_path] = content
+
+    def put(self, relative_path: str, content: str):
+        """Stores new content and queues its write to disk."""
+        with self._cond:
+            self._content[relative_path] = content
+            self._pending[relative_path] = (content, current_stage.get(), time.perf_counter())
+            self._start_writer()
+
+    def record(self, relative_path: str, size: int, sha256: str, duration: float, content: Optional[str] = None):
+        """Registers a file written to disk by the caller (a stream or a copy) in the manifest."""
+        with self._cond:
+            if content is not None:
+                self._content[relative_path] = content
+            self._add_to_manifest(relative_path, size, sha256, current_stage.get(), duration)
+            self._start_writer()
+
+    def forget(self, relative_path: str):
+        """Drops the artifact from memory and the manifest, and cancels its pending write."""
+        with self._cond:
+            self._content.pop(relative_path, None)
+            self._pending.pop(relative_path, None)
+            if self.manifest.pop(relative_path, None) is not None:
+                self._manifest_dirty = True
+                self._start_writer()
+
+    def restore_entry(self, relative_path: str, entry: Optional[Dict]):
+        """Puts back a manifest entry removed by `forget` when the file it describes was kept."""
+        if entry is None:
+            return
+        with self._cond:
+            self.manifest[relative_path] = entry
+            self._manifest_dirty = True
+            self._start_writer()
+
+    def _add_to_manifest(self, relative_path: str, size: int, sha256: str, stage: Optional[str], duration: float):
+        # Called with the lock held
+        self.manifest[relative_path] = {
+            "size": size,
+            "sha256": sha256,
+            "agent": stage,
+            "written_at": datetime.now().isoformat(timespec="milliseconds"),
+            "duration_s": round(duration, 4),
+        }
+        self._manifest_dirty = True
+
+    def _start_writer(self):
+        # Called with the lock held
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="artifact-writer")
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    if not self._manifest_dirty:
+                        self._writer = None
+                        self._cond.notify_all()
+                        return
+                    self._manifest_dirty = False
+                    manifest = json.dumps({"artifacts": self.manifest}, indent=2, sort_keys=True)
+                    relative_path, content = self.MANIFEST_FILE, manifest
+                    stage = queued_at = None
+                else:
+                    relative_path = next(iter(self._pending))
+                    content, stage, queued_at = self._pending.pop(relative_path)
+                self._in_flight = relative_path
+            try:
+                write_atomic(self.base_path / relative_path, content)
+                if queued_at is not None:
+                    data = content.encode("utf-8")
+                    with self._cond:
+                        self._add_to_manifest(relative_path, len(data), sha256_text(content), stage,
+                                              time.perf_counter() - queued_at)
+            except Exception as e:
+                print(f"   ❌ Error writing {relative_path} to disk: {e}")
+                with self._cond:
+                    self.errors.append(f"{relative_path}: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight = None
+                    self._cond.notify_all()
+
+    def flush(self, relative_path: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every queued write (or only the one of `relative_path`) has reached the
+        disk, including the manifest. Returns False on timeout.
+        """
+        with self._cond:
+            if relative_path is None:
+                return self._cond.wait_for(lambda: self._writer is None, timeout)
+            return self._cond.wait_for(lambda: relative_path not in self._pending
+                                       and self._in_flight != relative_path, timeout)
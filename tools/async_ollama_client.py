@@ -0,0 +1,190 @@
+import asyncio
+import time
+import httpx
+from ollama import AsyncClient
+from typing import AsyncIterator, Dict, Optional, Sequence, Union
+from tools.host_pool import is_host_failure, is_response_error
+from tools.ollama_client import OllamaClient
+from tools.resilience import (LLMError, LLMTimeoutError, LLMUnavailableError, ResiliencePolicy,
+                              acall_with_resilience, deadline_passed, record_timeout, resolve_deadline)
+from tools.response_cache import ResponseCache
+from utils.generation_profiles import GenerationProfiles
+from utils.json_schema import json_errors, parse_json_response
+from utils.metrics import current_stage, record_llm_call
+
+class AsyncOllamaClient(OllamaClient):
+    """
+    OllamaClient with asyncio-native `agenerate`/`astream` counterparts.
+
+    All async requests to a host go through one pooled httpx connection pool with
+    keep-alive, and at most `max_in_flight` generations are sent at the same time;
+    extra callers wait on a semaphore instead of occupying a thread. With several hosts
+    each request is routed by the same HostPool as the synchronous API, which keeps
+    working on the same instance.
+    Deadlines, retries, hedging and the circuit breaker work as in OllamaClient, except
+    that late or losing requests are cancelled instead of left running.
+    Use it from a single event loop and call `aclose()` when done.
+    """
+
+    def __init__(self, model: str = "gemma3:12b", host: Union[str, Sequence[str], None] = None,
+                 cache: Optional[ResponseCache] = None, cache_dir: Optional[str] = None, max_in_flight: int = 4,
+                 keepalive_expiry: float = 60.0, lazy_connect: bool = False,
+                 keep_alive: Optional[Union[str, float]] = None, policy: Optional[ResiliencePolicy] = None,
+                 profiles: Optional[GenerationProfiles] = None):
+        super().__init__(model=model, host=host, cache=cache, cache_dir=cache_dir, lazy_connect=lazy_connect,
+                         keep_alive=keep_alive, policy=policy, profiles=profiles)
+        self.max_in_flight = max(1, max_in_flight)
+        self._limits = httpx.Limits(max_connections=self.max_in_flight,
+                                    max_keepalive_connections=self.max_in_flight,
+                                    keepalive_expiry=keepalive_expiry)
+        self._async_clients: Dict[str, AsyncClient] = {} # host URL -> client, created on first use
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    def _async_client(self, url: str) -> AsyncClient:
+        if url not in self._async_clients:
+            self._async_clients[url] = AsyncClient(host=url, limits=self._limits,
+                                                   timeout=self.policy.deadline_s or None)
+        return self._async_clients[url]
+
+    async def _client_available(self) -> bool:
+        """Whether a host is reachable; waits for a pending connection check without blocking the event loop."""
+        if not self._connected.is_set():
+            await asyncio.to_thread(self._connected.wait)
+        return self.client is not None
+
+    async def agenerate(self, prompt: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                        use_cache: bool = True, system: Optional[str] = None, schema: Optional[Dict] = None,
+                        deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None,
+                        profile: Optional[str] = None) -> str:
+        """
+        Returns the completion text. With `schema`, the output is constrained to JSON matching
+        it (Ollama's `format`) and only responses that validate are cached.
+        Raises LLMError when no completion is obtained (see `generate`).
+        """
+        default_temperature = 0.2 if schema is not None else 0.7
+        options = self._options(prompt, system, temperature, max_tokens, profile, default_temperature)
+        cache_key = ResponseCache.make_key(self.model, prompt, options, system, schema)
+        start = time.perf_counter()
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("   ⚡ LLM cache hit.")
+                record_llm_call(self.model, "generate", time.perf_counter() - start, cached=True)
+                return cached
+
+        if not await self._client_available():
+            print("❌ Ollama client not available.")
+            raise LLMUnavailableError(f"no Ollama server reachable at {', '.join(self.hosts)}")
+
+        async def request():
+            async with self._semaphore:
+                with self.pool.lease() as host:
+                    return host, await self._async_client(host.url).generate(
+                        model=self.model, prompt=prompt, system=system, format=schema, options=options,
+                        keep_alive=self.keep_alive)
+
+        try:
+            host, response = await acall_with_resilience(request, self.policy, self.breaker, deadline_s,
+                                                         self.policy.hedge_delay(current_stage.get(), hedge_after_s))
+        except LLMError as e:
+            print(f"❌ Error generating response from Ollama: {e}")
+            raise
+        text = response["response"]
+        record_llm_call(self.model, "generate", time.perf_counter() - start, response=response, host=host.url)
+        if use_cache and text and (schema is None or not json_errors(text, schema)):
+            self.cache.put(cache_key, text)
+        return text
+
+    async def agenerate_json(self, prompt: str, schema: Dict, temperature: Optional[float] = None,
+                             max_tokens: Optional[int] = None, use_cache: bool = True, system: Optional[str] = None,
+                             deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None,
+                             profile: Optional[str] = None) -> Optional[Dict]:
+        """Async counterpart of `generate_json`."""
+        text = await self.agenerate(prompt, temperature, max_tokens, use_cache, system=system, schema=schema,
+                                    deadline_s=deadline_s, hedge_after_s=hedge_after_s, profile=profile)
+        return parse_json_response(text, schema)
+
+    async def astream(self, prompt: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                      use_cache: bool = True, system: Optional[str] = None, deadline_s: Optional[float] = None,
+                      profile: Optional[str] = None) -> AsyncIterator[str]:
+        """Async counterpart of `stream`: yields chunks while holding one in-flight slot."""
+        options = self._options(prompt, system, temperature, max_tokens, profile)
+        cache_key = ResponseCache.make_key(self.model, prompt, options, system)
+        start = time.perf_counter()
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("   ⚡ LLM cache hit.")
+                record_llm_call(self.model, "stream", time.perf_counter() - start, cached=True)
+                yield cached
+                return
+
+        if not await self._client_available():
+            print("❌ Ollama client not available.")
+            raise LLMUnavailableError(f"no Ollama server reachable at {', '.join(self.hosts)}")
+
+        deadline_s, deadline = resolve_deadline(self.policy, deadline_s)
+        # The text is only kept to store it in the cache; otherwise each chunk is dropped once yielded
+        caching = use_cache and self.cache.enabled
+        chunks = []
+        streamed = False
+        final = None # The last streamed part carries the timing fields
+        ttft = None
+        for attempt in range(self.policy.retries + 1):
+            if deadline_passed(deadline):
+                raise LLMTimeoutError(f"the {deadline_s:.0f}s deadline passed before the request was sent")
+            if not self.breaker.allow():
+                raise LLMUnavailableError("circuit open: the LLM server is failing, not sending the request")
+            try:
+                async with self._semaphore:
+                    with self.pool.lease() as host:
+                        async for part in await self._async_client(host.url).generate(
+                                model=self.model, prompt=prompt, system=system, options=options,
+                                keep_alive=self.keep_alive, stream=True):
+                            if deadline is not None and time.monotonic() > deadline:
+                                raise LLMTimeoutError(f"stream still running after the {deadline_s:.0f}s deadline")
+                            if part.get("done"):
+                                final = part
+                            piece = part["response"]
+                            if not piece:
+                                continue
+                            if not streamed:
+                                streamed = True
+                                ttft = self.last_ttft = time.perf_counter() - start
+                                print(f"   ⏱️ Time to first token: {ttft:.2f}s")
+                            if caching:
+                                chunks.append(piece)
+                            yield piece
+                break
+            except Exception as e:
+                if isinstance(e, LLMTimeoutError):
+                    record_timeout(self.breaker, deadline)
+                elif is_host_failure(e):
+                    self.breaker.record_failure()
+                elif isinstance(e, LLMError) or is_response_error(e):
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release()
+                    raise # A bug, not an LLM failure
+                delay = self.policy.backoff(attempt)
+                retry = (not streamed and is_host_failure(e) and not isinstance(e, LLMTimeoutError)
+                         and attempt < self.policy.retries
+                         and (deadline is None or time.monotonic() + delay < deadline))
+                if not retry:
+                    print(f"❌ Error streaming response from Ollama: {e}")
+                    if isinstance(e, LLMError):
+                        raise
+                    raise LLMError(f"stream failed after {attempt + 1} attempt(s): {e}") from e
+                print(f"   🔁 LLM stream failed ({e}); retrying in {delay:.1f}s "
+                      f"({attempt + 2}/{self.policy.retries + 1})")
+                await asyncio.sleep(delay)
+        self.breaker.record_success()
+
+        record_llm_call(self.model, "stream", time.perf_counter() - start, response=final, ttft=ttft, host=host.url)
+        if caching and chunks:
+            self.cache.put(cache_key, "".join(chunks))
+
+    async def aclose(self):
+        """Closes the pooled async connections."""
+        for client in self._async_clients.values():
+            await client.close()
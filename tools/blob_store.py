@@ -0,0 +1,107 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from utils.hashing import sha256_file
+
+class BlobStore:
+    """
+    Content-addressed store for session inputs, shared by every session of a workspace.
+
+    Each file is kept once in `<root>/<sha[:2]>/<sha256>` (read-only) and hardlinked into
+    the sessions that use it, so adding the same paper to many sessions costs neither a
+    copy nor disk space. When the store is on another filesystem than the session the
+    file is copied instead. A blob whose only link is the store's own is unused and can
+    be removed with `prune`, unless it was added in the last `PRUNE_GRACE_S` seconds:
+    `add` stamps the blob's mtime, so a session between `add` and `link_into` keeps it.
+    """
+
+    PRUNE_GRACE_S = 3600.0
+
+    def __init__(self, root: str = "workspace/.blobs"):
+        self.root = Path(root).resolve()
+        self._lock = threading.Lock()
+        self._hashes: Dict[Tuple[str, int, int], str] = {} # (path, size, mtime_ns) -> sha256
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def _hash(self, source: Path) -> str:
+        """Hashes a file, remembering the result while its size and mtime do not change."""
+        info = source.stat()
+        key = (str(source), info.st_size, info.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(key)
+        if cached is None:
+            cached = sha256_file(str(source))
+            with self._lock:
+                self._hashes[key] = cached
+        return cached
+
+    def add(self, source_path: str) -> str:
+        """Stores a file (if not stored yet) and returns its SHA-256."""
+        source = Path(source_path).resolve()
+        sha256 = self._hash(source)
+        blob_path = self._blob_path(sha256)
+        if blob_path.exists():
+            try:
+                os.utime(blob_path) # In use again: a concurrent prune must wait for the link
+                return sha256
+            except FileNotFoundError:
+                pass # Pruned in the meantime; store it again
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=blob_path.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copy2(source, tmp_path)
+            os.utime(tmp_path) # copy2 keeps the source's mtime; the grace period counts from now
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return sha256
+
+    def link_into(self, sha256: str, destination: str) -> bool:
+        """
+        Places the blob at `destination` as a hardlink, falling back to a copy across
+        filesystems. Returns True if it was linked.
+        """
+        blob_path = self._blob_path(sha256)
+        dest = Path(destination)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(blob_path, dest)
+            return True
+        except OSError:
+            shutil.copy2(blob_path, dest)
+            return False
+
+    def prune(self, dry_run: bool = False, grace_s: Optional[float] = None) -> Tuple[int, int]:
+        """
+        Removes blobs no session links to and not added in the last `grace_s` seconds
+        (default PRUNE_GRACE_S). Returns (blobs removed, bytes freed).
+        """
+        grace_s = self.PRUNE_GRACE_S if grace_s is None else grace_s
+        removed = freed = 0
+        if not self.root.exists():
+            return removed, freed
+        for blob_path in self.root.glob("*/*"):
+            if blob_path.name.startswith(".tmp-"):
+                continue
+            try:
+                info = blob_path.stat()
+                if info.st_nlink > 1 or time.time() - info.st_mtime < grace_s:
+                    continue
+                if not dry_run:
+                    blob_path.unlink()
+            except OSError:
+                continue
+            removed += 1
+            freed += info.st_size
+        return removed, freed
@@ -0,0 +1,63 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from utils.config import caches_disabled
+from utils.hashing import sha256_text
+
+class ExtractionCache:
+    """
+    Cross-session cache of PaperReaderAgent results, shared by every session of the workspace.
+
+    Entries live in `<cache_dir>/<pdf sha256>/<settings hash>/` and hold the raw text and
+    the structured data. The settings hash covers everything that changes the extraction
+    (model, page limit, analysis mode, chunking), so a different configuration never
+    reuses stale results.
+    """
+
+    RAW_TEXT_FILE = "raw_paper_text.txt"
+    STRUCTURED_DATA_FILE = "structured_data.json"
+
+    def __init__(self, cache_dir: str = "workspace/.cache/extractions", enabled: Optional[bool] = None):
+        self.cache_dir = Path(cache_dir).resolve()
+        self.enabled = (not caches_disabled()) if enabled is None else enabled
+
+    @staticmethod
+    def settings_key(settings: Dict) -> str:
+        return sha256_text(json.dumps(settings, sort_keys=True, default=str))[:16]
+
+    def _entry_dir(self, pdf_hash: str, settings_key: str) -> Path:
+        return self.cache_dir / pdf_hash / settings_key
+
+    def load(self, pdf_hash: str, settings_key: str) -> Optional[Tuple[str, Dict]]:
+        """Returns (raw_text, structured_data) for a previous extraction, or None."""
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(pdf_hash, settings_key)
+        try:
+            raw_text = (entry_dir / self.RAW_TEXT_FILE).read_text(encoding="utf-8")
+            structured_data = json.loads((entry_dir / self.STRUCTURED_DATA_FILE).read_text(encoding="utf-8"))
+            return raw_text, structured_data
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def store(self, pdf_hash: str, settings_key: str, raw_text: str, structured_data: Dict, settings: Dict):
+        """Saves an extraction. The entry directory is built aside and renamed into place."""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(pdf_hash, settings_key)
+        tmp_dir = None
+        try:
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            tmp_dir = Path(tempfile.mkdtemp(dir=entry_dir.parent, prefix=".tmp-"))
+            (tmp_dir / self.RAW_TEXT_FILE).write_text(raw_text, encoding="utf-8")
+            (tmp_dir / self.STRUCTURED_DATA_FILE).write_text(json.dumps(structured_data, indent=2), encoding="utf-8")
+            (tmp_dir / "settings.json").write_text(json.dumps(settings, indent=2, default=str), encoding="utf-8")
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+        except OSError as e:
+            print(f"   ⚠️ Could not store extraction in cache: {e}")
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
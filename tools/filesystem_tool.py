@@ -1,42 +1,154 @@
+import hashlib
 import os
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Optional
+from tools.artifact_store import ArtifactStore
+from tools.blob_store import BlobStore
+from tools.resilience import LLMError
+from utils.config import workspace_cache_dir
 
 class FileSystemTool:
-    def __init__(self, base_path: str):
+    """
+    Sandboxed access to a session directory.
+
+    Text artifacts go through an ArtifactStore: agents in the same process read what other
+    agents wrote from memory, and files are written atomically in the background. Anything
+    that reads the session files directly must call `flush` first (`get_full_path` does).
+    Every write is recorded in the session's manifest.json (see ArtifactStore). External
+    inputs are kept once in a BlobStore (by default `.blobs/` next to the session) and
+    hardlinked into the session; the workspace caches live in `.cache/` next to it too.
+    """
+
+    def __init__(self, base_path: str, blob_store: Optional[BlobStore] = None):
         self.base_path = Path(base_path).resolve()
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self.store = ArtifactStore(self.base_path)
+        self.blobs = blob_store or BlobStore(str(self.base_path.parent / ".blobs"))
+        self._resolved: Dict[str, Path] = {} # relative path -> checked absolute path
         print(f"📦 Initialized FileSystemTool with base path: {self.base_path}")
 
+    def cache_dir(self, name: str) -> str:
+        """Directory of the workspace's `name` cache, shared by every session next to this one."""
+        return workspace_cache_dir(str(self.base_path.parent), name)
+
     def _resolve_path(self, relative_path: str) -> Path:
         """Resolves a relative path against the base path and ensures it's within the sandbox."""
+        cached = self._resolved.get(relative_path)
+        if cached is not None:
+            return cached
         resolved_path = (self.base_path / relative_path).resolve()
         # Security check: Ensure the resolved path is still within the base_path directory
         if self.base_path not in resolved_path.parents and resolved_path != self.base_path:
              # Allow access if it's exactly the base path itself
             if not str(resolved_path).startswith(str(self.base_path)):
                  raise PermissionError(f"Attempted access outside sandbox directory: {resolved_path}")
+        self._resolved[relative_path] = resolved_path
         return resolved_path
 
     def write_text(self, relative_path: str, content: str):
-        """Writes text content to a file within the workspace."""
-        path = self._resolve_path(relative_path)
+        """
+        Writes text content to a file within the workspace. The content is readable at once;
+        the file itself is replaced atomically by the background writer.
+        """
         try:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text(content, encoding="utf-8")
+            self._resolve_path(relative_path)
+            self.store.put(relative_path, content)
             print(f"   📄 Wrote text to: {relative_path}")
         except Exception as e:
             print(f"   ❌ Error writing to {relative_path}: {e}")
 
+    def write_stream(self, relative_path: str, chunks: Iterable[str]) -> int:
+        """
+        Writes text chunks as they arrive to `<file>.part`, flushing after each one so the
+        file can be followed while it grows, and renames it into place once complete. Only
+        the hash and size are kept: the text is not held in memory, and later readers load
+        it from disk.
+        Returns the number of characters written; nothing is created unless a non-empty
+        chunk arrives, and a failed stream leaves the previous file untouched (returns 0).
+        An LLMError raised by the stream is re-raised once the partial file is removed, so
+        a failed generation is not mistaken for an empty one.
+        """
+        path = self._resolve_path(relative_path)
+        part_path = path.with_name(path.name + ".part")
+        digest = hashlib.sha256()
+        size = characters = 0
+        file = None
+        previous_entry = None
+        started = time.perf_counter()
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if file is None:
+                    # A queued write of the same file must not land after the stream
+                    previous_entry = self.store.manifest.get(relative_path)
+                    self.store.forget(relative_path)
+                    self.store.flush(relative_path)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    file = part_path.open("w", encoding="utf-8")
+                    print(f"   📝 Streaming text to: {relative_path}")
+                file.write(chunk)
+                file.flush()
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                characters += len(chunk)
+            if file is None:
+                return 0
+            file.close()
+            os.replace(part_path, path)
+            self.store.record(relative_path, size, digest.hexdigest(), time.perf_counter() - started)
+            print(f"   📄 Wrote {characters} characters to: {relative_path}")
+            return characters
+        except Exception as e:
+            print(f"   ❌ Error streaming to {relative_path}: {e}")
+            if file is not None:
+                file.close()
+                part_path.unlink(missing_ok=True)
+                if path.is_file():
+                    self.store.restore_entry(relative_path, previous_entry) # The previous file stays
+            if isinstance(e, LLMError):
+                raise
+            return 0
+
+    def copy_into(self, source_path: str, relative_path: str):
+        """
+        Places an external file (e.g. the paper PDF) in the workspace as a hardlink to its
+        blob in the content-addressed store, and records it in the manifest.
+        """
+        path = self._resolve_path(relative_path)
+        started = time.perf_counter()
+        self.store.forget(relative_path)
+        self.store.flush(relative_path)
+        sha256 = self.blobs.add(source_path)
+        linked = self.blobs.link_into(sha256, str(path))
+        self.store.record(relative_path, path.stat().st_size, sha256, time.perf_counter() - started)
+        print(f"   📄 {'Linked' if linked else 'Copied'} {Path(source_path).name} to: {relative_path}")
+
+    def file_hash(self, relative_path: str) -> Optional[str]:
+        """SHA-256 of a file as recorded in the manifest (None if it was not written through this tool)."""
+        self.store.flush(relative_path)
+        entry = self.store.manifest.get(relative_path)
+        return entry["sha256"] if entry else None
+
+    def manifest_entry(self, relative_path: str) -> Optional[Dict]:
+        """The manifest entry of a file (size, SHA-256, writer, written_at), or None if it has none."""
+        entry = self.store.manifest.get(relative_path)
+        return dict(entry) if entry else None
 
     def read_text(self, relative_path: str) -> Optional[str]:
-        """Reads text content from a file within the workspace."""
+        """Reads text content from a file within the workspace (from memory when already loaded)."""
+        content = self.store.get(relative_path)
+        if content is not None:
+            return content
         path = self._resolve_path(relative_path)
         if not path.exists():
             print(f"   ⚠️ File not found: {relative_path}")
             return None
         try:
             content = path.read_text(encoding="utf-8")
+            self.store.remember(relative_path, content)
             print(f"   📄 Read text from: {relative_path}")
             return content
         except Exception as e:
@@ -46,6 +158,7 @@ class FileSystemTool:
 
     def list_files(self, relative_dir: str = "") -> list:
         """Lists files recursively within a directory in the workspace."""
+        self.store.flush()
         dir_path = self._resolve_path(relative_dir)
         if not dir_path.is_dir():
             print(f"   ⚠️ Directory not found for listing: {relative_dir}")
@@ -60,6 +173,8 @@ class FileSystemTool:
 
     def file_exists(self, relative_path: str) -> bool:
         """Checks if a file exists within the workspace."""
+        if self.store.contains(relative_path):
+            return True
         path = self._resolve_path(relative_path)
         exists = path.exists() and path.is_file()
         # print(f"   ❓ Checked existence of {relative_path}: {'Exists' if exists else 'Not Found'}")
@@ -67,6 +182,7 @@ class FileSystemTool:
 
     def dir_exists(self, relative_path: str) -> bool:
         """Checks if a directory exists within the workspace."""
+        self.store.flush()
         path = self._resolve_path(relative_path)
         exists = path.exists() and path.is_dir()
         # print(f"   ❓ Checked existence of directory {relative_path}: {'Exists' if exists else 'Not Found'}")
@@ -75,6 +191,8 @@ class FileSystemTool:
 
     def delete_file(self, relative_path: str):
         """Deletes a file within the workspace."""
+        self.store.forget(relative_path)
+        self.store.flush(relative_path)
         path = self._resolve_path(relative_path)
         if path.exists() and path.is_file():
             try:
@@ -99,6 +217,14 @@ class FileSystemTool:
 
 
     def get_full_path(self, relative_path: str) -> str:
-        """Gets the absolute path for a relative path within the workspace."""
+        """
+        Gets the absolute path for a relative path within the workspace, once any pending
+        write of that file has reached the disk.
+        """
+        self.store.flush(relative_path)
         return str(self._resolve_path(relative_path))
 
+    def flush(self):
+        """Waits until every artifact written through this tool is on disk."""
+        self.store.flush()
+
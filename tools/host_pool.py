@@ -0,0 +1,174 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+class Host:
+    """State of one Ollama endpoint: its client, health, requests in flight and recent latency."""
+
+    def __init__(self, url: str, client: Any, probe_client: Any):
+        self.url = url
+        self.client = client
+        self.probe_client = probe_client # Short timeout, for health checks
+        self.healthy: Optional[bool] = None # Unknown until the first health check
+        self.in_flight = 0
+        self.latency_s: Optional[float] = None # Exponentially weighted moving average
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+
+    def stats(self) -> Dict:
+        return {"url": self.url, "healthy": self.healthy, "in_flight": self.in_flight,
+                "latency_s": round(self.latency_s, 3) if self.latency_s is not None else None,
+                "requests": self.requests, "failures": self.failures}
+
+def _transport_errors() -> tuple:
+    try:
+        import httpx # Deferred like ollama, which already imported it by the time a request fails
+    except ImportError:
+        return ()
+    return (httpx.TransportError,)
+
+def is_host_failure(error: BaseException) -> bool:
+    """
+    Connection errors, timeouts and 5xx responses (or errors reported mid-stream, without a
+    status) count against the host. A 4xx is a problem of the request, and any other
+    exception is a bug on this side, which must neither be retried nor eject the host.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status < 0 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError) + _transport_errors())
+
+def is_response_error(error: BaseException) -> bool:
+    """True for an error response of the server (it carries an HTTP status)."""
+    return getattr(error, "status_code", None) is not None
+
+class HostPool:
+    """
+    Routes requests over several Ollama servers.
+
+    Each request goes to the healthy host with the fewest requests in flight, ties going
+    to the lowest recent latency (an EWMA of the request durations), so a slow or busy box
+    gets less work. A host is ejected after `failure_threshold` consecutive failed requests,
+    unless it is the last healthy one, or when a health check (`GET /api/tags`) fails; a
+    background thread re-checks every host each `check_interval_s` seconds and readmits
+    the ones that answer again.
+    """
+
+    def __init__(self, urls: List[str], client_factory: Callable[..., Any], failure_threshold: int = 2,
+                 check_interval_s: float = 10.0, probe_timeout_s: float = 5.0, ewma_alpha: float = 0.3):
+        if not urls:
+            raise ValueError("HostPool needs at least one host")
+        self.hosts = [Host(url, client_factory(host=url), client_factory(host=url, timeout=probe_timeout_s))
+                      for url in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.check_interval_s = check_interval_s
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+
+    def _set_health(self, host: Host, healthy: bool, reason: str = ""):
+        # Called with the lock held
+        if host.healthy == healthy:
+            return
+        first_check = host.healthy is None
+        host.healthy = healthy
+        host.consecutive_failures = 0
+        if first_check:
+            return
+        if healthy:
+            print(f"✅ Ollama host {host.url} is available")
+        else:
+            print(f"⚠️ Ejecting Ollama host {host.url}: {reason}")
+
+    def check(self, host: Host) -> bool:
+        """Probes one host and ejects or readmits it accordingly."""
+        try:
+            host.probe_client.list()
+            healthy, reason = True, ""
+        except Exception as e:
+            healthy, reason = False, f"health check failed ({e})"
+        with self._lock:
+            self._set_health(host, healthy, reason)
+        return healthy
+
+    def check_all(self) -> int:
+        """Probes every host concurrently. Returns the number of healthy hosts."""
+        with ThreadPoolExecutor(max_workers=len(self.hosts), thread_name_prefix="ollama-check") as pool:
+            return sum(pool.map(self.check, self.hosts))
+
+    def start_health_checks(self):
+        """Starts the background thread re-checking every host (no-op if disabled or already running)."""
+        if self.check_interval_s <= 0 or self._checker is not None:
+            return
+        self._checker = threading.Thread(target=self._check_loop, name="ollama-health", daemon=True)
+        self._checker.start()
+
+    def _check_loop(self):
+        while True:
+            time.sleep(self.check_interval_s)
+            self.check_all()
+
+    def healthy(self) -> List[Host]:
+        with self._lock:
+            return [host for host in self.hosts if host.healthy]
+
+    def pick(self) -> Optional[Host]:
+        """The healthy host that would get the next request, or None if there is none."""
+        with self._lock:
+            return self._pick()
+
+    def _pick(self) -> Optional[Host]:
+        # Called with the lock held
+        candidates = [host for host in self.hosts if host.healthy]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda host: (host.in_flight, host.latency_s or 0.0))
+
+    def acquire(self) -> Host:
+        """Takes the least loaded healthy host for a request; `release` must follow."""
+        with self._lock:
+            host = self._pick()
+            if host is None:
+                raise ConnectionError("No healthy Ollama host available")
+            host.in_flight += 1
+            host.requests += 1
+            return host
+
+    def release(self, host: Host, duration: float, error: Optional[BaseException] = None):
+        """Ends a request, updating the host's latency average or its failure count."""
+        with self._lock:
+            host.in_flight -= 1
+            if error is not None and not isinstance(error, Exception):
+                return # Cancelled or closed early: says nothing about the host
+            if error is None or not is_host_failure(error):
+                host.consecutive_failures = 0
+                if error is None:
+                    host.latency_s = duration if host.latency_s is None else \
+                        self.ewma_alpha * duration + (1 - self.ewma_alpha) * host.latency_s
+                return
+            host.failures += 1
+            host.consecutive_failures += 1
+            others_healthy = any(other.healthy for other in self.hosts if other is not host)
+            if host.consecutive_failures >= self.failure_threshold and others_healthy:
+                self._set_health(host, False, f"{host.consecutive_failures} consecutive failures ({error})")
+
+    @contextmanager
+    def lease(self) -> Iterator[Host]:
+        """Holds the least loaded healthy host for the duration of the block."""
+        host = self.acquire()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield host
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.release(host, time.perf_counter() - start, error)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [host.stats() for host in self.hosts]
@@ -1,37 +1,281 @@
-from ollama import Client
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+from tools.host_pool import HostPool, is_host_failure, is_response_error
+from tools.resilience import (CircuitBreaker, LLMError, LLMTimeoutError, LLMUnavailableError, ResiliencePolicy,
+                              call_with_resilience, deadline_passed, record_timeout, resolve_deadline)
+from tools.response_cache import ResponseCache
+from utils.json_schema import json_errors, parse_json_response
+from utils.metrics import current_stage, record_llm_call
+from utils.config import (caches_disabled, env_float, env_int, keep_alive_setting, ollama_hosts,
+                          workspace_cache_dir)
+from utils.generation_profiles import GenerationProfiles
 
 class OllamaClient:
-    def __init__(self, model: str = "gemma3:12b", host: str = "http://localhost:11434"):
+    def __init__(self, model: str = "gemma3:12b", host: Union[str, Sequence[str], None] = None,
+                 cache: Optional[ResponseCache] = None, cache_dir: Optional[str] = None, lazy_connect: bool = False,
+                 keep_alive: Optional[Union[str, float]] = None, policy: Optional[ResiliencePolicy] = None,
+                 profiles: Optional[GenerationProfiles] = None):
+        # Response cache, in `cache_dir` (default: workspace/.cache/llm); set PAPER2PROD_NO_CACHE=1
+        # to bypass it for every call
+        if cache is None:
+            cache = ResponseCache(cache_dir or workspace_cache_dir("workspace", "llm"), enabled=not caches_disabled())
+        self.cache = cache
+        self.model = model
+        # One URL, several (a list or comma-separated) or PAPER2PROD_OLLAMA_HOSTS; requests are
+        # balanced over the reachable ones (see HostPool)
+        self.hosts = ollama_hosts(host)
+        self.host = self.hosts[0]
+        # Sent with every request so the model stays loaded between stages and between sessions
+        self.keep_alive = keep_alive if keep_alive is not None else keep_alive_setting()
+        self.last_ttft = None # Time to first token of the most recent streamed call, in seconds
+        # Deadlines, retries and hedging of every call; failures raise LLMError instead of returning text
+        self.policy = policy or ResiliencePolicy.from_env()
+        self.breaker = CircuitBreaker(failure_threshold=env_int("PAPER2PROD_BREAKER_THRESHOLD", 5),
+                                      reset_timeout_s=env_float("PAPER2PROD_BREAKER_RESET", 30.0))
+        # Per-agent temperature, output budget, stop sequences and context window sizing
+        self.profiles = profiles or GenerationProfiles.load()
+
+        # The connection check runs in a background thread with lazy_connect, so construction
+        # returns immediately; the first use of `client` waits for it to finish
+        self.pool: Optional[HostPool] = None
+        self._connected = threading.Event()
+        if lazy_connect:
+            threading.Thread(target=self._connect, name="ollama-connect", daemon=True).start()
+        else:
+            self._connect()
+
+    def _connect(self):
         try:
-            self.model = model
-            self.client = Client(host=host)
+            from ollama import Client # Deferred: importing ollama dominates startup time
+            # Requests time out with the call deadline, so a thread abandoned by it does not wait forever
+            timeout = self.policy.deadline_s or None
+            pool = HostPool(self.hosts, lambda host, **kwargs: Client(host=host, **({"timeout": timeout} | kwargs)),
+                            check_interval_s=env_int("PAPER2PROD_HEALTH_CHECK_INTERVAL", 10))
             # Test connection
-            self.client.list()
-            print(f"✅ Ollama client connected successfully to {host}")
+            pool.check_all()
+            self.pool = pool
+            pool.start_health_checks() # Readmits hosts that come back (or come up later)
+            healthy = [host.url for host in pool.healthy()]
+            if healthy:
+                print(f"✅ Ollama client connected successfully to {', '.join(healthy)}")
+            for host in pool.hosts:
+                if not host.healthy:
+                    print(f"❌ Error connecting to Ollama at {host.url}")
+            if not healthy:
+                print("Ensure Ollama is running and the model is available (e.g., 'ollama run mistral').")
         except ImportError:
             print("❌ Error: 'ollama' package not found. Please install it: pip install ollama")
-            self.client = None
-        except Exception as e:
-            print(f"❌ Error connecting to Ollama at {host}: {e}")
-            print("Ensure Ollama is running and the model is available (e.g., 'ollama run mistral').")
-            self.client = None
+        finally:
+            self._connected.set()
+
+    @property
+    def client(self):
+        """
+        The ollama Client of the host the next request would go to, or None if no host is
+        reachable. Waits for a pending connection check.
+        """
+        self._connected.wait()
+        host = self.pool.pick() if self.pool is not None else None
+        return host.client if host is not None else None
+
+    def host_stats(self) -> List[Dict]:
+        """Health, requests in flight, latency average and counters of every host."""
+        return self.pool.stats() if self.pool is not None else []
+
+    def _options(self, prompt: str, system: Optional[str], temperature: Optional[float], max_tokens: Optional[int],
+                 profile: Optional[str], default_temperature: float = 0.7) -> dict:
+        return self.profiles.get(profile).options(prompt, system, temperature, max_tokens, default_temperature)
+
+    def generate(self, prompt: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+                 use_cache: bool = True, system: Optional[str] = None, schema: Optional[Dict] = None,
+                 deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None,
+                 profile: Optional[str] = None) -> str:
+        """
+        Returns the completion text. With `schema`, the output is constrained to JSON matching
+        it (Ollama's `format`) and only responses that validate are cached.
+        Temperature, output length, stop sequences and num_ctx come from the generation
+        `profile` of the calling agent (see utils.generation_profiles); an explicit
+        `temperature` or `max_tokens` overrides it.
+        The call is bounded by `deadline_s` (default: the policy's, or less inside a
+        `deadline_scope`) and retried on connection errors; with `hedge_after_s` (or for a
+        stage in the policy's hedge_stages) a duplicate request is sent if the first is slow. Raises LLMError when no completion is obtained.
+        """
+        default_temperature = 0.2 if schema is not None else 0.7
+        options = self._options(prompt, system, temperature, max_tokens, profile, default_temperature)
+        cache_key = ResponseCache.make_key(self.model, prompt, options, system, schema)
+        start = time.perf_counter()
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("   ⚡ LLM cache hit.")
+                record_llm_call(self.model, "generate", time.perf_counter() - start, cached=True)
+                return cached
 
-    def generate(self, prompt: str, temperature: float = 0.7, max_tokens: int = 2048) -> str:
         if self.client is None:
-            print("⚠️ Ollama client not available. Returning dummy response.")
-            return f"Dummy response for: {prompt[:50]}..."
+            print("❌ Ollama client not available.")
+            raise LLMUnavailableError(f"no Ollama server reachable at {', '.join(self.hosts)}")
+
+        def request():
+            # Every attempt (and hedged duplicate) leases the least loaded host of the pool
+            with self.pool.lease() as host:
+                return host, host.client.generate(
+                    model=self.model,
+                    prompt=prompt,
+                    system=system,
+                    format=schema,
+                    options=options,
+                    keep_alive=self.keep_alive
+                )
 
         try:
-            response = self.client.generate(
-                model=self.model,
-                prompt=prompt,
-                options={
-                    "temperature": temperature,
-                    "num_predict": max_tokens # Renamed from max_tokens for ollama library
-                }
-            )
-            return response["response"]
-        except Exception as e:
+            host, response = call_with_resilience(request, self.policy, self.breaker, deadline_s,
+                                                  self.policy.hedge_delay(current_stage.get(), hedge_after_s))
+        except LLMError as e:
             print(f"❌ Error generating response from Ollama: {e}")
-            return f"Error generating response for: {prompt[:50]}..."
+            raise
+        text = response["response"]
+        record_llm_call(self.model, "generate", time.perf_counter() - start, response=response, host=host.url)
+        if use_cache and text and (schema is None or not json_errors(text, schema)):
+            self.cache.put(cache_key, text)
+        return text
+
+    def generate_json(self, prompt: str, schema: Dict, temperature: Optional[float] = None,
+                      max_tokens: Optional[int] = None, use_cache: bool = True, system: Optional[str] = None,
+                      deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None,
+                      profile: Optional[str] = None) -> Optional[Dict]:
+        """
+        Generates a JSON object constrained by `schema` and returns it validated, or None if
+        the response does not validate. Raises LLMError when no response is obtained.
+        """
+        text = self.generate(prompt, temperature, max_tokens, use_cache, system=system, schema=schema,
+                             deadline_s=deadline_s, hedge_after_s=hedge_after_s, profile=profile)
+        return parse_json_response(text, schema)
+
+    def stream(self, prompt: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None,
+               use_cache: bool = True, system: Optional[str] = None, deadline_s: Optional[float] = None,
+               profile: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields the completion in chunks as the model produces them.
+        A cache hit is yielded as a single chunk; a completed stream is stored in the cache,
+        which is the only reason its text is kept until the end (with `use_cache` False or
+        the cache disabled, no chunk is kept once yielded).
+        Connection errors before the first chunk are retried like `generate`; a stream that
+        fails later, or outlives `deadline_s`, raises LLMError (the chunks already yielded
+        cannot be taken back, so callers must discard the partial text).
+        """
+        options = self._options(prompt, system, temperature, max_tokens, profile)
+        cache_key = ResponseCache.make_key(self.model, prompt, options, system)
+        start = time.perf_counter()
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("   ⚡ LLM cache hit.")
+                record_llm_call(self.model, "stream", time.perf_counter() - start, cached=True)
+                yield cached
+                return
+
+        if self.client is None:
+            print("❌ Ollama client not available.")
+            raise LLMUnavailableError(f"no Ollama server reachable at {', '.join(self.hosts)}")
+
+        deadline_s, deadline = resolve_deadline(self.policy, deadline_s)
+        # The text is only kept to store it in the cache; otherwise each chunk is dropped once yielded
+        caching = use_cache and self.cache.enabled
+        chunks = []
+        streamed = False
+        final = None # The last streamed part carries the timing fields
+        ttft = None
+        for attempt in range(self.policy.retries + 1):
+            if deadline_passed(deadline):
+                raise LLMTimeoutError(f"the {deadline_s:.0f}s deadline passed before the request was sent")
+            if not self.breaker.allow():
+                raise LLMUnavailableError("circuit open: the LLM server is failing, not sending the request")
+            try:
+                # The host stays leased (counted in flight) until the stream ends
+                with self.pool.lease() as host:
+                    for part in host.client.generate(model=self.model, prompt=prompt, system=system, options=options,
+                                                     keep_alive=self.keep_alive, stream=True):
+                        if deadline is not None and time.monotonic() > deadline:
+                            raise LLMTimeoutError(f"stream still running after the {deadline_s:.0f}s deadline")
+                        if part.get("done"):
+                            final = part
+                        piece = part["response"]
+                        if not piece:
+                            continue
+                        if not streamed:
+                            streamed = True
+                            ttft = self.last_ttft = time.perf_counter() - start
+                            print(f"   ⏱️ Time to first token: {ttft:.2f}s")
+                        if caching:
+                            chunks.append(piece)
+                        yield piece
+                break
+            except Exception as e:
+                if isinstance(e, LLMTimeoutError):
+                    record_timeout(self.breaker, deadline)
+                elif is_host_failure(e):
+                    self.breaker.record_failure()
+                elif isinstance(e, LLMError) or is_response_error(e):
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release()
+                    raise # A bug, not an LLM failure
+                delay = self.policy.backoff(attempt)
+                retry = (not streamed and is_host_failure(e) and not isinstance(e, LLMTimeoutError)
+                         and attempt < self.policy.retries
+                         and (deadline is None or time.monotonic() + delay < deadline))
+                if not retry:
+                    print(f"❌ Error streaming response from Ollama: {e}")
+                    if isinstance(e, LLMError):
+                        raise
+                    raise LLMError(f"stream failed after {attempt + 1} attempt(s): {e}") from e
+                print(f"   🔁 LLM stream failed ({e}); retrying in {delay:.1f}s "
+                      f"({attempt + 2}/{self.policy.retries + 1})")
+                time.sleep(delay)
+        self.breaker.record_success()
+
+        print(f"   ⏱️ Stream finished in {time.perf_counter() - start:.2f}s")
+        record_llm_call(self.model, "stream", time.perf_counter() - start, response=final, ttft=ttft, host=host.url)
+        if caching and chunks:
+            self.cache.put(cache_key, "".join(chunks))
+
+    def preload(self) -> bool:
+        """
+        Loads the model into server memory with an empty request, so later calls skip the load
+        time. With several hosts every reachable one loads it, concurrently. The request uses
+        the profiles' smallest context window, so the calls that fit it reuse the loaded model.
+        """
+        if self.client is None:
+            return False
+        hosts = self.pool.healthy()
+        with ThreadPoolExecutor(max_workers=len(hosts), thread_name_prefix="ollama-preload") as pool:
+            contexts = [contextvars.copy_context() for _ in hosts]
+            return any(list(pool.map(lambda context, host: context.run(self._preload_host, host), contexts, hosts)))
+
+    def _preload_host(self, host) -> bool:
+        start = time.perf_counter()
+        try:
+            response = host.client.generate(model=self.model, prompt="", options=self.profiles.preload_options(),
+                                            keep_alive=self.keep_alive)
+            record_llm_call(self.model, "preload", time.perf_counter() - start, response=response, host=host.url)
+            where = f" on {host.url}" if len(self.hosts) > 1 else ""
+            print(f"   🔥 Model {self.model} ready{where} in {time.perf_counter() - start:.2f}s")
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not preload model {self.model} on {host.url}: {e}")
+            return False
+
+    def start_preload(self) -> threading.Thread:
+        """Runs `preload` in a background thread, recorded as the "warmup" stage in the metrics."""
+        context = contextvars.copy_context()
+        context.run(current_stage.set, "warmup")
+        thread = threading.Thread(target=context.run, args=(self.preload,), name="ollama-preload", daemon=True)
+        thread.start()
+        return thread
 
+    def cache_stats(self) -> dict:
+        """Returns hit/miss counters of the response cache."""
+        return self.cache.stats()
@@ -0,0 +1,281 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional, Set, Tuple
+from tools.host_pool import is_host_failure, is_response_error
+from utils.config import env_float, env_int
+
+class LLMError(Exception):
+    """Raised instead of returning text when the LLM cannot produce a completion."""
+
+class LLMUnavailableError(LLMError):
+    """No Ollama server is reachable, or the circuit breaker is open."""
+
+class LLMTimeoutError(LLMError, TimeoutError):
+    """The call's deadline passed before any attempt succeeded."""
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the LLM server is down. After `failure_threshold` consecutive
+    failed attempts the circuit opens and calls are refused for `reset_timeout_s`
+    seconds; then a single trial call is let through (half-open), which closes the
+    circuit if it succeeds and opens it again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout_s = reset_timeout_s
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print("✅ LLM circuit closed: the server answers again")
+            self.state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call that says nothing about the server (it failed on this side), freeing a half-open trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                print(f"⚠️ LLM circuit open after {self._failures} consecutive failures; "
+                      f"failing fast for {self.reset_timeout_s:.0f}s")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+class ResiliencePolicy:
+    """
+    Deadline, retries and hedging applied to every LLM call.
+
+    Each call must finish within `deadline_s` (0 disables it), including its retries.
+    Retryable failures are retried up to `retries` times, waiting an exponential backoff
+    with full jitter (`base_delay_s` doubled per attempt, at most `max_delay_s`). Calls
+    made by a stage listed in `hedge_stages` send a duplicate request when the first has
+    not answered after `hedge_after_s` seconds and use whichever answers first, trading
+    some extra load for a shorter tail latency.
+    """
+
+    def __init__(self, deadline_s: float = 600.0, retries: int = 2, base_delay_s: float = 1.0,
+                 max_delay_s: float = 10.0, hedge_after_s: float = 5.0, hedge_stages: Optional[Set[str]] = None):
+        self.deadline_s = deadline_s
+        self.retries = max(0, retries)
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.hedge_after_s = hedge_after_s
+        self.hedge_stages = set(hedge_stages or ())
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """Settings from PAPER2PROD_LLM_DEADLINE, _LLM_RETRIES, _HEDGE_STAGES and _HEDGE_AFTER."""
+        stages = {stage.strip() for stage in os.environ.get("PAPER2PROD_HEDGE_STAGES", "").split(",") if stage.strip()}
+        return cls(deadline_s=env_float("PAPER2PROD_LLM_DEADLINE", 600.0), retries=env_int("PAPER2PROD_LLM_RETRIES", 2),
+                   hedge_after_s=env_float("PAPER2PROD_HEDGE_AFTER", 5.0), hedge_stages=stages)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** attempt))
+
+    def hedge_delay(self, stage: Optional[str], hedge_after_s: Optional[float] = None) -> Optional[float]:
+        """Seconds after which a duplicate request is sent, or None if the call is not hedged."""
+        if hedge_after_s is not None:
+            return hedge_after_s
+        return self.hedge_after_s if stage in self.hedge_stages else None
+
+# Instant (time.monotonic()) by which every LLM call made in this context must finish, or None;
+# set with `deadline_scope` to bound a group of calls, such as a regeneration round
+call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("call_deadline", default=None)
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Makes the LLM calls of the block finish within `seconds` (or an earlier enclosing scope)."""
+    deadline = time.monotonic() + seconds
+    enclosing = call_deadline.get()
+    token = call_deadline.set(deadline if enclosing is None else min(deadline, enclosing))
+    try:
+        yield
+    finally:
+        call_deadline.reset(token)
+
+def resolve_deadline(policy: ResiliencePolicy, deadline_s: Optional[float]) -> Tuple[float, Optional[float]]:
+    """
+    The deadline of a call, in seconds and as a time.monotonic() instant (None: unbounded):
+    `deadline_s` (default: the policy's), cut short by the context's `call_deadline`.
+    """
+    deadline_s = policy.deadline_s if deadline_s is None else deadline_s
+    now = time.monotonic()
+    deadline = now + deadline_s if deadline_s else None
+    scope = call_deadline.get()
+    if scope is not None and (deadline is None or scope < deadline):
+        deadline, deadline_s = scope, max(0.0, scope - now)
+    return deadline_s, deadline
+
+def deadline_passed(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+def record_timeout(breaker: CircuitBreaker, deadline: Optional[float]):
+    """
+    Settles the breaker for a call that ran out of time. Only the call's own deadline says the
+    server is too slow; running out of an enclosing `deadline_scope` is the caller's budget.
+    """
+    if deadline is not None and deadline == call_deadline.get():
+        breaker.release()
+    else:
+        breaker.record_failure()
+
+def _start(call: Callable[[], Any]) -> Future:
+    """Runs `call` in a daemon thread (in a copy of the caller's context), so an abandoned call never blocks exit."""
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            future.set_result(context.run(call))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name="llm-call", daemon=True).start()
+    return future
+
+def _attempt(call: Callable[[], Any], deadline: Optional[float], hedge_after_s: Optional[float]) -> Any:
+    """One attempt, with an optional hedged duplicate; the first success wins."""
+    if deadline is None and hedge_after_s is None:
+        return call()
+    pending = {_start(call)}
+    hedge_at = time.monotonic() + hedge_after_s if hedge_after_s is not None else None
+    error: Optional[BaseException] = None
+    while pending:
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            raise LLMTimeoutError("deadline exceeded")
+        timeouts = [limit - now for limit in (deadline, hedge_at) if limit is not None]
+        done, pending = wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None,
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+            print(f"   🪁 No answer after {hedge_after_s:.1f}s, sending a hedged request")
+            pending.add(_start(call))
+            hedge_at = None
+    raise error
+
+def call_with_resilience(call: Callable[[], Any], policy: ResiliencePolicy, breaker: CircuitBreaker,
+                         deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None) -> Any:
+    """
+    Runs `call` under the policy: deadline, retries with backoff, hedging and the circuit
+    breaker. Returns its result or raises LLMError.
+    """
+    deadline_s, deadline = resolve_deadline(policy, deadline_s)
+    attempts = policy.retries + 1
+    for attempt in range(attempts):
+        if deadline_passed(deadline):
+            raise LLMTimeoutError(f"the {deadline_s:.0f}s deadline passed before the request was sent")
+        if not breaker.allow():
+            raise LLMUnavailableError("circuit open: the LLM server is failing, not sending the request")
+        try:
+            result = _attempt(call, deadline, hedge_after_s)
+        except LLMTimeoutError:
+            record_timeout(breaker, deadline)
+            raise LLMTimeoutError(f"no response within the {deadline_s:.0f}s deadline")
+        except Exception as e:
+            if not is_host_failure(e):
+                if not is_response_error(e):
+                    breaker.release()
+                    raise # A bug, not an LLM failure
+                breaker.record_success() # A 4xx would fail again: the server answered, the request is wrong
+                raise LLMError(str(e)) from e
+            breaker.record_failure()
+            delay = policy.backoff(attempt)
+            if attempt + 1 == attempts or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise LLMError(f"failed after {attempt + 1} attempt(s): {e}") from e
+            print(f"   🔁 LLM call failed ({e}); retrying in {delay:.1f}s ({attempt + 2}/{attempts})")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+async def _aattempt(call: Callable[[], Awaitable[Any]], deadline: Optional[float],
+                    hedge_after_s: Optional[float]) -> Any:
+    pending = {asyncio.ensure_future(call())}
+    hedge_at = time.monotonic() + hedge_after_s if hedge_after_s is not None else None
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise LLMTimeoutError("deadline exceeded")
+            timeouts = [limit - now for limit in (deadline, hedge_at) if limit is not None]
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, min(timeouts)) if timeouts else None,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+                print(f"   🪁 No answer after {hedge_after_s:.1f}s, sending a hedged request")
+                pending.add(asyncio.ensure_future(call()))
+                hedge_at = None
+        raise error
+    finally:
+        for task in pending:
+            task.cancel() # Unlike threads, the losing or late requests can be cancelled
+
+async def acall_with_resilience(call: Callable[[], Awaitable[Any]], policy: ResiliencePolicy, breaker: CircuitBreaker,
+                                deadline_s: Optional[float] = None, hedge_after_s: Optional[float] = None) -> Any:
+    """Async counterpart of `call_with_resilience`; `call` returns a new coroutine per attempt."""
+    deadline_s, deadline = resolve_deadline(policy, deadline_s)
+    attempts = policy.retries + 1
+    for attempt in range(attempts):
+        if deadline_passed(deadline):
+            raise LLMTimeoutError(f"the {deadline_s:.0f}s deadline passed before the request was sent")
+        if not breaker.allow():
+            raise LLMUnavailableError("circuit open: the LLM server is failing, not sending the request")
+        try:
+            result = await _aattempt(call, deadline, hedge_after_s)
+        except LLMTimeoutError:
+            record_timeout(breaker, deadline)
+            raise LLMTimeoutError(f"no response within the {deadline_s:.0f}s deadline")
+        except Exception as e:
+            if not is_host_failure(e):
+                if not is_response_error(e):
+                    breaker.release()
+                    raise # A bug, not an LLM failure
+                breaker.record_success()
+                raise LLMError(str(e)) from e
+            breaker.record_failure()
+            delay = policy.backoff(attempt)
+            if attempt + 1 == attempts or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise LLMError(f"failed after {attempt + 1} attempt(s): {e}") from e
+            print(f"   🔁 LLM call failed ({e}); retrying in {delay:.1f}s ({attempt + 2}/{attempts})")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+class ResponseCache:
+    """
+    On-disk, content-addressed cache for LLM responses.
+
+    Each entry is a small JSON file named after the SHA-256 of the request
+    (model, prompt and generation options). The cache is bounded in size with
+    least-recently-used eviction (a hit refreshes the file's mtime) and entries
+    older than `ttl_seconds` are treated as misses and removed.
+    """
+
+    def __init__(self, cache_dir: str = "workspace/.cache/llm", max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600, enabled: bool = True):
+        self.cache_dir = Path(cache_dir).resolve()
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, list]] = None # key -> [size, last_access]
+        self._total_bytes = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[Dict] = None, system: Optional[str] = None,
+                 schema: Optional[Dict] = None) -> str:
+        """Builds a stable hash for a request. Options are serialized with sorted keys."""
+        request = {"model": model, "prompt": prompt, "options": options or {}}
+        if system:
+            request["system"] = system
+        if schema:
+            request["format"] = schema
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        """Scans the cache directory once to learn entry sizes and access times."""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not self.cache_dir.exists():
+            return
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            self._index[path.stem] = [stat.st_size, stat.st_mtime]
+            self._total_bytes += stat.st_size
+
+    def _remove(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry:
+            self._total_bytes -= entry[0]
+        try:
+            self._entry_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key`, or None on a miss or expired entry."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._entry_path(key)
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if self.ttl_seconds is not None and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            now = time.time()
+            try:
+                os.utime(path, (now, now)) # Refresh LRU position
+            except OSError:
+                pass
+            self._index[key][1] = now
+            self.hits += 1
+            return entry.get("response")
+
+    def put(self, key: str, response: str):
+        """Stores a response atomically and evicts least-recently-used entries if over budget."""
+        if not self.enabled:
+            return
+        data = json.dumps({"created_at": time.time(), "response": response}, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._load_index()
+            path = self._entry_path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+                    tmp_file.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"   ⚠️ Could not write LLM cache entry: {e}")
+                return
+            if key in self._index:
+                self._total_bytes -= self._index[key][0]
+            self._index[key] = [size, time.time()]
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes every cached entry."""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        """Returns hit/miss counters and current cache size."""
+        with self._lock:
+            self._load_index()
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
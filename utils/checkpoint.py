@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.hashing import sha256_file
+
+class CheckpointStore:
+    """
+    Per-session record of stage executions, kept in `<session>/checkpoints.json`.
+
+    For every stage it stores the status, the SHA-256 of each input artifact when the
+    stage started, its output paths and timing. A completed stage is up to date when its
+    inputs still hash the same and all of its outputs are present. `flush` (if given) is
+    called before the artifacts are read from disk, so buffered writes are hashed too.
+    `manifest_entry` (if given) returns the session manifest entry of a path; it tells
+    whether a stage wrote its outputs or they were left by an earlier run.
+    """
+
+    FILE_NAME = "checkpoints.json"
+
+    def __init__(self, session_path: str, flush: Optional[Callable[[], None]] = None,
+                 manifest_entry: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.session_path = Path(session_path)
+        self.flush = flush
+        self.manifest_entry = manifest_entry
+        self.path = self.session_path / self.FILE_NAME
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict] = {}
+        if self.path.exists():
+            try:
+                self.stages = json.loads(self.path.read_text(encoding="utf-8")).get("stages", {})
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Ignoring unreadable checkpoint file {self.path}: {e}")
+
+    def fingerprint(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Hashes each session-relative path (None for missing files)."""
+        if self.flush is not None:
+            self.flush()
+        hashes = {}
+        for relative_path in paths:
+            file_path = self.session_path / relative_path
+            hashes[relative_path] = sha256_file(str(file_path)) if file_path.is_file() else None
+        return hashes
+
+    def outputs_present(self, outputs: Iterable[str]) -> bool:
+        if self.flush is not None:
+            self.flush()
+        return all((self.session_path / relative_path).is_file() for relative_path in outputs)
+
+    def output_stamps(self, outputs: Iterable[str]) -> Dict[str, Any]:
+        """
+        What identifies the current version of each output (None for missing files): its
+        manifest entry, which changes with every write, or else its modification time and size.
+        """
+        if self.flush is not None:
+            self.flush()
+        stamps = {}
+        for relative_path in outputs:
+            file_path = self.session_path / relative_path
+            if not file_path.is_file():
+                stamps[relative_path] = None
+            elif self.manifest_entry is not None:
+                stamps[relative_path] = self.manifest_entry(relative_path)
+            else:
+                stat = file_path.stat()
+                stamps[relative_path] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def outputs_written(self, outputs: Iterable[str], before: Dict[str, Any]) -> bool:
+        """True if every output exists and was written after `before` (from `output_stamps`) was taken."""
+        after = self.output_stamps(outputs)
+        return all(stamp is not None and stamp != before.get(path) for path, stamp in after.items())
+
+    def is_up_to_date(self, name: str, inputs: Iterable[str], outputs: Iterable[str]) -> bool:
+        """True if the stage completed before, its inputs are unchanged and its outputs exist."""
+        entry = self.stages.get(name)
+        if not entry or entry.get("status") != "completed":
+            return False
+        if entry.get("inputs") != self.fingerprint(inputs):
+            return False
+        return self.outputs_present(outputs)
+
+    def refresh_inputs(self, name: str, inputs: Dict[str, Optional[str]]):
+        """Replaces the input hashes of a completed stage whose outputs were rebuilt from `inputs` later on."""
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry and entry.get("status") == "completed":
+                entry["inputs"] = inputs
+                self._save()
+
+    def unfinished(self) -> List[str]:
+        """Stages whose last execution failed or did not write all of its outputs."""
+        return [name for name, entry in self.stages.items() if entry.get("status") in ("failed", "incomplete")]
+
+    def record(self, name: str, status: str, inputs: Dict[str, Optional[str]], outputs: Iterable[str],
+               duration: float, error: Optional[str] = None):
+        """Stores the outcome of a stage and rewrites the checkpoint file atomically."""
+        with self._lock:
+            self.stages[name] = {
+                "status": status,
+                "inputs": inputs,
+                "outputs": list(outputs),
+                "duration_s": round(duration, 3),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "error": error,
+            }
+            self._save()
+
+    def _save(self):
+        self.session_path.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.session_path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            json.dump({"stages": self.stages}, tmp_file, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,53 @@
+import os
+from typing import List, Optional
+
+def env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    """Reads an integer setting from the environment, falling back to `default` if unset or invalid."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"⚠️ Ignoring invalid value for {name}: '{value}'")
+        return default
+
+def env_float(name: str, default: Optional[float] = None) -> Optional[float]:
+    """Reads a number (e.g. seconds) from the environment, falling back to `default` if unset or invalid."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️ Ignoring invalid value for {name}: '{value}'")
+        return default
+
+def keep_alive_setting(default: str = "30m"):
+    """
+    How long Ollama keeps the model loaded after a request (PAPER2PROD_KEEP_ALIVE).
+    Accepts durations such as "30m" or "1h", or seconds ("-1" keeps it loaded indefinitely).
+    """
+    value = os.environ.get("PAPER2PROD_KEEP_ALIVE", "").strip() or default
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def caches_disabled() -> bool:
+    """True when PAPER2PROD_NO_CACHE is set, which bypasses every on-disk cache."""
+    return os.environ.get("PAPER2PROD_NO_CACHE", "").strip().lower() in ("1", "true", "yes")
+
+def workspace_cache_dir(base_dir: str, name: str) -> str:
+    """Directory of the `name` cache (llm, extractions, verdicts) shared by the sessions under `base_dir`."""
+    return os.path.join(base_dir, ".cache", name)
+
+def ollama_hosts(host=None, default: str = "http://localhost:11434") -> List[str]:
+    """
+    Ollama endpoints to use: `host` (a URL, a comma-separated list of URLs or a list),
+    else PAPER2PROD_OLLAMA_HOSTS (comma-separated), else `default`.
+    """
+    if host is None:
+        host = os.environ.get("PAPER2PROD_OLLAMA_HOSTS", "").strip() or default
+    urls = host.split(",") if isinstance(host, str) else list(host)
+    return [url.strip() for url in urls if url.strip()]
@@ -0,0 +1,13 @@
+from typing import Optional
+
+def feedback_section(feedback: Optional[str]) -> str:
+    """
+    Renders the evaluator's feedback on a previous version of a document as a prompt section,
+    placed right before the response instructions. Empty when there is no feedback.
+    """
+    if not feedback:
+        return ""
+    return f"""A previous version of this document was reviewed and did not pass. Address this feedback:
+{feedback.strip()}
+
+"""
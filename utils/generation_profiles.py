@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+DEFAULT_PROFILES_PATH = Path(__file__).resolve().parent.parent / "config" / "generation_profiles.json"
+
+# Settings of calls made without a profile, and defaults for the keys a profile leaves out
+BUILTIN_DEFAULT = {"num_predict": 2048, "num_ctx": "auto", "min_ctx": 4096, "max_ctx": 32768, "stop": []}
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+TEMPLATE_TOKENS = 64 # Chat template and role markers around the system prompt and the prompt
+ESTIMATE_MARGIN = 1.1
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Rough token count of `text` without the model's tokenizer: each word counts one
+    token per 4 characters (at least one) and each punctuation mark one token. It errs
+    on the high side for English prose, which is the safe side when sizing num_ctx.
+    """
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _PIECES.findall(text))
+
+class GenerationProfile:
+    """
+    Generation settings of one agent: temperature, output budget (`num_predict`), stop
+    sequences and context window. With `num_ctx` "auto" the window is sized to each
+    prompt (see `context_window`); a number fixes it and null leaves the server default.
+    """
+
+    def __init__(self, name: str, temperature: Optional[float] = None, num_predict: int = 2048,
+                 num_ctx: Union[str, int, None] = "auto", min_ctx: int = 4096, max_ctx: int = 32768,
+                 stop: Optional[List[str]] = None):
+        self.name = name
+        self.temperature = temperature # None: the calling method's default
+        self.num_predict = num_predict
+        self.num_ctx = num_ctx
+        self.min_ctx = min_ctx
+        self.max_ctx = max(min_ctx, max_ctx)
+        self.stop = list(stop or [])
+
+    def context_window(self, prompt: str, system: Optional[str], num_predict: int) -> Optional[int]:
+        """
+        The num_ctx for a call: room for the estimated prompt plus `num_predict` tokens.
+        Sizes are `min_ctx` doubled as many times as needed, up to `max_ctx`, because
+        Ollama reloads the model whenever num_ctx changes: a few distinct sizes keep most
+        calls on the already loaded runner (and its prompt cache).
+        """
+        if self.num_ctx is None:
+            return None
+        if self.num_ctx != "auto":
+            return int(self.num_ctx)
+        prompt_tokens = math.ceil((estimate_tokens(system) + estimate_tokens(prompt)) * ESTIMATE_MARGIN)
+        needed = prompt_tokens + TEMPLATE_TOKENS + num_predict
+        num_ctx = self.min_ctx
+        while num_ctx < needed and num_ctx < self.max_ctx:
+            num_ctx *= 2
+        if needed > self.max_ctx:
+            print(f"   ⚠️ Prompt of ~{prompt_tokens} tokens does not fit the {self.name} profile's "
+                  f"max_ctx ({self.max_ctx}); Ollama will truncate it")
+        return min(num_ctx, self.max_ctx)
+
+    def options(self, prompt: str, system: Optional[str], temperature: Optional[float],
+                max_tokens: Optional[int], default_temperature: float) -> Dict:
+        """Ollama options for a call; explicit `temperature`/`max_tokens` override the profile."""
+        num_predict = max_tokens if max_tokens is not None else self.num_predict
+        options = {
+            "temperature": temperature if temperature is not None else
+            self.temperature if self.temperature is not None else default_temperature,
+            "num_predict": num_predict # Renamed from max_tokens for ollama library
+        }
+        num_ctx = self.context_window(prompt, system, num_predict)
+        if num_ctx is not None:
+            options["num_ctx"] = num_ctx
+        if self.stop:
+            options["stop"] = self.stop
+        return options
+
+class GenerationProfiles:
+    """
+    Per-agent generation profiles, read from `config/generation_profiles.json` (or the
+    file in PAPER2PROD_PROFILES). The "default" entry applies to calls without a profile
+    and fills in the keys the other entries leave out.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, Dict]] = None):
+        profiles = profiles or {}
+        self.defaults = BUILTIN_DEFAULT | profiles.get("default", {})
+        self.profiles = {name: GenerationProfile(name, **(self.defaults | settings))
+                         for name, settings in profiles.items() if name != "default"}
+        self.default = GenerationProfile("default", **self.defaults)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "GenerationProfiles":
+        """Reads the profiles file; a missing or invalid file leaves the built-in defaults."""
+        path = Path(path or os.environ.get("PAPER2PROD_PROFILES", "").strip() or DEFAULT_PROFILES_PATH)
+        try:
+            return cls(json.loads(path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            print(f"⚠️ Generation profiles not found at {path}; using the defaults")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"⚠️ Ignoring invalid generation profiles in {path}: {e}")
+        return cls()
+
+    def get(self, name: Optional[str]) -> GenerationProfile:
+        """The profile called `name`, or the default one."""
+        return self.profiles.get(name, self.default) if name else self.default
+
+    def preload_options(self) -> Dict:
+        """Options for the warm-up request, so the model is loaded with the usual context window."""
+        num_ctx = self.default.num_ctx
+        if num_ctx is None:
+            return {}
+        return {"num_ctx": self.default.min_ctx if num_ctx == "auto" else int(num_ctx)}
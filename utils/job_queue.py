@@ -0,0 +1,162 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+class JobQueue:
+    """
+    Persistent FIFO of pipeline jobs in SQLite (`workspace/jobs.sqlite` by default).
+
+    Jobs move from "queued" to "running" when a worker claims them and end as "ok",
+    "failed" or "invalid". Claiming is a single transaction, so several workers (or
+    processes) never take the same job. A claimed job records its owner (host, PID and a
+    random token of the JobQueue instance), which must call `heartbeat` while the job runs.
+    `requeue_interrupted` queues again the running jobs whose owner is gone: its process
+    no longer exists on this host, or its last heartbeat is older than `stale_after_s`.
+    """
+
+    STATUSES = ("queued", "running", "ok", "partial", "failed", "invalid")
+    HEARTBEAT_INTERVAL_S = 10.0
+    STALE_AFTER_S = 60.0
+
+    def __init__(self, path: str = "workspace/jobs.sqlite"):
+        self.path = Path(path).resolve()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        with closing(self._connect()) as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                paper TEXT NOT NULL,
+                options TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL,
+                session TEXT,
+                error TEXT,
+                submitted_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                duration_s REAL,
+                owner TEXT,
+                heartbeat_at REAL)""")
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")): # Queues created before owners
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, submitted_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="milliseconds")
+
+    @staticmethod
+    def _as_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        return job
+
+    def submit(self, prompt: str, paper: str, options: Optional[Dict] = None) -> str:
+        """Queues a job and returns its id."""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock, closing(self._connect()) as connection:
+            connection.execute("INSERT INTO jobs (id, prompt, paper, options, status, submitted_at) "
+                               "VALUES (?, ?, ?, ?, 'queued', ?)",
+                               (job_id, prompt, paper, json.dumps(options or {}), self._now()))
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Marks the oldest queued job as running and returns it, or None if the queue is empty."""
+        with self._lock:
+            connection = self._connect()
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                row = connection.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                                         "ORDER BY submitted_at LIMIT 1").fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                started_at = self._now()
+                connection.execute("UPDATE jobs SET status = 'running', started_at = ?, owner = ?, heartbeat_at = ? "
+                                   "WHERE id = ?", (started_at, self.owner, time.time(), row["id"]))
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            finally:
+                connection.close()
+        return {**self._as_dict(row), "status": "running", "started_at": started_at, "owner": self.owner}
+
+    def finish(self, job_id: str, status: str, session: Optional[str], error: Optional[str], duration_s: float) -> bool:
+        """
+        Records the outcome of a job claimed by this queue. Returns False if the job was
+        given to another owner in the meantime (it was presumed interrupted).
+        """
+        with self._lock, closing(self._connect()) as connection:
+            return connection.execute("UPDATE jobs SET status = ?, session = ?, error = ?, finished_at = ?, "
+                                      "duration_s = ? WHERE id = ? AND owner = ?",
+                                      (status, session, error, self._now(), duration_s, job_id, self.owner)).rowcount > 0
+
+    def heartbeat(self) -> int:
+        """Marks the jobs this queue is running as alive. Returns how many."""
+        with self._lock, closing(self._connect()) as connection:
+            return connection.execute("UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+                                      (time.time(), self.owner)).rowcount
+
+    @staticmethod
+    def _owner_gone(owner: Optional[str]) -> bool:
+        """True if `owner` ran on this host and its process no longer exists."""
+        try:
+            host, pid, _ = (owner or "").split(":")
+            if host != socket.gethostname():
+                return False
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (ValueError, OSError):
+            return False # Unknown format, or a process we may not signal (alive)
+        return False
+
+    def requeue_interrupted(self, stale_after_s: Optional[float] = None) -> int:
+        """
+        Queues again the running jobs whose owner is gone (dead process on this host, no
+        owner recorded, or no heartbeat for `stale_after_s`). Returns how many.
+        """
+        stale_before = time.time() - (self.STALE_AFTER_S if stale_after_s is None else stale_after_s)
+        with self._lock, closing(self._connect()) as connection:
+            rows = connection.execute("SELECT id, owner, heartbeat_at FROM jobs WHERE status = 'running' "
+                                      "AND (owner IS NULL OR owner != ?)", (self.owner,)).fetchall()
+            orphans = [row for row in rows if row["owner"] is None or row["heartbeat_at"] is None
+                       or row["heartbeat_at"] < stale_before or self._owner_gone(row["owner"])]
+            # Only if still held by the same owner: another process may have requeued and claimed it since
+            return sum(connection.execute("UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, "
+                                          "heartbeat_at = NULL WHERE id = ? AND status = 'running' AND owner IS ?",
+                                          (row["id"], row["owner"])).rowcount for row in orphans)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock, closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Most recent jobs first, optionally only those with `status`."""
+        query = "SELECT * FROM jobs" + (" WHERE status = ?" if status else "") + " ORDER BY submitted_at DESC LIMIT ?"
+        with self._lock, closing(self._connect()) as connection:
+            rows = connection.execute(query, ([status] if status else []) + [limit]).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock, closing(self._connect()) as connection:
+            rows = connection.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in self.STATUSES} | {row["status"]: row["jobs"] for row in rows}
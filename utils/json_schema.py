@@ -0,0 +1,64 @@
+import json
+from typing import Any, Dict, List, Optional
+
+TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+def validate(data: Any, schema: Dict, path: str = "$") -> List[str]:
+    """
+    Checks `data` against the subset of JSON Schema the agents use (type, properties,
+    required, items, enum, minimum, maximum). Returns the list of problems found.
+    """
+    errors = []
+    expected = schema.get("type")
+    if expected:
+        names = expected if isinstance(expected, list) else [expected]
+        # bool is an int subclass, but never a valid integer/number here
+        matches = any(isinstance(data, TYPES[name]) and not (isinstance(data, bool) and name in ("integer", "number"))
+                      for name in names if name in TYPES)
+        if not matches:
+            return [f"{path}: expected {' or '.join(names)}, got {type(data).__name__}"]
+
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: {data!r} is not one of {schema['enum']}")
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        if "minimum" in schema and data < schema["minimum"]:
+            errors.append(f"{path}: {data} is below the minimum {schema['minimum']}")
+        if "maximum" in schema and data > schema["maximum"]:
+            errors.append(f"{path}: {data} is above the maximum {schema['maximum']}")
+    if isinstance(data, dict):
+        for name in schema.get("required", []):
+            if name not in data:
+                errors.append(f"{path}: missing required field '{name}'")
+        for name, subschema in schema.get("properties", {}).items():
+            if name in data:
+                errors.extend(validate(data[name], subschema, f"{path}.{name}"))
+    if isinstance(data, list) and "items" in schema:
+        for index, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+def json_errors(text: Optional[str], schema: Dict) -> List[str]:
+    """Returns why `text` is not a JSON document matching `schema` (empty if it is)."""
+    if not text:
+        return ["empty response"]
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return [f"invalid JSON: {e}"]
+    return validate(data, schema)
+
+def parse_json_response(text: Optional[str], schema: Dict) -> Optional[Dict]:
+    """Parses a schema-constrained LLM response. Returns None (and reports why) if it is not valid."""
+    errors = json_errors(text, schema)
+    if errors:
+        print(f"      ⚠️ LLM response does not match the expected JSON schema: {'; '.join(errors[:3])}")
+        return None
+    return json.loads(text)
@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Name of the pipeline stage the current code runs for, set by the StageScheduler
+current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+# Recorder of the session the current code runs for, set by the orchestrator
+current_recorder: ContextVar[Optional["MetricsRecorder"]] = ContextVar("current_recorder", default=None)
+
+NANOSECONDS = 1e9
+
+class MetricsRecorder:
+    """
+    Collects one entry per LLM call of a session, built from the timing fields Ollama
+    returns (`prompt_eval_count`, `eval_count`, `load_duration`, `prompt_eval_duration`,
+    `eval_duration`), tagged with the stage that made the call.
+    """
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, model: str, kind: str, latency: float, response: Any = None,
+               ttft: Optional[float] = None, cached: bool = False, host: Optional[str] = None):
+        """Adds a call. `response` is the (final) Ollama response, None for cache hits and errors."""
+        def field(name):
+            value = response.get(name) if response is not None else None
+            return value or 0
+
+        eval_s = field("eval_duration") / NANOSECONDS
+        entry = {
+            "stage": current_stage.get() or "unknown",
+            "model": model,
+            "kind": kind,
+            "cached": cached,
+            "host": host,
+            "started_at": datetime.fromtimestamp(time.time() - latency).isoformat(timespec="seconds"),
+            "latency_s": round(latency, 3),
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "prompt_tokens": field("prompt_eval_count"),
+            "completion_tokens": field("eval_count"),
+            "load_s": round(field("load_duration") / NANOSECONDS, 3),
+            "prompt_eval_s": round(field("prompt_eval_duration") / NANOSECONDS, 3),
+            "eval_s": round(eval_s, 3),
+            "tokens_per_s": round(field("eval_count") / eval_s, 1) if eval_s else None,
+        }
+        with self._lock:
+            self.calls.append(entry)
+
+    def by_stage(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregates calls per stage, in the order stages first appeared."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            calls = list(self.calls)
+        for call in calls:
+            totals = stages.setdefault(call["stage"], {
+                "calls": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "load_s": 0.0, "prompt_eval_s": 0.0, "eval_s": 0.0, "latency_s": 0.0,
+            })
+            totals["calls"] += 1
+            totals["cached"] += int(call["cached"])
+            for key in ("prompt_tokens", "completion_tokens"):
+                totals[key] += call[key]
+            for key in ("load_s", "prompt_eval_s", "eval_s", "latency_s"):
+                totals[key] = round(totals[key] + call[key], 3)
+        for totals in stages.values():
+            totals["tokens_per_s"] = round(totals["completion_tokens"] / totals["eval_s"], 1) if totals["eval_s"] else None
+        return stages
+
+    def save(self, path: str):
+        """Writes every call and the per-stage aggregates as JSON."""
+        with self._lock:
+            calls = list(self.calls)
+        Path(path).write_text(json.dumps({"stages": self.by_stage(), "calls": calls}, indent=2), encoding="utf-8")
+
+    def format_summary(self) -> str:
+        """Renders the per-stage aggregates as a plain-text table."""
+        headers = ["Stage", "Calls", "Cached", "Prompt tok", "Output tok", "Tok/s", "Load (s)", "LLM time (s)"]
+        rows = [[stage, t["calls"], t["cached"], t["prompt_tokens"], t["completion_tokens"],
+                 t["tokens_per_s"] if t["tokens_per_s"] is not None else "-", f"{t['load_s']:.2f}", f"{t['latency_s']:.1f}"]
+                for stage, t in self.by_stage().items()]
+        widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+        line = lambda cells: "  ".join(str(cell).ljust(width) for cell, width in zip(cells, widths))
+        return "\n".join([line(headers), line("-" * w for w in widths)] + [line(row) for row in rows])
+
+def record_llm_call(model: str, kind: str, latency: float, response: Any = None,
+                    ttft: Optional[float] = None, cached: bool = False, host: Optional[str] = None):
+    """Records a call in the current session's recorder, if any."""
+    recorder = current_recorder.get()
+    if recorder is not None:
+        recorder.record(model, kind, latency, response=response, ttft=ttft, cached=cached, host=host)
@@ -0,0 +1,25 @@
+from typing import Dict
+
+def _as_text(value, default: str) -> str:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value) or default
+    return str(value) if value else default
+
+def build_paper_context(structured_data: Dict) -> str:
+    """
+    Renders the paper facts shared by the downstream agents as one system prompt.
+
+    The text depends only on the structured data, so every agent of a session sends
+    exactly the same prefix and Ollama's prompt cache can reuse the evaluated tokens;
+    each agent's own prompt then only carries its task.
+    """
+    return f"""You are part of a team that turns a research paper into a software product.
+Every request you receive refers to the following paper.
+
+Extracted Paper Information:
+- **Title:** {_as_text(structured_data.get('title'), 'Untitled Project')}
+- **Problem:** {_as_text(structured_data.get('problem'), 'Not specified')}
+- **Approach:** {_as_text(structured_data.get('approach'), 'Not specified')}
+- **Metrics:** {_as_text(structured_data.get('metrics'), 'Not specified')}
+- **Datasets:** {_as_text(structured_data.get('datasets'), 'Not specified')}
+"""
@@ -0,0 +1,126 @@
+import argparse
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from tools.blob_store import BlobStore
+from utils.workspace_index import WorkspaceIndex
+
+SESSION_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+ARCHIVE_DIR = WorkspaceIndex.ARCHIVE_DIR
+
+def _directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+def list_sessions(base_dir: str = "workspace") -> List[Path]:
+    """Session directories of the workspace, newest first (session ids start with their timestamp)."""
+    base_path = Path(base_dir).resolve()
+    if not base_path.is_dir():
+        return []
+    sessions = [path for path in base_path.iterdir() if path.is_dir() and SESSION_ID.match(path.name)]
+    return sorted(sessions, key=lambda path: path.name, reverse=True)
+
+def select_sessions(sessions: List[Path], keep_last: Optional[int] = None,
+                    older_than_days: Optional[float] = None) -> List[Path]:
+    """
+    Sessions to compact: everything but the `keep_last` newest, restricted to sessions not
+    modified for `older_than_days` days when that is given too. Without either limit
+    nothing is selected.
+    """
+    if keep_last is None and older_than_days is None:
+        return []
+    candidates = sessions[keep_last:] if keep_last is not None else sessions
+    if older_than_days is None:
+        return candidates
+    cutoff = time.time() - older_than_days * 24 * 3600
+    return [path for path in candidates if path.stat().st_mtime < cutoff]
+
+def compact_session(session_path: Path, archive_dir: Path) -> Path:
+    """Packs a session into `<archive_dir>/<session-id>.tar.gz` and removes the directory."""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    archive_path = archive_dir / f"{session_path.name}.tar.gz"
+    fd, tmp_path = tempfile.mkstemp(dir=archive_dir, prefix=f".{session_path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with tarfile.open(tmp_path, "w:gz") as archive:
+            archive.add(session_path, arcname=session_path.name)
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    shutil.rmtree(session_path)
+    return archive_path
+
+def restore_session(session_id: str, base_dir: str = "workspace") -> Optional[Path]:
+    """Unpacks an archived session back into the workspace (e.g. to resume it). Returns its path."""
+    base_path = Path(base_dir).resolve()
+    archive_path = base_path / ARCHIVE_DIR / f"{session_id}.tar.gz"
+    if not archive_path.is_file():
+        return None
+    with tarfile.open(archive_path, "r:gz") as archive:
+        archive.extractall(base_path, filter="data")
+    archive_path.unlink()
+    WorkspaceIndex(str(base_path)).index_session(str(base_path / session_id))
+    return base_path / session_id
+
+def apply_retention(base_dir: str = "workspace", keep_last: Optional[int] = None,
+                    older_than_days: Optional[float] = None, dry_run: bool = False) -> Dict:
+    """
+    Compacts the sessions selected by the retention policy into compressed archives in
+    `<workspace>/.archive/`, flags them as archived in the workspace index, and removes
+    the input blobs no remaining session links to. Returns a summary of the run.
+    """
+    base_path = Path(base_dir).resolve()
+    selected = select_sessions(list_sessions(base_dir), keep_last, older_than_days)
+    index = WorkspaceIndex(str(base_path))
+    summary = {"compacted": [], "bytes_before": 0, "bytes_after": 0, "blobs_removed": 0, "blob_bytes_freed": 0}
+    for session_path in selected:
+        size = _directory_size(session_path)
+        if dry_run:
+            print(f"   📦 Would compact {session_path.name} ({size / 1024:.0f} KiB)")
+            summary["compacted"].append(session_path.name)
+            summary["bytes_before"] += size
+            continue
+        try:
+            archive_path = compact_session(session_path, base_path / ARCHIVE_DIR)
+        except (OSError, tarfile.TarError) as e:
+            print(f"   ❌ Could not compact {session_path.name}: {e}")
+            continue
+        archived_size = archive_path.stat().st_size
+        print(f"   📦 Compacted {session_path.name}: {size / 1024:.0f} KiB -> {archived_size / 1024:.0f} KiB")
+        index.set_archived(session_path.name)
+        summary["compacted"].append(session_path.name)
+        summary["bytes_before"] += size
+        summary["bytes_after"] += archived_size
+
+    removed, freed = BlobStore(str(base_path / ".blobs")).prune(dry_run=dry_run)
+    summary["blobs_removed"], summary["blob_bytes_freed"] = removed, freed
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old sessions of a workspace into compressed archives")
+    parser.add_argument("--workspace", default="workspace", help="Workspace directory (default: workspace)")
+    parser.add_argument("--keep-last", type=int, help="Number of newest sessions to keep as they are")
+    parser.add_argument("--older-than-days", type=float, help="Only compact sessions not modified for this many days")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be compacted")
+    parser.add_argument("--restore", metavar="SESSION_ID", help="Unpack an archived session instead")
+    args = parser.parse_args()
+
+    if args.restore:
+        restored = restore_session(args.restore, args.workspace)
+        print(f"✅ Restored session to {restored}" if restored else f"❌ No archive found for session {args.restore}")
+        return
+    if args.keep_last is None and args.older_than_days is None:
+        parser.error("give --keep-last and/or --older-than-days")
+
+    summary = apply_retention(args.workspace, args.keep_last, args.older_than_days, args.dry_run)
+    print(f"🧹 {'Would compact' if args.dry_run else 'Compacted'} {len(summary['compacted'])} session(s): "
+          f"{summary['bytes_before'] / 1024:.0f} KiB -> {summary['bytes_after'] / 1024:.0f} KiB; "
+          f"{summary['blobs_removed']} unused input blob(s), {summary['blob_bytes_freed'] / 1024:.0f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils.checkpoint import CheckpointStore
+from utils.metrics import current_stage
+
+class StageError(Exception):
+    """Raised when a critical stage fails and the pipeline cannot continue."""
+
+class Stage:
+    """
+    A unit of work in the pipeline.
+
+    `run` receives the dict of results produced by the stages that already finished
+    (keyed by stage name). Dependencies are derived from artifact paths: a stage
+    depends on every stage whose `outputs` include one of its `inputs` or
+    `optional_inputs`, plus the stages named in `after` (ordering only, no artifact).
+    When a stage is skipped on resume, `restore` (if given) rebuilds its result from the
+    outputs it left in the session. `enabled` (if given) is called with the results once
+    the stage is ready; returning False skips the stage and every stage that needs one
+    of its outputs as a required input. `rewrites` lists outputs of earlier stages that the
+    stage may rewrite (the evaluator regenerating a document); their checkpoints are updated
+    so a resume does not mistake those rewrites for changed inputs.
+    """
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Any], inputs: Iterable[str] = (),
+                 outputs: Iterable[str] = (), optional_inputs: Iterable[str] = (),
+                 critical: bool = False, label: Optional[str] = None,
+                 restore: Optional[Callable[[], Any]] = None,
+                 enabled: Optional[Callable[[Dict[str, Any]], bool]] = None, after: Iterable[str] = (),
+                 rewrites: Iterable[str] = ()):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.optional_inputs = tuple(optional_inputs)
+        self.critical = critical
+        self.label = label or name
+        self.restore = restore
+        self.enabled = enabled
+        self.after = tuple(after)
+        self.rewrites = tuple(rewrites)
+
+    @property
+    def all_inputs(self) -> tuple:
+        return self.inputs + self.optional_inputs
+
+class StageScheduler:
+    """
+    Runs stages as a dependency graph: every stage whose dependencies have finished
+    is submitted to a thread pool, so independent stages execute concurrently.
+    With a CheckpointStore every stage outcome is recorded, and with `resume=True`
+    stages whose checkpoint is still up to date are skipped. Stages disabled through
+    `Stage.enabled` are marked "skipped" together with the stages that depend on them.
+    """
+
+    def __init__(self, stages: List[Stage], max_workers: int = 3, logger: Optional[logging.Logger] = None,
+                 checkpoints: Optional[CheckpointStore] = None, resume: bool = False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.max_workers = max(1, max_workers)
+        self.logger = logger or logging.getLogger("MultiAgentLogger")
+        self.dependencies = self._build_dependencies()
+        self.results: Dict[str, Any] = {}
+        self.status: Dict[str, str] = {name: "pending" for name in self.order}
+        self.durations: Dict[str, float] = {}
+        self.checkpoints = checkpoints
+        self.resume = resume and checkpoints is not None
+        self.reused: List[str] = []
+        self.skipped: List[str] = []
+
+    def _build_dependencies(self) -> Dict[str, set]:
+        producers = {}
+        for name in self.order:
+            for output in self.stages[name].outputs:
+                producers[output] = name
+        dependencies = {}
+        for name in self.order:
+            stage = self.stages[name]
+            deps = {producers[path] for path in stage.all_inputs if path in producers}
+            deps.update(dep for dep in stage.after if dep in self.stages)
+            deps.discard(name)
+            dependencies[name] = deps
+        return dependencies
+
+    def _is_ready(self, name: str) -> bool:
+        return all(self.status[dep] in ("completed", "failed", "skipped") for dep in self.dependencies[name])
+
+    def _skip_reason(self, stage: Stage) -> Optional[str]:
+        """Returns why a ready stage must not run (a required input's producer was skipped, or the plan disables it)."""
+        skipped_producers = sorted({self.stages[dep].label for dep in self.dependencies[stage.name]
+                                    if self.status[dep] == "skipped"
+                                    and set(self.stages[dep].outputs) & set(stage.inputs)})
+        if skipped_producers:
+            return f"{', '.join(skipped_producers)} did not run"
+        if stage.enabled is not None and not stage.enabled(dict(self.results)):
+            return "disabled for this run"
+        return None
+
+    def _run_stage(self, stage: Stage) -> Any:
+        self.logger.info(f"\n--- Stage: {stage.label} ---")
+        current_stage.set(stage.name)
+        if self.checkpoints is None:
+            return stage.run(dict(self.results))
+
+        fingerprint = self.checkpoints.fingerprint(stage.all_inputs)
+        previous_outputs = self.checkpoints.output_stamps(stage.outputs)
+        previous_rewrites = self.checkpoints.output_stamps(stage.rewrites)
+        started = time.perf_counter()
+        try:
+            result = stage.run(dict(self.results))
+        except Exception as e:
+            self.checkpoints.record(stage.name, "failed", fingerprint, stage.outputs, time.perf_counter() - started, str(e))
+            raise
+        if stage.rewrites:
+            self._record_rewrites(stage, previous_rewrites)
+            # The stage's own rewrites are part of its result, not a change of its inputs
+            fingerprint = self.checkpoints.fingerprint(stage.all_inputs)
+        status = "completed"
+        if not self.checkpoints.outputs_written(stage.outputs, previous_outputs):
+            # The agents report most errors by printing and returning, so outputs this run did not
+            # write mean failure (files left by an earlier run may come from other inputs)
+            self.logger.warning(f"⚠️ {stage.label} finished without writing all of: {', '.join(stage.outputs)}")
+            status = "incomplete"
+        self.checkpoints.record(stage.name, status, fingerprint, stage.outputs, time.perf_counter() - started)
+        return result
+
+    def _record_rewrites(self, stage: Stage, before: Dict[str, Any]):
+        """
+        Updates the input hashes of the stages whose outputs `stage` rewrote (from `before`, its
+        output stamps when it started): they were rebuilt from the current inputs. A stage whose
+        inputs were rewritten but not its outputs (left stale) keeps its checkpoint and reruns.
+        """
+        after = self.checkpoints.output_stamps(stage.rewrites)
+        rewritten = {path for path, stamp in after.items() if stamp is not None and stamp != before.get(path)}
+        for name in self.order:
+            other = self.stages[name]
+            if name != stage.name and rewritten & set(other.outputs):
+                self.checkpoints.refresh_inputs(name, self.checkpoints.fingerprint(other.all_inputs))
+
+    def _try_reuse(self, stage: Stage) -> bool:
+        """On resume, marks the stage completed from its checkpoint if it is still up to date."""
+        if not self.resume or not self.checkpoints.is_up_to_date(stage.name, stage.all_inputs, stage.outputs):
+            return False
+        self.results[stage.name] = stage.restore() if stage.restore else None
+        self.status[stage.name] = "completed"
+        self.durations[stage.name] = 0.0
+        self.reused.append(stage.name)
+        self.logger.info(f"⏭️ {stage.label}: checkpoint up to date, skipping.")
+        return True
+
+    def run(self) -> Dict[str, Any]:
+        """Executes all stages and returns their results. Raises StageError if a critical stage fails."""
+        pending = list(self.order)
+        running = {}
+        critical_error = None
+        started_at = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as pool:
+            while pending or running:
+                if critical_error is None:
+                    # Reusing a checkpoint or skipping a stage can make further stages ready,
+                    # so repeat until nothing changes
+                    ready = [n for n in pending if self._is_ready(n)]
+                    while ready:
+                        name = ready.pop(0)
+                        pending.remove(name)
+                        skip_reason = self._skip_reason(self.stages[name])
+                        if skip_reason:
+                            self.status[name] = "skipped"
+                            self.skipped.append(name)
+                            self.logger.info(f"⏭️ {self.stages[name].label}: {skip_reason}, skipping.")
+                            ready = [n for n in pending if self._is_ready(n)]
+                            continue
+                        if self._try_reuse(self.stages[name]):
+                            ready = [n for n in pending if self._is_ready(n)]
+                            continue
+                        self.status[name] = "running"
+                        started_at[name] = time.perf_counter()
+                        # Each stage runs in a copy of the caller's context, so context variables
+                        # (such as the session's metrics recorder) follow it into the worker thread
+                        context = contextvars.copy_context()
+                        running[pool.submit(context.run, self._run_stage, self.stages[name])] = name
+
+                if not running:
+                    if not pending:
+                        break
+                    if critical_error is None:
+                        raise StageError(f"Unresolvable stage dependencies: {', '.join(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = self.stages[name]
+                    self.durations[name] = time.perf_counter() - started_at[name]
+                    try:
+                        self.results[name] = future.result()
+                        self.status[name] = "completed"
+                        self.logger.info(f"   ✅ {stage.label} completed in {self.durations[name]:.1f}s.")
+                    except Exception as e:
+                        self.status[name] = "failed"
+                        if stage.critical:
+                            self.logger.error(f"❌ Critical Error during {stage.label}: {e}", exc_info=True)
+                            critical_error = StageError(f"{stage.label} failed: {e}")
+                        else:
+                            self.logger.error(f"❌ Error during {stage.label}: {e}", exc_info=True)
+
+        if critical_error is not None:
+            for name in pending:
+                self.status[name] = "skipped"
+            raise critical_error
+        return self.results
@@ -2,6 +2,7 @@ import os
 from datetime import datetime
 from pathlib import Path
 import uuid
+from typing import Optional
 
 def create_session_directory(base_dir: str = "workspace") -> str:
     """
@@ -18,3 +19,12 @@ def create_session_directory(base_dir: str = "workspace") -> str:
     print(f"📁 Created new session directory: {session_path}")
     return str(session_path)
 
+
+def resolve_session_directory(session_id: str, base_dir: str = "workspace") -> Optional[str]:
+    """
+    Returns the absolute path of an existing session (by id or path), or None if it does not exist.
+    """
+    candidate = Path(session_id)
+    if not candidate.is_dir():
+        candidate = Path(base_dir).resolve() / session_id
+    return str(candidate.resolve()) if candidate.is_dir() else None
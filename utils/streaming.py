@@ -0,0 +1,50 @@
+from typing import Iterable, Iterator, Optional
+
+def _until_marker(chunks: Iterable[str], marker: str) -> Iterator[str]:
+    """
+    Passes chunks through up to the first occurrence of `marker`, dropping it and the rest.
+    The last len(marker) - 1 characters are held back, since the marker may span chunks;
+    the remaining chunks are still consumed so the stream finishes normally.
+    """
+    held = ""
+    ended = False
+    for chunk in chunks:
+        if ended:
+            continue
+        held += chunk
+        index = held.find(marker)
+        if index >= 0:
+            ended = True
+            if held[:index]:
+                yield held[:index]
+            continue
+        keep = len(marker) - 1
+        if len(held) > keep:
+            yield held[:len(held) - keep]
+            held = held[len(held) - keep:]
+    if not ended and held:
+        yield held
+
+def with_markdown_heading(chunks: Iterable[str], heading: str, end_marker: Optional[str] = None) -> Iterator[str]:
+    """
+    Passes chunks through unchanged, but prepends `heading` if the first non-whitespace
+    text of the stream is not a Markdown title. Only the leading whitespace is held back.
+    With `end_marker`, the text ends before the marker the model was asked to close with
+    (normally a stop sequence, so the server already cuts it).
+    """
+    if end_marker:
+        chunks = _until_marker(chunks, end_marker)
+    pending = ""
+    checked = False
+    for chunk in chunks:
+        if checked:
+            yield chunk
+            continue
+        pending += chunk
+        if not pending.strip():
+            continue
+        checked = True
+        if not pending.lstrip().startswith("#"):
+            print("      ⚠️ LLM response didn't start with Markdown title, prepending.")
+            yield f"{heading}\n\n"
+        yield pending
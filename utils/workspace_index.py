@@ -0,0 +1,186 @@
+import argparse
+import json
+import sqlite3
+import tarfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from utils.hashing import sha256_file
+
+class WorkspaceIndex:
+    """
+    SQLite index of the artifacts of every session in a workspace, built from the
+    sessions' manifest.json files (`<workspace>/index.sqlite`).
+
+    Each artifact row carries the session, path, size, SHA-256, producing agent and the
+    SHA-256 of the session's paper, so questions such as "all architectures for paper X"
+    or "which outputs are identical" are answered with one query. The manifests remain
+    the source of truth: `rebuild` recreates the index from them, including the ones of
+    sessions compacted into `.archive/` (whose rows are flagged `archived`).
+    """
+
+    FILE_NAME = "index.sqlite"
+    PAPER_PATH = "input/paper.pdf"
+    ARCHIVE_DIR = ".archive"
+
+    def __init__(self, base_dir: str = "workspace"):
+        self.base_dir = Path(base_dir).resolve()
+        self.path = self.base_dir / self.FILE_NAME
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("""CREATE TABLE IF NOT EXISTS artifacts (
+            session_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER,
+            sha256 TEXT,
+            agent TEXT,
+            written_at TEXT,
+            duration_s REAL,
+            paper_sha256 TEXT,
+            archived INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, path))""")
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(artifacts)")}
+        if "archived" not in columns: # Indexes created before sessions could be archived
+            connection.execute("ALTER TABLE artifacts ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        connection.execute("CREATE INDEX IF NOT EXISTS artifacts_by_paper ON artifacts (paper_sha256, path)")
+        connection.execute("CREATE INDEX IF NOT EXISTS artifacts_by_hash ON artifacts (sha256)")
+        return connection
+
+    def index_session(self, session_path: str) -> int:
+        """Replaces the session's rows with the contents of its manifest. Returns the number of artifacts."""
+        session_dir = Path(session_path)
+        manifest_path = session_dir / "manifest.json"
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   ⚠️ Cannot index session {session_dir.name}: {e}")
+            return 0
+        return self._store_manifest(session_dir.name, manifest.get("artifacts", {}), archived=False)
+
+    def index_archive(self, archive_path: str) -> int:
+        """Indexes the manifest inside a compacted session archive (`<session-id>.tar.gz`)."""
+        session_id = Path(archive_path).name.removesuffix(".tar.gz")
+        try:
+            with tarfile.open(archive_path, "r:gz") as archive:
+                member = archive.extractfile(f"{session_id}/manifest.json")
+                manifest = json.loads(member.read().decode("utf-8")) if member else {}
+        except (OSError, KeyError, tarfile.TarError, json.JSONDecodeError) as e:
+            print(f"   ⚠️ Cannot index archive {Path(archive_path).name}: {e}")
+            return 0
+        return self._store_manifest(session_id, manifest.get("artifacts", {}), archived=True)
+
+    def _store_manifest(self, session_id: str, artifacts: Dict[str, Dict], archived: bool) -> int:
+        paper_sha256 = (artifacts.get(self.PAPER_PATH) or {}).get("sha256")
+        rows = [(session_id, path, entry.get("size"), entry.get("sha256"), entry.get("agent"),
+                 entry.get("written_at"), entry.get("duration_s"), paper_sha256, int(archived))
+                for path, entry in artifacts.items()]
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM artifacts WHERE session_id = ?", (session_id,))
+                    connection.executemany("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            finally:
+                connection.close()
+        return len(rows)
+
+    def set_archived(self, session_id: str, archived: bool = True):
+        """Flags the rows of a session that was compacted (or restored)."""
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("UPDATE artifacts SET archived = ? WHERE session_id = ?",
+                                       (int(archived), session_id))
+            finally:
+                connection.close()
+
+    def rebuild(self) -> int:
+        """Recreates the index from every session manifest in the workspace. Returns the sessions indexed."""
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM artifacts")
+            finally:
+                connection.close()
+        sessions = sorted(path.parent for path in self.base_dir.glob("*/manifest.json"))
+        for session_dir in sessions:
+            self.index_session(str(session_dir))
+        archives = sorted((self.base_dir / self.ARCHIVE_DIR).glob("*.tar.gz"))
+        for archive_path in archives:
+            self.index_archive(str(archive_path))
+        return len(sessions) + len(archives)
+
+    def find(self, path: Optional[str] = None, paper_sha256: Optional[str] = None, sha256: Optional[str] = None,
+             agent: Optional[str] = None, session_id: Optional[str] = None) -> List[Dict]:
+        """Returns the artifacts matching every given filter, newest first."""
+        filters = {"path": path, "paper_sha256": paper_sha256, "sha256": sha256, "agent": agent,
+                   "session_id": session_id}
+        conditions = [(f"{column} = ?", value) for column, value in filters.items() if value is not None]
+        where = " AND ".join(condition for condition, _ in conditions) or "1 = 1"
+        with self._lock:
+            connection = self._connect()
+            try:
+                rows = connection.execute(f"SELECT * FROM artifacts WHERE {where} ORDER BY written_at DESC",
+                                          [value for _, value in conditions]).fetchall()
+            finally:
+                connection.close()
+        return [dict(row) for row in rows]
+
+    def duplicates(self, path: Optional[str] = None) -> List[Dict]:
+        """Groups artifacts with identical content across sessions (optionally for one path)."""
+        where = "WHERE path = ?" if path else ""
+        with self._lock:
+            connection = self._connect()
+            try:
+                rows = connection.execute(
+                    f"""SELECT sha256, path, COUNT(*) AS copies, GROUP_CONCAT(session_id, ',') AS sessions
+                        FROM artifacts {where} GROUP BY sha256, path HAVING COUNT(*) > 1
+                        ORDER BY copies DESC""", [path] if path else []).fetchall()
+            finally:
+                connection.close()
+        return [{**dict(row), "sessions": row["sessions"].split(",")} for row in rows]
+
+def _paper_hash(value: str) -> str:
+    """Accepts a paper's SHA-256 or a path to the PDF."""
+    return sha256_file(value) if Path(value).is_file() else value
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the artifact index of a workspace")
+    parser.add_argument("--workspace", default="workspace", help="Workspace directory (default: workspace)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Rebuild the index from the session manifests")
+    find = commands.add_parser("find", help="List artifacts matching the filters")
+    find.add_argument("--path", help="Artifact path, e.g. output/architecture.md")
+    find.add_argument("--paper", help="Paper PDF (or its SHA-256)")
+    find.add_argument("--sha256", help="Artifact content hash")
+    find.add_argument("--agent", help="Producing stage, e.g. architecture")
+    find.add_argument("--session", help="Session id")
+    duplicates = commands.add_parser("duplicates", help="List identical artifacts across sessions")
+    duplicates.add_argument("--path", help="Only this artifact path")
+    args = parser.parse_args()
+
+    index = WorkspaceIndex(args.workspace)
+    if args.command == "rebuild":
+        print(f"🗂️ Indexed {index.rebuild()} session(s) into {index.path}")
+    elif args.command == "find":
+        rows = index.find(path=args.path, paper_sha256=_paper_hash(args.paper) if args.paper else None,
+                          sha256=args.sha256, agent=args.agent, session_id=args.session)
+        for row in rows:
+            archived = "  (archived)" if row["archived"] else ""
+            print(f"{row['session_id']}  {row['path']}  {row['size']} B  {row['sha256'][:12]}  "
+                  f"{row['agent'] or '-'}  {row['written_at']}{archived}")
+        print(f"📊 {len(rows)} artifact(s)")
+    else:
+        groups = index.duplicates(args.path)
+        for group in groups:
+            print(f"{group['sha256'][:12]}  {group['path']}  x{group['copies']}: {', '.join(group['sessions'])}")
+        print(f"📊 {len(groups)} group(s) of identical artifacts")
+
+if __name__ == "__main__":
+    main()